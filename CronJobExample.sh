@@ -11,6 +11,9 @@ OUTPUT_DIR="$SCRIPT_DIR/output/EPG"
 DEST_DIR="/home/procentric/EPG"
 LOG_FILE="$REPO_DIR/epg_run.log"
 CRON_LOG="/var/log/cron_epg.log"
+METRICS_DIR="$SCRIPT_DIR/metrics"
+# node_exporter --collector.textfile.directory, leave empty to skip
+TEXTFILE_DIR=""
 
 # Discord Webhook URL
 WEBHOOK_URL=""
@@ -58,21 +61,23 @@ fi
 cd "$SCRIPT_DIR" || { log "Error: Failed to change directory to $SCRIPT_DIR"; exit 1; }
 
 
-# Remove existing contents inside EPG directory
-log "--------------------------------------------"
-log "Removing existing contents in $OUTPUT_DIR..."
-if [ -d "$OUTPUT_DIR" ]; then
-    rm -rf "$OUTPUT_DIR"/*
-else
-    log "Output directory does not exist, skipping removal."
-fi
-
 # Run the Python script
 log "--------------------------------------------"
 log "Running Python script..."
 if python3 ./main.py; then
     log "Python script executed successfully."
+    SCRIPT_OK=1
 else
+    SCRIPT_OK=0
+fi
+
+# Publish the per-region metrics even when the run failed, that is when they matter most
+if [ -n "$TEXTFILE_DIR" ] && [ -f "$METRICS_DIR/procentric_epg.prom" ]; then
+    cp "$METRICS_DIR/procentric_epg.prom" "$TEXTFILE_DIR/procentric_epg.prom.$$" && \
+        mv "$TEXTFILE_DIR/procentric_epg.prom.$$" "$TEXTFILE_DIR/procentric_epg.prom"
+fi
+
+if [ "$SCRIPT_OK" -ne 1 ]; then
     log "Python script execution failed."
     send_discord_notification "❌ EPG update failed dduring script execution!"
     exit 1
@@ -88,28 +93,16 @@ if [ ! -d "$OUTPUT_DIR" ]; then
 fi
 
 
-
-# Remove existing contents inside EPG directory
+# Publish changed ZIPs atomically; unchanged regions are left untouched and
+# old dated ZIPs are only removed once their replacement is in place
 log "--------------------------------------------"
-log "Removing existing contents in $DEST_DIR..."
-
-if [ -d "$DEST_DIR" ]; then
-    log "Removing existing contents in $DEST_DIR..."
-    rm -rfdv "$DEST_DIR"/*
-else
-    log "EPG directory does not exist, skipping removal."
-fi
-
-# Copy files to the destination directory
-log "Copying files from $OUTPUT_DIR to $DEST_DIR..."
-mkdir -p "$DEST_DIR"  # Ensure destination exists
-
-if cp -r "$OUTPUT_DIR"/* "$DEST_DIR"/; then
-    log "Files copied successfully to $DEST_DIR"
+log "Publishing changed files from $OUTPUT_DIR to $DEST_DIR..."
+if python3 -m utils.publisher "$OUTPUT_DIR" "$DEST_DIR" >> "$LOG_FILE" 2>&1; then
+    log "Files published successfully to $DEST_DIR"
     send_discord_notification "✅ EPG update completed successfully!"
 else
-    log "Error: Failed to copy files."
-    send_discord_notification "❌ EPG update failed while copying files!"
+    log "Error: Failed to publish files."
+    send_discord_notification "❌ EPG update failed while publishing files!"
     exit 1
 fi
 
@@ -0,0 +1,62 @@
+"""Benchmark fetching and parsing an XMLTV feed sent plain, gzip transfer encoded, and published as .xml.gz.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_compressed_fetch --channels 100 --days 7 --bandwidth 10
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.fixtures import build_xmltv_feed
+from benchmarks.stub_server import StubServer
+from epg_sources.xmltv_net.main import XMLTV
+from utils.http_cache import HTTPCache
+from utils.pipeline import create_session
+
+MODES = (
+    ("plain", False, False),
+    ("gzip transfer", True, False),
+    (".xml.gz file", False, True),
+)
+
+
+def fetch_and_parse(url: str, cache_dir: Path):
+    """Fetch through a fresh cache and stream parse, returning (fetch seconds, parse seconds, parse peak bytes, events)."""
+    source = XMLTV(url, "Benchmark", "Australia/Sydney", stream=True)
+    session = create_session(1)
+    started = time.perf_counter()
+    path, _ = source.fetch(HTTPCache(cache_dir), session)
+    fetched = time.perf_counter()
+    session.close()
+
+    tracemalloc.start()
+    store = source.parse(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return fetched - started, time.perf_counter() - fetched, peak, store.event_count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--bandwidth", type=float, default=10.0, help="Link speed in MB/s, 0 for no limit")
+    args = parser.parse_args()
+
+    feed = build_xmltv_feed(args.channels, args.days)
+    print(f"{len(feed.encode('utf-8')) / 1e6:.1f} MB feed, link at {args.bandwidth or 'unlimited'} MB/s")
+    print(f"{'mode':<15} {'on the wire':>12} {'fetch':>8} {'parse':>8} {'parse peak':>11}")
+    for name, compress, gzipped in MODES:
+        with StubServer(bandwidth=args.bandwidth * 1e6, compress=compress) as stub, \
+                tempfile.TemporaryDirectory() as tmp:
+            url = stub.add_feed("feed", feed, gzipped)
+            fetch_seconds, parse_seconds, peak, events = fetch_and_parse(url, Path(tmp))
+            print(f"{name:<15} {stub.bytes_sent / 1e6:10.2f}MB {fetch_seconds:7.2f}s {parse_seconds:7.2f}s "
+                  f"{peak / 1e6:9.1f}MB  ({events} events)")
+
+
+if __name__ == "__main__":
+    main()
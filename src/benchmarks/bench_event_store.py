@@ -0,0 +1,91 @@
+"""Benchmark the compact GuideStore against one validated pydantic Event per programme.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_event_store --channels 120 --days 7
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from models.epg_model import ProgramGuide, Channel, Event
+from models.event_store import GuideStore
+
+
+def synthetic_rows(channels: int, days: int, slot_minutes: int = 30):
+    """Yield (channel id, event fields) pairs shaped like a week of real listings."""
+    slots = days * 24 * 60 // slot_minutes
+    for c in range(channels):
+        for s in range(slots):
+            minutes = s * slot_minutes
+            yield f"ch{c}", {
+                "eventID": f"{c}-{s}",
+                # Built at runtime like a parser would, so repeats are equal but not identical objects
+                "title": "".join(["Show ", str(s % 50)]),
+                "eventDescription": "".join(["Episode ", str(s % 200)]),
+                "rating": "".join(["P", "G"]),
+                "date": f"2025-01-{1 + minutes // 1440:02d}",
+                "startTime": f"{minutes % 1440 // 60:02d}{minutes % 60:02d}",
+                "length": str(slot_minutes),
+                "genre": "".join(["Ne", "ws"]),
+            }
+
+
+def build_models(rows) -> ProgramGuide:
+    """The previous approach: validate a pydantic Event for every programme."""
+    channels = {}
+    for channel_id, fields in rows:
+        channel = channels.get(channel_id)
+        if channel is None:
+            channel = channels[channel_id] = Channel(channelID=channel_id, name=channel_id, resolution="HD", events=[])
+        channel.events.append(Event(**fields))
+    return ProgramGuide(filetype="Benchmark", version="1.0", fetchTime="", maxMinutes=0, channels=list(channels.values()))
+
+
+def build_store(rows) -> GuideStore:
+    """Slotted records with interned strings, validated once at the end."""
+    store = GuideStore(filetype="Benchmark", version="1.0", fetchTime="")
+    for channel_id, fields in rows:
+        channel = store.get_channel(channel_id) or store.add_channel(channel_id, channel_id)
+        store.add_event(channel, **fields)
+    return store.validate()
+
+
+def measure(builder, rows):
+    """Return (seconds, retained bytes) for building a guide from pre-generated rows."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = builder(rows)
+    elapsed = time.perf_counter() - started
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return elapsed, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=120)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(args.channels, args.days))
+
+    # Timed without tracing, then traced for the retained size
+    for name, builder in (("pydantic Event models", build_models), ("GuideStore records", build_store)):
+        started = time.perf_counter()
+        builder(rows)
+        elapsed = time.perf_counter() - started
+        _, retained = measure(builder, rows)
+        print(f"{name:<22} {elapsed:6.2f}s  {retained / 1e6:7.1f} MB retained")
+
+    store = build_store(rows)
+    started = time.perf_counter()
+    store.to_program_guide()
+    print(f"{'ProgramGuide view':<22} {time.perf_counter() - started:6.2f}s  ({len(rows)} events)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Exercise the fetch layer against injected upstream faults and time how each one is ridden out.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_fault_tolerance
+
+Each scenario runs against the local stub server with short timeouts and
+backoff, in a scratch directory so the cache and stash start empty. The run
+fails with an AssertionError when a scenario does not end as expected.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fixtures import build_xmltv_feed
+from benchmarks.stub_server import StubServer
+from epg_sources.registry import Region
+from epg_sources.sky_nz.main import SkyNZ_EPG
+from epg_sources.xmltv_net.main import XMLTV
+from main import RegionBuild, RegionFetch
+from utils.http_cache import HTTPCache
+from utils.metrics import metrics
+from utils.pipeline import Unchanged, create_session
+from utils.resilience import CircuitBreaker, CircuitOpen
+
+SKY_ERROR = json.dumps({"errors": [{"message": "Service temporarily unavailable"}], "data": None}).encode("utf-8")
+
+
+def outcome(func):
+    """(seconds taken, result or exception) of calling 'func'."""
+    started = time.perf_counter()
+    try:
+        result = func()
+    except Exception as e:
+        result = e
+    return time.perf_counter() - started, result
+
+
+def succeeded(result) -> bool:
+    return not isinstance(result, Exception)
+
+
+def failed(result) -> bool:
+    return isinstance(result, Exception) and not isinstance(result, CircuitOpen)
+
+
+def republished(result) -> bool:
+    return isinstance(result, Unchanged) and Path(str(result.result)).exists()
+
+
+def describe(result) -> str:
+    if isinstance(result, Exception):
+        return f"{type(result).__name__}: {str(result)[:70]}"
+    if isinstance(result, Unchanged):
+        return f"republished {Path(str(result.result)).name}"
+    return type(result).__name__
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--read-timeout", type=float, default=0.5)
+    parser.add_argument("--backoff", type=float, default=0.05)
+    args = parser.parse_args()
+
+    def session(**options):
+        return create_session(4, connect_timeout=1, read_timeout=args.read_timeout, retries=3,
+                              backoff=args.backoff, **options)
+
+    feed = build_xmltv_feed(20, 2)
+    rows = []
+
+    def scenario(name: str, expected, func) -> None:
+        """Run 'func', checking its result against 'expected' straight away, while its files are still there."""
+        seconds, result = outcome(func)
+        rows.append((name, expected(result), seconds, result))
+    cwd = os.getcwd()
+    with StubServer(sky_channels=20, sky_days=3) as stub, tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # The output, stash and cache directories are relative
+        url = stub.add_feed("feed", feed)
+
+        def fetch(s):
+            return HTTPCache(Path(tmp) / "http").get(url, s).sha256
+
+        stub.inject("/feed.xml", 503, 503)
+        scenario("two 503s, then OK", succeeded, lambda: fetch(session()))
+
+        stub.inject("/feed.xml", ("stall", args.read_timeout * 3))
+        scenario("stalled response", succeeded, lambda: fetch(session()))
+
+        stub.inject("/feed.xml", "drop")
+        scenario("dropped connection", succeeded, lambda: fetch(session()))
+
+        stub.inject("/feed.xml", *[503] * 40)
+        breaker = CircuitBreaker(failures=2, reset_after=60)
+        down = session(breaker=breaker)
+        scenario("upstream down", failed, lambda: fetch(down))
+        scenario("upstream down again", failed, lambda: fetch(down))
+        scenario("circuit open", lambda result: isinstance(result, CircuitOpen), lambda: fetch(down))
+        stub.faults.clear()
+
+        # Build once so there is a last good ZIP, then take the upstream away
+        region = Region("STALE", XMLTV(url, "Stale", "Australia/Sydney", stream=True), ["EPG", "STALE"],
+                        "Procentric_EPG_STALE", stale_max_age=3600)
+        cache = HTTPCache(Path(tmp) / "region")
+        RegionBuild(region, RegionFetch(region, cache, session()))
+        stub.add_file("/feed.xml", b"<tv></tv>", "application/xml")  # A new ETag, so the next fetch is a real one
+        stub.inject("/feed.xml", *[503] * 40)
+        scenario("down, last good kept", republished, lambda: RegionFetch(region, cache, session()))
+        region.stale_max_age = 1e-9
+        scenario("down, last good too old", failed, lambda: RegionFetch(region, cache, session()))
+        stub.faults.clear()
+
+        # Sky: a failed refresh of a day already held keeps its slots, a day never fetched fails the region
+        sky = SkyNZ_EPG(stub.graphql_url, window_days=2, slot_store_path=Path(tmp) / "slots.json")
+        sky.fetch(None, session())
+        stub.inject("/graphql", *[503] * 40)
+        scenario("Sky refresh day down", succeeded, lambda: sky.fetch(None, session()))
+        stub.faults.clear()
+        stub.inject("/graphql", ("body", SKY_ERROR))
+        scenario("Sky refresh error reply", succeeded, lambda: sky.fetch(None, session()))
+        fresh = SkyNZ_EPG(stub.graphql_url, window_days=2, slot_store_path=Path(tmp) / "fresh_slots.json")
+        stub.inject("/graphql", ("body", SKY_ERROR))
+        scenario("Sky new day error reply", failed, lambda: fresh.fetch(None, session()))
+        os.chdir(cwd)
+
+    print(f"{'scenario':<26} {'seconds':>8}  result")
+    for name, ok, seconds, result in rows:
+        print(f"{name:<26} {seconds:8.2f}  {describe(result)}{'' if ok else '  UNEXPECTED'}")
+    counters = {}
+    for region in metrics.report()["regions"].values():
+        for key, value in region["counters"].items():
+            counters[key] = counters.get(key, 0) + value
+    print({key: counters[key] for key in sorted(counters)
+           if key in ("fetch_retries", "circuit_opened", "circuit_open_rejections", "stale_fallback", "stale_days")})
+
+    for name, ok, seconds, result in rows:
+        assert ok, f"{name}: {describe(result)}"
+    assert counters.get("fetch_retries", 0) >= 4, counters  # At least the two 503s, the stall and the drop
+    assert counters.get("circuit_opened") == 1, counters
+    assert counters.get("circuit_open_rejections") == 1, counters
+    assert counters.get("stale_fallback") == 1, counters
+    assert counters.get("stale_days") == 2, counters  # The 503s and the error reply each kept one held day
+
+if __name__ == "__main__":
+    main()
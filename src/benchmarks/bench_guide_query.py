@@ -0,0 +1,83 @@
+"""Benchmark now/next lookups: the interval index against unzipping and scanning the published JSON.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_guide_query --channels 100 --days 7 --queries 200
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from benchmarks.fixtures import build_xmltv_feed
+from epg_sources.xmltv_net.main import XMLTV
+from models.guide_index import load_guide_zip
+from utils.file_handler import JSON_FILENAME
+from utils.time_utils import local_to_epoch
+
+TIMEZONE = "Australia/Sydney"
+
+
+def scan_now(zip_path: Path, when: int) -> list:
+    """The previous approach: unzip the guide and walk every event of every channel."""
+    with zipfile.ZipFile(zip_path) as zipf:
+        data = json.loads(zipf.read(JSON_FILENAME))
+    on_air = []
+    for channel in data["channels"]:
+        current = None
+        start = None
+        for event in channel["events"]:
+            start = local_to_epoch(event["date"], event["startTime"], TIMEZONE, after=start)
+            if start <= when < start + int(event["length"]) * 60:
+                current = event
+        on_air.append(current)
+    return on_air
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    store = XMLTV("", "Benchmark", TIMEZONE).parse_xml_to_store(build_xmltv_feed(args.channels, args.days))
+    first = min(channel.events[0].start for channel in store.channels if channel.events)
+    times = [first + random.randrange(args.days * 86400) for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = Path(tmp) / "Procentric_EPG_BENCH_20240101.zip"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf, zipf.open(JSON_FILENAME, "w") as entry:
+            entry.write(json.dumps(store.model_dump()).encode("utf-8"))
+
+        started = time.perf_counter()
+        guide = load_guide_zip("BENCH", zip_path, TIMEZONE)
+        load_seconds = time.perf_counter() - started
+
+        scan_count = max(1, args.queries // 20)  # The scan is slow, a sample is enough
+        started = time.perf_counter()
+        for when in times[:scan_count]:
+            scan_now(zip_path, when)
+        scan_ms = (time.perf_counter() - started) / scan_count * 1000
+
+        started = time.perf_counter()
+        for when in times:
+            guide.now(when)
+        index_ms = (time.perf_counter() - started) / len(times) * 1000
+
+        mismatches = sum(1 for when in times[:scan_count]
+                         if scan_now(zip_path, when) != [channel["now"] and {k: v for k, v in channel["now"].items()
+                                                                             if k not in ("start", "stop")}
+                                                        for channel in guide.now(when)])
+
+    print(f"{len(store.channels)} channels, {store.event_count()} events, index loaded in {load_seconds * 1000:.0f} ms")
+    print(f"{'unzip and scan':<16} {scan_ms:10.2f} ms per all-channel now query")
+    print(f"{'interval index':<16} {index_ms:10.3f} ms per all-channel now query ({scan_ms / index_ms:.0f}x)")
+    print(f"mismatches against the scan: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
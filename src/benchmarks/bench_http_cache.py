@@ -0,0 +1,95 @@
+"""Check and time the HTTP cache: a cold GET, a 304 revalidation, a changed feed, POST content hashing and eviction.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_http_cache --channels 100 --days 7
+
+Each step runs against the local stub server in a scratch cache directory,
+and fails with an AssertionError when the cache does not behave as expected.
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.fixtures import build_xmltv_feed
+from benchmarks.stub_server import StubServer
+from epg_sources.sky_nz.main import CHANNEL_GROUP_ID, build_query
+from utils.http_cache import HTTPCache
+from utils.pipeline import create_session
+
+
+def timed(func):
+    """(seconds taken, result) of calling 'func' with its output silenced."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    feed = build_xmltv_feed(args.channels, args.days)
+    rows = []
+    with StubServer(sky_channels=20, sky_days=2) as stub, tempfile.TemporaryDirectory() as tmp:
+        session = create_session(8)
+        cache = HTTPCache(Path(tmp) / "http")
+        url = stub.add_feed("feed", feed)
+
+        seconds, cold = timed(lambda: cache.get(url, session))
+        rows.append(("cold GET", seconds, cold.changed))
+        assert cold.changed and cold.read_bytes() == feed.encode("utf-8")
+
+        seconds, revalidated = timed(lambda: cache.get(url, session))
+        rows.append(("304 revalidation", seconds, revalidated.changed))
+        assert stub.hits["not_modified"] == 1, stub.hits
+        assert not revalidated.changed and revalidated.sha256 == cold.sha256
+
+        stub.add_feed("feed", feed.replace("</tv>", "<!-- changed --></tv>"))
+        seconds, changed = timed(lambda: cache.get(url, session))
+        rows.append(("changed feed", seconds, changed.changed))
+        assert changed.changed and changed.sha256 != cold.sha256
+
+        # Sky's POSTs cannot be revalidated, an unchanged reply is recognised by its content hash
+        body = {"query": build_query(1), "variables": {"id": CHANNEL_GROUP_ID, "date0": "2025-01-07"}}
+        seconds, first = timed(lambda: cache.post(stub.graphql_url, body, session))
+        rows.append(("cold POST", seconds, first.changed))
+        seconds, again = timed(lambda: cache.post(stub.graphql_url, body, session))
+        rows.append(("unchanged POST", seconds, again.changed))
+        assert first.changed and not again.changed and again.sha256 == first.sha256
+        other = dict(body, variables=dict(body["variables"], date0="2025-01-08"))
+        assert timed(lambda: cache.post(stub.graphql_url, other, session))[1].changed, "a new body reused an entry"
+
+        # Regions sharing a feed fetch it at the same time
+        shared = stub.add_feed("shared", feed)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            digests = set(timed(lambda: list(executor.map(lambda _: cache.get(shared, session).sha256, range(8))))[1])
+        assert len(digests) == 1, digests
+        assert not list(cache.cache_dir.glob("*.tmp")), "temporary files left behind"
+
+        entries = len(list(cache.cache_dir.glob("*.json")))
+        cache.max_bytes = len(feed) * 2
+        timed(cache.evict)
+        kept = len(list(cache.cache_dir.glob("*.json")))
+        assert 0 < kept < entries and sum(path.stat().st_size for path in cache.cache_dir.glob("*.body")) <= cache.max_bytes
+        cache.max_age = 0
+        time.sleep(0.01)
+        timed(cache.evict)
+        assert not list(cache.cache_dir.iterdir()), "expired entries were kept"
+        session.close()
+
+    print(f"{len(feed.encode('utf-8')) / 1e6:.1f} MB feed")
+    for name, seconds, changed in rows:
+        print(f"{name:<18} {seconds * 1000:8.1f} ms  {'changed' if changed else 'unchanged'}")
+    print(f"eviction: {entries} entries, {kept} kept under {cache.max_bytes / 1e6:.1f} MB, none after max_age")
+
+
+if __name__ == "__main__":
+    main()
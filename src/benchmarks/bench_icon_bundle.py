@@ -0,0 +1,93 @@
+"""Benchmark the channel icon bundle: a cold build, an unchanged rebuild and a rebuild after one logo changes.
+
+Icons come from 'ref material/data/channelIcons' and the channel list from
+'ref material/data/raw_channels.json', served by the local stub server.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_icon_bundle --latency 0.02
+
+Fails with an AssertionError if a build rewrites icons or the ZIP when it
+should keep them, or misses a change.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fixtures import REF_CHANNELS
+from benchmarks.stub_server import StubServer
+from channel_bundle.main import IconBundle, icon_filename
+from utils.http_cache import HTTPCache
+
+REF_DATA = REF_CHANNELS.parent
+
+
+def serve_reference_icons(stub: StubServer) -> str:
+    """Serve the reference channel list with its logo URLs pointed at the stub, returning the list's URL."""
+    with (REF_DATA / "raw_channels.json").open(encoding="utf-8") as f:
+        channels = json.load(f)
+    for channel in channels:
+        path = "/" + channel["logoThumbnail"].split("/", 3)[3]
+        icon_path = REF_DATA / "channelIcons" / icon_filename(channel["logoThumbnail"])
+        if icon_path.exists():
+            stub.add_file(path, icon_path.read_bytes(), "image/png")
+        channel["logoThumbnail"] = stub.base_url + path
+    return stub.add_file("/channels.json", json.dumps(channels).encode("utf-8"), "application/json")
+
+
+def timed_build(url: str, workdir: Path, workers: int):
+    """Build once, returning (seconds, icons rewritten, whether the ZIP was rebuilt)."""
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        IconBundle(url, icon_dir=workdir / "icons", bundle_path=workdir / "channelIconsBundle.zip",
+                   workers=workers, cache=HTTPCache(workdir / "http")).build()
+    elapsed = time.perf_counter() - started
+    log = output.getvalue()
+    return elapsed, log.count("Updated icon"), "bundle created" in log
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the stub server waits per request")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        url = serve_reference_icons(stub)
+        workdir = Path(tmp)
+        bundle = workdir / "channelIconsBundle.zip"
+        icons = len({icon_filename(path) for path in stub.files if path != "/channels.json"})
+
+        runs = [("cold", timed_build(url, workdir, args.workers))]
+        built = (bundle.stat().st_mtime_ns, hashlib.sha256(bundle.read_bytes()).hexdigest())
+        hits = dict(stub.hits)
+        runs.append(("unchanged", timed_build(url, workdir, args.workers)))
+        kept = (bundle.stat().st_mtime_ns, hashlib.sha256(bundle.read_bytes()).hexdigest())
+        revalidated = stub.hits["not_modified"] - hits["not_modified"]
+        icon = next(path for path in stub.files if path.endswith(".png"))
+        stub.add_file(icon, stub.files[icon][0] + os.urandom(8), "image/png")
+        runs.append(("one logo changed", timed_build(url, workdir, args.workers)))
+        changed = hashlib.sha256(bundle.read_bytes()).hexdigest()
+        runs.append(("sequential cold", timed_build(url, Path(tempfile.mkdtemp(dir=tmp)), 1)))
+
+    for name, (elapsed, rewritten, rebuilt) in runs:
+        print(f"{name:<17} {elapsed:6.2f}s  {rewritten:3d} icons written  {'ZIP rebuilt' if rebuilt else 'ZIP kept'}")
+
+    results = {name: (rewritten, rebuilt) for name, (_, rewritten, rebuilt) in runs}
+    assert results["cold"] == (icons, True), results["cold"]
+    assert results["unchanged"] == (0, False), results["unchanged"]
+    assert kept == built, "the unchanged rebuild rewrote the ZIP"
+    assert revalidated >= icons, f"only {revalidated} of {icons} icons were revalidated with a 304"
+    assert results["one logo changed"] == (1, True), results["one logo changed"]
+    assert changed != built[1], "the changed logo did not reach the ZIP"
+    assert results["sequential cold"] == (icons, True), results["sequential cold"]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark building overlapping city feeds separately versus with cross-region sharing.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_multi_region --cities 5 --national 40 --local 8 --days 7
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fixtures import build_xmltv_feed
+from epg_sources.xmltv_net.main import XMLTV
+from epg_sources.xmltv_net.multi_region import MultiRegionXMLTV
+
+ZONES = ["Australia/Sydney", "Australia/Brisbane", "Australia/Adelaide", "Australia/Brisbane", "Australia/Melbourne"]
+
+
+def build_city_feed(city: int, national: int, local: int, days: int) -> str:
+    """A feed sharing 'national' channels with every other city plus 'local' channels of its own."""
+    shared = build_xmltv_feed(national, days)
+    own = build_xmltv_feed(local, days, seed=city + 1)
+    own = own.replace('id="ch', f'id="city{city}-ch').replace('channel="ch', f'channel="city{city}-ch')
+    return shared.replace("</tv>", own.split("\n", 2)[2])  # Everything after the declaration and <tv> line
+
+
+def run(builder, feeds):
+    """Time a build untraced, then repeat it under tracemalloc for the peak memory."""
+    started = time.perf_counter()
+    stores = builder(feeds)
+    elapsed = time.perf_counter() - started
+    events = sum(store.event_count() for store in stores.values())
+    del stores
+
+    tracemalloc.start()
+    builder(feeds)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, events
+
+
+def separately(feeds):
+    stores = {}
+    for name, (source, path) in feeds.items():
+        with open(path, "rb") as stream:
+            stores[name] = source.parse_xml_stream(stream)
+    return stores
+
+
+def shared(feeds):
+    return MultiRegionXMLTV().parse_regions(feeds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cities", type=int, default=5)
+    parser.add_argument("--national", type=int, default=40)
+    parser.add_argument("--local", type=int, default=8)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feeds = {}
+        for city in range(args.cities):
+            path = os.path.join(tmp, f"city{city}.xml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(build_city_feed(city, args.national, args.local, args.days))
+            feeds[f"city{city}"] = (XMLTV(path, f"City {city}", ZONES[city % len(ZONES)]), path)
+
+        results = {}
+        for name, builder in (("separately", separately), ("shared", shared)):
+            results[name] = run(builder, feeds)
+
+    for name, (elapsed, peak, events) in results.items():
+        print(f"{name:<11} {elapsed:6.2f}s  {peak / 1e6:7.1f} MB peak  {events} events")
+
+
+if __name__ == "__main__":
+    main()
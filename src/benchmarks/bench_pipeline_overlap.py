@@ -0,0 +1,132 @@
+"""Check that builds started while other regions are still fetching cannot hang on a lock held by a fetch thread.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_pipeline_overlap --runs 4
+
+First a pipeline where one fetch holds a lock for a while and another
+region's build takes the same lock, under each start method. Then full
+runs of main.py, pinned to one CPU where taskset exists, building a Sky
+region and an XMLTV group whose fetches and builds overlap. Exits with an
+AssertionError if a build hangs or a region fails.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.fixtures import build_xmltv_feed
+from benchmarks.stub_server import StubServer
+from utils import pipeline
+from utils.pipeline import PipelineJob, run_pipeline
+
+HELD = threading.Lock()  # Stands in for pytz's lazy zone list lock, logging's lock and the like
+HOLD_SECONDS = 3.0
+
+
+def fetch_holding(session):
+    """A fetch that is still holding the lock when the other region's build starts."""
+    with HELD:
+        time.sleep(HOLD_SECONDS)
+    return "held"
+
+
+def fetch_quickly(session):
+    return "quick"
+
+
+def build_locking(payload):
+    """Take the lock in the build process, as a timezone lookup would, reporting whether it was ever free."""
+    acquired = HELD.acquire(timeout=HOLD_SECONDS * 2)
+    if acquired:
+        HELD.release()
+    return acquired
+
+
+def build_noop(payload):
+    return payload
+
+
+def held_lock_run(start_method: str):
+    """The build result of the quick region while the slow region's fetch holds the lock."""
+    previous = pipeline.START_METHOD
+    pipeline.START_METHOD = start_method
+    try:
+        results = run_pipeline([
+            PipelineJob("holding", fetch_holding, build_noop, timeout=HOLD_SECONDS * 4),
+            PipelineJob("locking", fetch_quickly, build_locking, timeout=HOLD_SECONDS * 4),
+        ], fetch_workers=2, build_workers=2)
+    finally:
+        pipeline.START_METHOD = previous
+    return results["locking"]
+
+
+def main_config(url: str, cities: int) -> str:
+    regions = "".join(f"""
+[[source]]
+name = "AUS{city}"
+type = "xmltv"
+group = "AUS"
+url = "{url}/aus.xml"
+timezone = "Australia/Sydney"
+title = "AUS{city}"
+""" for city in range(cities))
+    return f"""[defaults]
+timeout = 30
+
+[[source]]
+name = "NZL"
+type = "sky_nz"
+url = "{url}/graphql"
+timezone = "Pacific/Auckland"
+window_days = 3
+batch_days = 1
+trim_window = false
+""" + regions
+
+
+def main_run(config: str) -> tuple:
+    """Run main.py once in a scratch directory: (seconds, region statuses, ZIPs published, stderr)."""
+    command = [sys.executable, str(Path(__file__).resolve().parent.parent / "main.py"), "--config", "cfg.toml"]
+    if shutil.which("taskset"):
+        command = ["taskset", "-c", "0", *command]
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "cfg.toml").write_text(config, encoding="utf-8")
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=tmp, capture_output=True, text=True, timeout=120)
+        seconds = time.perf_counter() - started
+        with open(Path(tmp) / "metrics" / "run_report.json", encoding="utf-8") as f:
+            status = json.load(f)["status"]
+        zips = len(list((Path(tmp) / "output").rglob("*.zip")))
+    return seconds, status, zips, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=4)
+    parser.add_argument("--cities", type=int, default=3)
+    args = parser.parse_args()
+
+    for start_method in ("fork", pipeline.START_METHOD):
+        result = held_lock_run(start_method)
+        print(f"{start_method:<11} build while a fetch holds a lock: {result!r}")
+    assert held_lock_run(pipeline.START_METHOD) is True, "a build inherited a lock held by a fetch thread"
+
+    with StubServer(sky_channels=100, sky_days=3, latency=0.05) as stub:
+        stub.add_feed("aus", build_xmltv_feed(60, 3, utc_offset="+1000"))
+        config = main_config(stub.base_url, args.cities)
+        for run in range(args.runs):
+            seconds, status, zips, stderr = main_run(config)
+            print(f"run {run + 1}: {seconds:5.1f}s  {zips} ZIPs  {status}")
+            assert "timed out" not in stderr, stderr[-2000:]
+            assert status == {name: "ok" for name in ["NZL", *(f"AUS{city}" for city in range(args.cities))]}, status
+            assert zips == args.cities + 1, f"{zips} ZIPs published"
+
+
+if __name__ == "__main__":
+    main()
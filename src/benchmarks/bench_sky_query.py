@@ -0,0 +1,198 @@
+"""Benchmark the Sky NZ fetch: the previous full per-date query against the trimmed, batched multi-day query.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_sky_query --channels 100 --days 3
+    python -m benchmarks.bench_sky_query --record benchmarks/data/sky_batched_response.json --url URL
+
+The first form serves fixtures from the local stub server. The recorded
+fixture is replayed offline through split_days(), the slot store and the
+parser. --record captures a fresh one, from the stub or a real endpoint.
+"""
+import argparse
+import contextlib
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fixtures import fixture_date
+from benchmarks.stub_server import StubServer
+from epg_sources.sky_nz.main import CHANNEL_GROUP_ID, SkyNZ_EPG, build_query, split_days
+from epg_sources.sky_nz.slot_store import SlotStore
+from utils.pipeline import create_session
+
+RECORDED_FIXTURE = Path(__file__).parent / "data" / "sky_batched_response.json"
+
+# The query sent once per date before the trim, kept to measure against
+LEGACY_QUERY = """
+    query getChannelGroup($id: ID!, $date: LocalDate) {
+        experience(appId: TV_GUIDE_WEB) {
+            channelGroup(id: $id) {
+                id
+                title
+                channels {
+                    ... on LinearChannel {
+                        id
+                        title
+                        number
+                        tileImage {
+                            uri
+                        }
+                        slotsForDay(date: $date) {
+                            slots {
+                                id
+                                startMs
+                                endMs
+                                ratingString
+                                programme {
+                                    ... on Episode {
+                                        id
+                                        title
+                                        synopsis
+                                        show {
+                                            id
+                                            title
+                                            type
+                                        }
+                                    }
+                                    ... on Movie {
+                                        id
+                                        title
+                                        synopsis
+                                    }
+                                    ... on PayPerViewEventProgram {
+                                        id
+                                        title
+                                        synopsis
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+"""
+
+
+def slot_ids(channels: list) -> list:
+    return [slot["id"] for channel in channels for slot in channel["slotsForDay"]["slots"]]
+
+
+def legacy_fetch(url: str, dates: list, session) -> tuple:
+    """One full query per date, as before: (requests, bytes received, seconds, {date: slot ids})."""
+    started = time.perf_counter()
+    received = 0
+    slots = {}
+    for date in dates:
+        response = session.post(url, json={"query": LEGACY_QUERY, "variables": {"id": CHANNEL_GROUP_ID, "date": date}})
+        received += len(response.content)
+        slots[date] = slot_ids(response.json()["data"]["experience"]["channelGroup"]["channels"])
+    return len(dates), received, time.perf_counter() - started, slots
+
+
+def batched_fetch(url: str, dates: list, session) -> tuple:
+    """The trimmed query with every date aliased into one request: (requests, bytes received, seconds, {date: slot ids})."""
+    started = time.perf_counter()
+    body = {"query": build_query(len(dates)),
+            "variables": {"id": CHANNEL_GROUP_ID, **{f"date{i}": date for i, date in enumerate(dates)}}}
+    response = session.post(url, json=body)
+    data = response.json()
+    days = split_days(data["data"]["experience"]["channelGroup"]["channels"], dates, data.get("errors"))
+    slots = {date: slot_ids(channels) for date, channels in days.items()}
+    return 1, len(response.content), time.perf_counter() - started, slots
+
+
+def check_days(slots: dict) -> None:
+    """Every date has slots and no slot appears under two dates."""
+    seen = set()
+    for date, ids in slots.items():
+        assert ids, f"no slots for {date}"
+        assert seen.isdisjoint(ids), f"{date} repeats slots of an earlier date"
+        seen.update(ids)
+
+
+def record(url: str, dates: list, path: Path) -> None:
+    """Save the batched request and the endpoint's response as a replayable fixture."""
+    body = {"query": build_query(len(dates)),
+            "variables": {"id": CHANNEL_GROUP_ID, **{f"date{i}": date for i, date in enumerate(dates)}}}
+    session = create_session(1)
+    response = session.post(url, json=body, headers={"Content-Type": "application/json"})
+    response.raise_for_status()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({"dates": dates, "request": body, "response": response.json()}, f, indent=1)
+    print(f"Recorded {len(response.content)} bytes for {', '.join(dates)} to {path}")
+
+
+def replay(path: Path) -> None:
+    """Run a recorded response through split_days(), the slot store and the parser, checking for duplicates."""
+    with path.open("r", encoding="utf-8") as f:
+        recorded = json.load(f)
+    dates = recorded["dates"]
+    response = recorded["response"]
+    source = SkyNZ_EPG("", window_days=len(dates), trim_window=False)
+    days = split_days(source.extract_channels(response), dates, response.get("errors"))
+    check_days({date: slot_ids(channels) for date, channels in days.items()})
+    expected = sum(len(slot_ids(channels)) for channels in days.values())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        slot_store = SlotStore(Path(tmp) / "slots.json")
+        for date, channels in days.items():
+            slot_store.put(date, channels)
+        channels = slot_store.merged_channels(dates)
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = source.parse_program_store({"data": {"experience": {"channelGroup": {"channels": channels}}}})
+
+    ids = [channel.channelID for channel in store.channels]
+    assert len(ids) == len(set(ids)), "duplicate channels after merging the days"
+    for channel in store.channels:
+        starts = [event.start for event in channel.events]
+        assert starts == sorted(set(starts)), f"duplicate or unsorted events on {channel.channelID}"
+    assert store.event_count() == expected, f"{store.event_count()} events parsed from {expected} slots"
+    print(f"Replayed {path.name}: {len(dates)} days, {len(store.channels)} channels, {store.event_count()} events, "
+          f"no duplicates")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--record", type=Path, help="Record the batched response to this file and exit")
+    parser.add_argument("--url", help="GraphQL endpoint to record from, default the stub server")
+    args = parser.parse_args()
+
+    dates = [fixture_date(day) for day in range(args.days)]
+    if args.record:
+        if args.url:
+            record(args.url, dates, args.record)
+        else:
+            with StubServer(sky_channels=args.channels, sky_days=args.days) as stub:
+                record(stub.graphql_url, dates, args.record)
+        return
+
+    with StubServer(sky_channels=args.channels, sky_days=args.days) as stub:
+        session = create_session(1)
+        print(f"{args.channels} channels, {args.days} days")
+        print(f"{'query':<22} {'requests':>8} {'received':>10} {'seconds':>8} {'slots':>7}")
+        results = {}
+        for name, fetch in (("full, one per date", legacy_fetch), ("trimmed, batched", batched_fetch)):
+            requests, received, seconds, slots = results[name] = fetch(stub.graphql_url, dates, session)
+            count = sum(len(ids) for ids in slots.values())
+            print(f"{name:<22} {requests:8d} {received / 1e6:8.2f}MB {seconds:8.3f} {count:7d}")
+        session.close()
+        assert stub.hits["post"] == len(dates) + 1
+        legacy, batched = results.values()
+        check_days(batched[3])
+        assert batched[3] == legacy[3], "the batched query returned different slots than the per-date queries"
+        assert batched[1] < legacy[1], "the trimmed query did not shrink the response"
+
+    if RECORDED_FIXTURE.exists():
+        replay(RECORDED_FIXTURE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Offline benchmark suite for the fetch, parse and publish stages of both sources.
+
+Fixtures are generated in memory and served from a local stub server, so no
+network access is needed. Each run is saved as JSON under benchmarks/results
+and compared against the previous run (or --compare FILE).
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_suite --channels 120 --days 7 --rounds 5
+    python -m benchmarks.bench_suite --only xmltv --compare benchmarks/results/20250101_120000.json
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from benchmarks.fixtures import build_sky_response, build_xmltv_feed
+from benchmarks.harness import BASE_RESULTS_DIR, latest_results, load_results, measure, print_table, save_results
+from benchmarks.stub_server import StubServer
+from epg_sources.sky_nz.main import SkyNZ_EPG
+from epg_sources.xmltv_net.main import XMLTV
+from utils.file_handler import save_and_zip
+from utils.http_cache import HTTPCache
+from utils.pipeline import create_session
+
+
+def quiet(func):
+    """Wrap a stage so its progress prints do not end up in the timings or the report."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return run
+
+
+def xmltv_benchmarks(args, stub: StubServer, workdir: Path):
+    xml_data = build_xmltv_feed(args.channels, args.days, args.seed)
+    feed_path = workdir / "feed.xml"
+    feed_path.write_text(xml_data, encoding="utf-8")
+    url = stub.add_feed("syd", xml_data)
+    source = XMLTV(url, "Benchmark XMLTV", "Australia/Sydney")
+    session = create_session(4)
+    cache = HTTPCache(workdir / "http")
+    info = {"bytes": len(xml_data.encode("utf-8"))}
+
+    def open_stream():
+        with open(feed_path, "rb") as stream:
+            return source.parse_xml_stream(stream)
+
+    def clear_cache():
+        shutil.rmtree(cache.cache_dir, ignore_errors=True)
+        cache.cache_dir.mkdir(parents=True)
+
+    def prime_cache():
+        with contextlib.redirect_stdout(io.StringIO()):
+            source.fetch_cached(cache, session)
+
+    yield measure("xmltv.fetch", quiet(lambda: source.fetch_xml_data(session)), "xmltv", args.rounds, extra=info)
+    yield measure("xmltv.fetch_cached.200", quiet(lambda: source.fetch_cached(cache, session)), "xmltv", args.rounds,
+                  setup=clear_cache, extra=info)
+    yield measure("xmltv.fetch_cached.304", quiet(lambda: source.fetch_cached(cache, session)), "xmltv", args.rounds,
+                  setup=prime_cache, extra=info)
+    yield measure("xmltv.parse_xml_to_model", quiet(lambda: source.parse_xml_to_model(xml_data)), "xmltv", args.rounds,
+                  extra=info)
+    yield measure("xmltv.parse_xml_stream", quiet(open_stream), "xmltv", args.rounds, extra=info)
+
+
+def sky_benchmarks(args, stub: StubServer, workdir: Path):
+    data = build_sky_response(args.channels, args.days, args.seed)
+    slot_store_path = workdir / "skynz_slots.json"
+    # Fixture listings are dated in the past, so they are not trimmed to today's window
+    source = SkyNZ_EPG(stub.graphql_url, "", window_days=args.days, slot_store_path=slot_store_path, trim_window=False)
+    session = create_session(args.days)
+    info = {"slots": sum(len(channel["slotsForDay"]["slots"]) for channel in data["data"]["experience"]["channelGroup"]["channels"])}
+
+    def clear_slots():
+        if slot_store_path.exists():
+            slot_store_path.unlink()
+
+    yield measure("sky.fetch_day", quiet(lambda: source.fetch_day("2025-01-07", session)), "sky", args.rounds)
+    yield measure("sky.fetch_data.cold", quiet(lambda: source.fetch_data(session)), "sky", args.rounds,
+                  setup=clear_slots, extra={"days": args.days})
+    yield measure("sky.fetch_data.warm", quiet(lambda: source.fetch_data(session)), "sky", args.rounds,
+                  extra={"days": args.days, "refresh_days": source.refresh_days})
+    yield measure("sky.parse_program_data", quiet(lambda: source.parse_program_data(data)), "sky", args.rounds, extra=info)
+    yield measure("sky.parse_program_store", quiet(lambda: source.parse_program_store(data)), "sky", args.rounds, extra=info)
+
+
+def publish_benchmarks(args, stub: StubServer, workdir: Path):
+    source = XMLTV("", "Benchmark XMLTV", "Australia/Sydney")
+    store = quiet(lambda: source.parse_xml_to_store(build_xmltv_feed(args.channels, args.days, args.seed)))()
+    guide = store.to_program_guide()
+    info = {"events": store.event_count()}
+
+    # save_and_zip writes under output/ relative to the working directory
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        yield measure("publish.save_and_zip.store", quiet(lambda: save_and_zip(store, ["BENCH"], "Bench")), "publish",
+                      args.rounds, extra=info)
+        yield measure("publish.save_and_zip.model", quiet(lambda: save_and_zip(guide, ["BENCH"], "Bench")), "publish",
+                      args.rounds, extra=info)
+        yield measure("publish.save_and_zip.pretty", quiet(lambda: save_and_zip(store, ["BENCH"], "Bench", pretty=True)),
+                      "publish", args.rounds, extra=info)
+    finally:
+        os.chdir(previous)
+
+
+GROUPS = {"xmltv": xmltv_benchmarks, "sky": sky_benchmarks, "publish": publish_benchmarks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=120)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the stub server waits per request")
+    parser.add_argument("--only", choices=sorted(GROUPS), action="append", help="Run only these groups")
+    parser.add_argument("--results-dir", type=Path, default=BASE_RESULTS_DIR)
+    parser.add_argument("--compare", type=Path, help="Saved run to compare against, default the previous run")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    with StubServer(args.channels, args.days, args.seed, args.latency) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        for name in args.only or GROUPS:
+            workdir = Path(tmp) / name
+            workdir.mkdir()
+            for result in GROUPS[name](args, stub, workdir):
+                print(f"  {result.name}: {result.stats()['median']:.3f}s")
+                results.append(result)
+
+    saved = None
+    if not args.no_save:
+        params = {key: value for key, value in vars(args).items() if key not in ("results_dir", "compare", "no_save")}
+        saved = save_results(results, params, args.results_dir)
+        print(f"Results saved: {saved}")
+
+    baseline_path = args.compare or latest_results(args.results_dir, exclude=saved)
+    print_table(results, load_results(baseline_path) if baseline_path else None)
+    if baseline_path:
+        print(f"Compared against: {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
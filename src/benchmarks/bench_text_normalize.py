@@ -0,0 +1,65 @@
+"""Benchmark listing text normalization: the shared memoized table against Sky's previous regex clean_string.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_text_normalize --channels 100 --days 7
+"""
+import argparse
+import json
+import re
+import time
+
+from benchmarks.fixtures import build_sky_channels
+from utils.text_utils import normalize_text, transliterate
+
+
+def previous_clean_string(input_string: str) -> str:
+    """The previous approach: an uncompiled regex deleting all non-ASCII, then a replace."""
+    cleaned_string = re.sub(r'[^\x00-\x7F]+', '', input_string)
+    return cleaned_string.replace('’', "'")
+
+
+def listing_fields(channels: int, days: int) -> list:
+    """Every title, synopsis and rating of a week of Sky fixtures, as distinct string objects like a parsed response."""
+    fields = []
+    for day in range(days):
+        for channel in json.loads(json.dumps(build_sky_channels(channels, day))):
+            for slot in channel["slotsForDay"]["slots"]:
+                fields.append((slot["programme"]["title"], slot["programme"]["synopsis"], slot["ratingString"]))
+    return fields
+
+
+def time_per_event(func, fields, rounds: int) -> float:
+    """Best of 'rounds' passes over every event, in nanoseconds per event."""
+    best = float("inf")
+    for _ in range(rounds):
+        transliterate.cache_clear()  # Each pass starts cold, like a fresh run
+        started = time.perf_counter()
+        for title, synopsis, rating in fields:
+            func(title)
+            func(synopsis)
+            func(rating)
+        best = min(best, time.perf_counter() - started)
+    return best / len(fields) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    fields = listing_fields(args.channels, args.days)
+    non_ascii = sum(1 for event in fields for text in event if not text.isascii())
+    print(f"{len(fields)} events, {non_ascii} of {len(fields) * 3} strings not ASCII")
+
+    for name, func in (("regex clean_string", previous_clean_string), ("normalize_text", normalize_text)):
+        print(f"{name:<20} {time_per_event(func, fields, args.rounds):8.0f} ns/event")
+
+    sample = next(text for event in fields for text in event if "’" in text or "ā" in text)
+    print(f"\n{sample}\n  regex:     {previous_clean_string(sample)}\n  normalize: {normalize_text(sample)}")
+
+
+if __name__ == "__main__":
+    main()
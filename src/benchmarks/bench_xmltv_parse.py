@@ -0,0 +1,85 @@
+"""Benchmark the XMLTV parser against the old channel x programme scan with strptime per programme.
+
+Run from the 'src' directory:
+
+    python -m benchmarks.bench_xmltv_parse --channels 120 --days 7
+"""
+import argparse
+import pytz
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from benchmarks.fixtures import build_xmltv_feed
+from epg_sources.xmltv_net.main import XMLTV
+from models.epg_model import ProgramGuide, Channel, Event
+
+
+def legacy_event(source: XMLTV, programme_elem) -> Event:
+    """The previous per-programme mapping: two strptime calls and a pytz conversion, then a validated Event."""
+    utc_time = datetime.strptime(programme_elem.get('start'), "%Y%m%d%H%M%S %z")
+    local_time = utc_time.astimezone(pytz.timezone("Australia/Sydney"))
+    stop_time = datetime.strptime(programme_elem.get('stop'), "%Y%m%d%H%M%S %z")
+    return Event(
+        eventID=source.generate_random_string(),
+        title=source.safe_find_text(programme_elem, 'title'),
+        eventDescription=source.safe_find_text(programme_elem, 'desc'),
+        rating=source.safe_find_rating_value(programme_elem),
+        date=local_time.strftime("%Y-%m-%d"),
+        startTime=local_time.strftime("%H%M"),
+        length=str(int((stop_time - utc_time).total_seconds() // 60)),
+        genre=source.safe_find_text(programme_elem, 'category')
+    )
+
+
+def legacy_parse(source: XMLTV, xml_data: str) -> ProgramGuide:
+    """The previous parser: re-scans every programme for every channel and validates an Event per programme."""
+    root = ET.fromstring(xml_data)
+    channels = []
+    for channel_elem in root.findall('channel'):
+        channel = Channel(
+            channelID=channel_elem.get('id'),
+            name=source.safe_find_text(channel_elem, 'display-name'),
+            resolution="HD",
+            events=[]
+        )
+        for programme_elem in root.findall('programme'):
+            if programme_elem.attrib['channel'] == channel_elem.get('id'):
+                channel.events.append(legacy_event(source, programme_elem))
+        channels.append(channel)
+    return ProgramGuide(
+        filetype=source.title,
+        version="1.0",
+        fetchTime=source.get_fetch_time(),
+        maxMinutes=sum(int(event.length) for channel in channels for event in channel.events),
+        channels=channels
+    )
+
+
+def time_call(func, *args) -> float:
+    """Return the wall time in seconds taken by a single call."""
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=120)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    xml_data = build_xmltv_feed(args.channels, args.days)
+    source = XMLTV("synthetic", "Benchmark", "Australia/Sydney")
+
+    single_pass = time_call(source.parse_xml_to_model, xml_data)
+    legacy = time_call(legacy_parse, source, xml_data)
+
+    print(f"Feed: {args.channels} channels x {args.days} days ({len(xml_data) / 1e6:.1f} MB)")
+    print(f"Legacy nested scan: {legacy:.2f}s")
+    print(f"Single-pass index:  {single_pass:.2f}s")
+    print(f"Speedup:            {legacy / single_pass:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
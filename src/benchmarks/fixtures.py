@@ -0,0 +1,173 @@
+"""Synthetic XMLTV documents and Sky NZ channelGroup responses for offline benchmarks.
+
+Channel names, numbers and logos come from 'ref material/data/raw_channels.csv'
+when it is available, so the generated guides look like the real lineups.
+Everything is driven by a seeded random generator, so the same arguments
+always give byte-identical fixtures.
+"""
+import csv
+import random
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+from xml.sax.saxutils import escape, quoteattr
+
+REF_CHANNELS = Path(__file__).resolve().parents[2] / "ref material" / "data" / "raw_channels.csv"
+FIXTURE_START = datetime(2025, 1, 6, 17, 0, tzinfo=timezone.utc)  # Local midnight in Auckland
+SLOT_MINUTES = [5, 15, 30, 30, 30, 60, 60, 60, 90, 120]  # Weighted towards half hour and hour slots
+RATINGS = ["G", "PG", "M", "16", "18", "R16", ""]
+GENRES = ["News", "Sport", "Drama", "Comedy", "Documentary", "Movie", "Kids", "Lifestyle", "Music", "Reality"]
+TITLE_WORDS = [
+    "Morning", "Report", "Kiwi", "Coast", "Homes", "Rugby", "Live", "Best", "Kitchen", "Wild",
+    "Island", "Rescue", "Grand", "Designs", "Te", "Karere", "Whānau", "Café", "Cricket", "Night",
+]
+SENTENCES = [
+    "A look back at the week's biggest stories.",
+    "The team heads north to restore a 1920s villa on a tight budget.",
+    "Highlights from today's match, with analysis from the commentary box.",
+    "Two families swap homes for a week – and nobody is happy about it.",
+    "“It’s now or never”: a rookie chef faces the toughest service yet.",
+    "Wildlife cameras capture the first days of a kākāpō chick.",
+    "An investigation into rising rents across the country.",
+    "Classic comedy from the archives.",
+]
+
+
+def load_channel_names() -> List[dict]:
+    """Channel rows from the reference lineup, or a generated lineup when it is not available."""
+    try:
+        with REF_CHANNELS.open(encoding="utf-8-sig", newline="") as f:
+            rows = [row for row in csv.DictReader(f) if row.get("Channel_Name")]
+    except OSError:
+        rows = []
+    if not rows:
+        rows = [{"EPG_Map_No": str(i + 1), "Channel_Name": f"Channel {i + 1}", "Logo_Url": ""} for i in range(100)]
+    return rows
+
+
+def channel_lineup(channels: int) -> List[dict]:
+    """'channels' entries with id, name, number and logo, cycling the reference lineup when asked for more."""
+    names = load_channel_names()
+    lineup = []
+    for i in range(channels):
+        row = names[i % len(names)]
+        suffix = f" {i // len(names) + 1}" if i >= len(names) else ""
+        lineup.append({
+            "id": f"ch{i:03d}",
+            "name": row["Channel_Name"] + suffix,
+            "number": f"{i + 1:03d}",
+            "logo": row.get("Logo_Url", ""),
+        })
+    return lineup
+
+
+def programme_slots(rng: random.Random, start: datetime, end: datetime):
+    """Yield (begin, finish, title, description, rating, genre) filling [start, end) with back to back programmes."""
+    begin = start
+    while begin < end:
+        finish = min(begin + timedelta(minutes=rng.choice(SLOT_MINUTES)), end)
+        title = " ".join(rng.sample(TITLE_WORDS, rng.randint(1, 3)))
+        description = " ".join(rng.sample(SENTENCES, rng.randint(0, 3)))
+        yield begin, finish, title, description, rng.choice(RATINGS), rng.choice(GENRES)
+        begin = finish
+
+
+def build_xmltv_feed(channels: int, days: int, seed: int = 0, utc_offset: str = "+1000") -> str:
+    """An XMLTV document shaped like xmltv.net: channels first, then every programme with local offsets."""
+    rng = random.Random(seed)
+    lineup = channel_lineup(channels)
+    offset = timedelta(hours=int(utc_offset[:3]), minutes=int(utc_offset[0] + utc_offset[3:]))
+    end = FIXTURE_START + timedelta(days=days)
+
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>', '<tv generator-info-name="xmltv.net">']
+    for channel in lineup:
+        parts.append(
+            f'<channel id="{channel["id"]}.au"><display-name>{escape(channel["name"])}</display-name>'
+            f'<lcn>{channel["number"]}</lcn><icon src={quoteattr(channel["logo"])}/></channel>'
+        )
+    for channel in lineup:
+        for begin, finish, title, description, rating, genre in programme_slots(rng, FIXTURE_START, end):
+            local_begin = begin + offset
+            local_finish = finish + offset
+            elem = [
+                f'<programme start="{local_begin:%Y%m%d%H%M%S} {utc_offset}" stop="{local_finish:%Y%m%d%H%M%S} {utc_offset}" '
+                f'channel="{channel["id"]}.au"><title>{escape(title)}</title>'
+            ]
+            if description:
+                elem.append(f'<desc>{escape(description)}</desc>')
+            elem.append(f'<category>{genre}</category>')
+            if rating:
+                elem.append(f'<rating system="ACB"><value>{rating}</value></rating>')
+            elem.append('</programme>')
+            parts.append("".join(elem))
+    parts.append('</tv>')
+    return "\n".join(parts)
+
+
+def sky_programme(rng: random.Random, title: str, description: str, index: int) -> dict:
+    """A Sky 'programme' object, an Episode most of the time and otherwise a Movie."""
+    if rng.random() < 0.85:
+        return {
+            "id": f"ep{index}",
+            "title": title,
+            "synopsis": description,
+            "show": {"id": f"show{zlib.crc32(title.encode()) & 0xffff}", "title": title, "type": "SERIES"},
+        }
+    return {"id": f"mv{index}", "title": title, "synopsis": description}
+
+
+def build_sky_channels(channels: int, day: int, seed: int = 0) -> list:
+    """The 'channels' list of a Sky 'getChannelGroup' response for one day of the fixture window."""
+    rng = random.Random(seed * 1000 + day)
+    start = FIXTURE_START + timedelta(days=day)
+    result = []
+    for c, channel in enumerate(channel_lineup(channels)):
+        slots = []
+        for s, (begin, finish, title, description, rating, _) in enumerate(
+                programme_slots(rng, start, start + timedelta(days=1))):
+            start_ms = int(begin.timestamp() * 1000)
+            slots.append({
+                "id": f"slot-{c}-{start_ms}",
+                "startMs": start_ms,
+                "endMs": int(finish.timestamp() * 1000),
+                "ratingString": rating,
+                "programme": sky_programme(rng, title, description, c * 10000 + s),
+            })
+        result.append({
+            "id": channel["id"],
+            "title": channel["name"],
+            "number": int(channel["number"]),
+            "tileImage": {"uri": channel["logo"]},
+            "slotsForDay": {"slots": slots},
+        })
+    return result
+
+
+def fixture_date(day: int) -> str:
+    """The Auckland YYYY-MM-DD date of a fixture day."""
+    return (FIXTURE_START + timedelta(days=day, hours=13)).strftime("%Y-%m-%d")
+
+
+def wrap_sky_channels(channels: list) -> dict:
+    """Wrap a channel list in the full 'getChannelGroup' response envelope."""
+    return {
+        "data": {
+            "experience": {
+                "channelGroup": {
+                    "id": "4b7LA20J4iHaThwky9iVqn",
+                    "title": "All Channels",
+                    "channels": channels,
+                }
+            }
+        }
+    }
+
+
+def build_sky_response(channels: int, days: int, seed: int = 0) -> dict:
+    """A merged multi-day response, as SkyNZ_EPG.fetch_data returns it."""
+    merged = build_sky_channels(channels, 0, seed)
+    for day in range(1, days):
+        for channel, extra in zip(merged, build_sky_channels(channels, day, seed)):
+            channel["slotsForDay"]["slots"].extend(extra["slotsForDay"]["slots"])
+    return wrap_sky_channels(merged)
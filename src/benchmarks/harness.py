@@ -0,0 +1,133 @@
+"""Timing and peak memory measurement for the benchmark suite, with JSON results that can be compared between runs.
+
+Statistics follow pytest-benchmark's layout (min, max, mean, stddev, median,
+rounds) so results read the same way. Rounds are timed without tracing and
+the peak memory comes from one extra traced round, because tracemalloc
+slows allocation heavy code down severalfold.
+"""
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BASE_RESULTS_DIR = Path("benchmarks") / "results"
+
+
+class BenchmarkResult:
+    def __init__(self, name: str, group: str, times: List[float], peak_bytes: int, extra: dict = None):
+        self.name = name
+        self.group = group
+        self.times = times
+        self.peak_bytes = peak_bytes
+        self.extra = extra or {}
+
+    def stats(self) -> dict:
+        return {
+            "min": min(self.times),
+            "max": max(self.times),
+            "mean": statistics.fmean(self.times),
+            "stddev": statistics.stdev(self.times) if len(self.times) > 1 else 0.0,
+            "median": statistics.median(self.times),
+            "rounds": len(self.times),
+            "peak_bytes": self.peak_bytes,
+        }
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "group": self.group, "stats": self.stats(), "extra_info": self.extra}
+
+
+def measure(name: str, func: Callable[[], Any], group: str = "", rounds: int = 5,
+            setup: Optional[Callable[[], Any]] = None, extra: dict = None) -> BenchmarkResult:
+    """Time 'func' over several rounds, then run it once more under tracemalloc for the peak memory.
+
+    'setup' runs untimed before every round, for stages that consume their
+    input (a stream) or need a clean output directory.
+    """
+    times = []
+    for _ in range(rounds):
+        if setup:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(name, group, times, peak, extra)
+
+
+def machine_info() -> dict:
+    return {
+        "node": platform.node(),
+        "processor": platform.processor(),
+        "machine": platform.machine(),
+        "python_version": platform.python_version(),
+        "system": platform.system(),
+        "release": platform.release(),
+    }
+
+
+def commit_info() -> dict:
+    """The checked out commit, so results can be matched to code. Empty outside a git checkout."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    return {"id": commit, "dirty": dirty}
+
+
+def save_results(results: List[BenchmarkResult], params: dict, results_dir: Path = BASE_RESULTS_DIR) -> Path:
+    """Write a run to '<results_dir>/<timestamp>.json' and return the path."""
+    results_dir = Path(results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now()
+    path = results_dir / f"{now:%Y%m%d_%H%M%S}.json"
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({
+            "datetime": now.isoformat(timespec="seconds"),
+            "machine_info": machine_info(),
+            "commit_info": commit_info(),
+            "params": params,
+            "benchmarks": [result.to_dict() for result in results],
+        }, f, indent=4)
+    return path
+
+
+def load_results(path: Path) -> Dict[str, dict]:
+    """{benchmark name: stats} from a saved run."""
+    with Path(path).open("r", encoding="utf-8") as f:
+        return {bench["name"]: bench["stats"] for bench in json.load(f)["benchmarks"]}
+
+
+def latest_results(results_dir: Path = BASE_RESULTS_DIR, exclude: Path = None) -> Optional[Path]:
+    """The most recent saved run, other than 'exclude'."""
+    runs = sorted(path for path in Path(results_dir).glob("*.json") if path != exclude)
+    return runs[-1] if runs else None
+
+
+def print_table(results: List[BenchmarkResult], baseline: Dict[str, dict] = None) -> None:
+    """Print median time and peak memory per benchmark, with the change against a baseline run if given."""
+    print(f"{'benchmark':<32} {'median':>9} {'min':>9} {'peak MB':>9}" + (f" {'vs base':>9}" if baseline else ""))
+    for result in results:
+        stats = result.stats()
+        line = f"{result.name:<32} {stats['median']:8.3f}s {stats['min']:8.3f}s {stats['peak_bytes'] / 1e6:9.1f}"
+        if baseline:
+            base = baseline.get(result.name)
+            line += f" {(stats['median'] / base['median'] - 1) * 100:+8.1f}%" if base and base["median"] else f" {'new':>9}"
+        print(line)
@@ -0,0 +1,255 @@
+"""A local stand-in for xmltv.net and the Sky NZ GraphQL endpoint, so fetch paths can be timed offline.
+
+GET serves registered files (XMLTV documents, icons, JSON) with an ETag,
+answering 304 to a matching If-None-Match. POST /graphql answers a 'getChannelGroup'
+query with the fixture days its date variables map to. An optional delay
+per request approximates network latency, an optional bandwidth the link,
+and with 'compress' bodies are gzip transfer encoded for clients that accept it.
+inject() queues faults (error statuses, stalls, dropped connections) for a path.
+"""
+import gzip
+import hashlib
+import http.server
+import json
+import re
+import sys
+import threading
+import time
+from datetime import date
+
+from benchmarks.fixtures import build_sky_channels, fixture_date, wrap_sky_channels
+
+
+def select_fields(value, names: set):
+    """Drop every object key not among 'names', recursively."""
+    if isinstance(value, dict):
+        return {key: select_fields(item, names) for key, item in value.items() if key in names}
+    if isinstance(value, list):
+        return [select_fields(item, names) for item in value]
+    return value
+
+
+class ThreadingServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default backlog of 5 drops SYNs under concurrent fetches, costing a 1s retransmit
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return  # The client gave up, e.g. on a read timeout during an injected stall
+        super().handle_error(request, client_address)
+
+
+class StubServer:
+    """Serve fixtures on 127.0.0.1 from a background thread. Use as a context manager."""
+
+    def __init__(self, sky_channels: int = 100, sky_days: int = 7, seed: int = 0, latency: float = 0.0,
+                 bandwidth: float = 0.0, compress: bool = False):
+        self.files = {}  # path -> (body, etag, content type)
+        self.gzipped = {}  # path -> gzip transfer encoded body
+        self.sky_channels = sky_channels
+        self.sky_days = sky_days
+        self.seed = seed
+        self.latency = latency
+        self.bandwidth = bandwidth  # Bytes per second each response is throttled to, 0 for no limit
+        self.compress = compress
+        self.bytes_sent = 0
+        self.sky_cache = {}  # fixture day -> channel list
+        self.hits = {"get": 0, "not_modified": 0, "post": 0, "faults": 0}
+        self.faults = {}  # path -> faults still to inject, one per request
+        self.lock = threading.Lock()
+        self.server = None
+
+    def add_file(self, path: str, body: bytes, content_type: str = "application/octet-stream") -> str:
+        """Serve 'body' at 'path' (starting with '/') and return its URL. Re-adding a path replaces it."""
+        self.files[path] = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:32], content_type)
+        self.gzipped.pop(path, None)
+        return f"{self.base_url}{path}"
+
+    def add_feed(self, name: str, xml_data: str, gzipped: bool = False) -> str:
+        """Register an XMLTV document and return its URL, as a .xml.gz file when 'gzipped'."""
+        body = xml_data.encode("utf-8")
+        if gzipped:
+            return self.add_file(f"/{name}.xml.gz", gzip.compress(body, mtime=0), "application/gzip")
+        return self.add_file(f"/{name}.xml", body, "application/xml")
+
+    def transfer_body(self, path: str, body: bytes, accept_encoding: str):
+        """(body, Content-Encoding) to send, gzip encoded when enabled and the client accepts it."""
+        if not self.compress or "gzip" not in accept_encoding or path.endswith(".gz"):
+            return body, None
+        with self.lock:
+            if path not in self.gzipped:
+                self.gzipped[path] = gzip.compress(body, mtime=0)
+            return self.gzipped[path], "gzip"
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def graphql_url(self) -> str:
+        return f"{self.base_url}/graphql"
+
+    def sky_day(self, requested: str) -> list:
+        """The channel list for a requested date, mapped onto the fixture days so any date works."""
+        try:
+            offset = (date.fromisoformat(requested) - date.fromisoformat(fixture_date(0))).days
+        except (TypeError, ValueError):  # No date, or not YYYY-MM-DD
+            offset = 0
+        day = offset % self.sky_days
+        with self.lock:
+            if day not in self.sky_cache:
+                self.sky_cache[day] = build_sky_channels(self.sky_channels, day, self.seed)
+            return self.sky_cache[day]
+
+    def sky_body(self, variables: dict, query: str) -> bytes:
+        """The encoded response to a getChannelGroup query.
+
+        A '$date' query gets that date's 'slotsForDay'. A multi-day query
+        gets each '$dateN' date's slots under the alias 'dayN'. Fields the
+        query does not name are left out, as a GraphQL server would.
+        """
+        if "date" in variables:
+            channels = self.sky_day(variables["date"])
+        else:
+            days = []
+            while f"date{len(days)}" in variables:
+                days.append(self.sky_day(variables[f"date{len(days)}"]))
+            channels = [{key: value for key, value in channel.items() if key != "slotsForDay"} for channel in days[0]]
+            for i, day in enumerate(days):
+                for channel, day_channel in zip(channels, day):  # Every fixture day has the same lineup
+                    channel[f"day{i}"] = day_channel["slotsForDay"]
+        names = set(re.findall(r"\w+", query))
+        response = wrap_sky_channels(channels)
+        response["data"] = select_fields(response["data"], names)
+        return json.dumps(response).encode("utf-8")
+
+    def inject(self, path: str, *faults) -> None:
+        """Queue faults for the next requests to 'path', one per request, in order.
+
+        A fault is an HTTP status to answer with (e.g. 503), ("stall", seconds)
+        to wait before answering normally, ("body", bytes) to answer 200 with
+        that JSON body instead (e.g. a GraphQL error), or "drop" to close the
+        connection without a response.
+        """
+        with self.lock:
+            self.faults.setdefault(path, []).extend(faults)
+
+    def next_fault(self, path: str):
+        with self.lock:
+            queued = self.faults.get(path)
+            if not queued:
+                return None
+            self.hits["faults"] += 1
+            return queued.pop(0)
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.hits[key] += 1
+
+    def send(self, wfile, body: bytes) -> None:
+        """Write a body, at no more than 'bandwidth' bytes per second when set."""
+        with self.lock:
+            self.bytes_sent += len(body)
+        if not self.bandwidth:
+            wfile.write(body)
+            return
+        chunk = max(1, int(self.bandwidth / 100))  # 10ms slices
+        for offset in range(0, len(body), chunk):
+            wfile.write(body[offset:offset + chunk])
+            time.sleep(chunk / self.bandwidth)
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real endpoints behind a pooled session
+            disable_nagle_algorithm = True  # Headers and body go out in separate writes, don't add ACK delays
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_body(self, body: bytes, content_type: str, headers: dict = None) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                stub.send(self.wfile, body)
+
+            def apply_fault(self) -> bool:
+                """Inject the next queued fault for this path, returning True if the request was answered by it."""
+                fault = stub.next_fault(self.path)
+                if fault is None:
+                    return False
+                if fault == "drop":
+                    self.close_connection = True
+                    return True
+                if isinstance(fault, tuple) and fault[0] == "stall":
+                    time.sleep(fault[1])
+                    return False
+                if isinstance(fault, tuple) and fault[0] == "body":
+                    self.send_body(fault[1], "application/json")
+                    return True
+                self.send_response(fault)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+
+            def do_GET(self):
+                stub.count("get")
+                time.sleep(stub.latency)
+                if self.apply_fault():
+                    return
+                served = stub.files.get(self.path)
+                if served is None:
+                    self.send_error(404)
+                    return
+                body, etag, content_type = served
+                if self.headers.get("If-None-Match") == etag:
+                    stub.count("not_modified")
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, encoding = stub.transfer_body(self.path, body, self.headers.get("Accept-Encoding", ""))
+                headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+                if encoding:
+                    headers["Content-Encoding"] = encoding
+                self.send_body(body, content_type, headers)
+
+            def do_POST(self):
+                stub.count("post")
+                time.sleep(stub.latency)
+                length = int(self.headers.get("Content-Length", 0))
+                request_body = self.rfile.read(length)
+                if self.apply_fault():
+                    return
+                try:
+                    request = json.loads(request_body)
+                except ValueError:
+                    self.send_error(400)
+                    return
+                self.send_body(stub.sky_body(request.get("variables") or {}, request.get("query") or ""),
+                               "application/json")
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self.server = ThreadingServer(("127.0.0.1", 0), self.make_handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,242 @@
+"""Build the ProCentric channel icon bundle (channelIconsBundle.zip) from the Sky NZ channel list.
+
+Run from the 'src' directory:
+
+    python -m channel_bundle.main [--normalize]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.file_handler import BASE_OUTPUT_DIR
+from utils.http_cache import HTTPCache
+from utils.pipeline import create_session
+
+try:
+    from PIL import Image  # Optional, only needed to normalize icon sizes
+except ImportError:
+    Image = None
+
+CHANNELS_URL = "https://skywebconfig.msl-prod.skycloud.co.nz/sky/json/channels.prod.json"
+BASE_ICON_DIR = Path("cache") / "icons"  # Downloaded icons and the manifest of what the last bundle held
+BUNDLE_PATH = BASE_OUTPUT_DIR / "ChannelBundle" / "channelIconsBundle.zip"
+ICON_SIZE = (80, 60)  # What ProCentric displays
+
+BUNDLE_PROPERTIES = {
+    "type": "channelIcons",
+    "name": "NZ Channel Icons",
+    "region": "New Zealand",
+    "description": "Channel Icons for NZ including SKYNZ",
+    "author": "Gareth Cheyne",
+}
+
+
+def icon_filename(url: str) -> str:
+    """The icon's name inside the bundle, as the old builder named them."""
+    return url.split("/")[-1].replace("-", "_").lower()
+
+
+def normalize_icon(data: bytes, size=ICON_SIZE) -> bytes:
+    """Scale an icon to fit 'size' keeping its aspect ratio, centred on a transparent (or black) canvas."""
+    with Image.open(io.BytesIO(data)) as image:
+        image_format = image.format or "PNG"
+        if image.size == size:
+            return data
+        has_alpha = image_format != "JPEG"
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail(size, Image.LANCZOS)
+        canvas = Image.new(image.mode, size, (0, 0, 0, 0) if has_alpha else (0, 0, 0))
+        canvas.paste(image, ((size[0] - image.width) // 2, (size[1] - image.height) // 2))
+        output = io.BytesIO()
+        canvas.save(output, format=image_format)
+        return output.getvalue()
+
+
+class IconBundle:
+    """Incremental builder for the channel icon bundle.
+
+    Icons are fetched concurrently through the HTTP cache, so unchanged
+    logos come back as 304s. An icon file is only rewritten when its content
+    hash changes, and the ZIP is only rebuilt when the set of icons or the
+    channel mapping differs from the last bundle. The manifest in the icon
+    directory records what the last bundle was built from.
+    """
+
+    def __init__(self, channels_url: str = CHANNELS_URL, icon_dir: Path = BASE_ICON_DIR,
+                 bundle_path: Path = BUNDLE_PATH, normalize: bool = False, workers: int = 8,
+                 cache: HTTPCache = None, properties: dict = None):
+        if normalize and Image is None:
+            raise ValueError("Pillow is required to normalize icons, install it or build without --normalize.")
+        self.channels_url = channels_url
+        self.icon_dir = Path(icon_dir)
+        self.bundle_path = Path(bundle_path)
+        self.normalize = normalize
+        self.workers = workers
+        self.cache = cache or HTTPCache()
+        self.properties = properties or BUNDLE_PROPERTIES
+        self.manifest_path = self.icon_dir / "manifest.json"
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self) -> dict:
+        try:
+            with self.manifest_path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"icons": {}, "bundle_sha256": ""}
+
+    def save_manifest(self) -> None:
+        self.icon_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def fetch_channels(self, session=None) -> list:
+        """The Sky channel list, revalidated against the cache."""
+        print(f"Fetching channel list from {self.channels_url}...")
+        return self.cache.get(self.channels_url, session).json()
+
+    def fetch_icon(self, url: str, session=None) -> Optional[str]:
+        """Download one icon and write it to the icon directory if its content changed; returns its filename."""
+        filename = icon_filename(url)
+        known = self.manifest["icons"].get(filename, {})
+        icon_path = self.icon_dir / "channelIcons" / filename
+        try:
+            response = self.cache.get(url, session)
+        except Exception as e:
+            if filename in self.manifest["icons"] and icon_path.exists():
+                print(f"Warning: Could not fetch {url}, keeping the previous icon: {e}")
+                return filename
+            print(f"Error: Could not fetch {url}, leaving it out of the bundle: {e}")
+            return None
+
+        # Same source bytes processed the same way as last time: nothing to write
+        if (known.get("source_sha256") == response.sha256 and known.get("normalized") == self.normalize
+                and icon_path.exists()):
+            return filename
+
+        data = response.read_bytes()
+        if self.normalize:
+            try:
+                data = normalize_icon(data)
+            except Exception as e:
+                print(f"Warning: Could not normalize {filename}, using it as downloaded: {e}")
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        if sha256 != known.get("sha256") or not icon_path.exists():
+            icon_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = icon_path.with_suffix(icon_path.suffix + ".tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, icon_path)
+            print(f"Updated icon: {filename}")
+
+        self.manifest["icons"][filename] = {
+            "url": url,
+            "source_sha256": response.sha256,
+            "sha256": sha256,
+            "normalized": self.normalize,
+        }
+        return filename
+
+    def fetch_icons(self, channels: list, session=None) -> Dict[str, Optional[str]]:
+        """Fetch every distinct logo concurrently, returning {url: filename or None}."""
+        urls = sorted({channel["logoThumbnail"] for channel in channels if channel.get("logoThumbnail")})
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(zip(urls, executor.map(lambda url: self.fetch_icon(url, session), urls)))
+
+    def icon_map(self, channels: list, filenames: Dict[str, Optional[str]]) -> str:
+        """iconMap.txt: one 'number | filename | name' line per channel with an icon."""
+        lines = ["## iconsMap.txt\n", "# ID | filename | name | alias (optional)\n"]
+        for channel in channels:
+            filename = filenames.get(channel.get("logoThumbnail"))
+            if filename:
+                lines.append(f"{channel['number']} | {filename} | {channel['name']}\n")
+        return "".join(lines)
+
+    def bundle_properties(self) -> str:
+        today = datetime.today().date()
+        lines = ["# Channel Icons Properties File\n"]
+        lines += [f"{key} = {value}\n" for key, value in self.properties.items() if key != "author"]
+        lines.append(f"version = {today.strftime('%Y.%m.%d')}\n")
+        if "author" in self.properties:
+            lines.append(f"author = {self.properties['author']}\n")
+        lines.append(f"date = {today.strftime('%d/%m/%y')}\n")
+        return "".join(lines)
+
+    def bundle_digest(self, icon_map: str, filenames: List[str]) -> str:
+        """Hash of what the bundle holds, leaving out the date stamped into bundle.properties."""
+        digest = hashlib.sha256(icon_map.encode("utf-8"))
+        digest.update(json.dumps(self.properties, sort_keys=True).encode("utf-8"))
+        for filename in filenames:
+            digest.update(f"\x1e{filename}\x1f{self.manifest['icons'][filename]['sha256']}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def write_bundle(self, icon_map: str, filenames: List[str]) -> Path:
+        """Write the ZIP to a temporary name and atomically move it into place."""
+        self.bundle_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.bundle_path.with_suffix(".zip.tmp")
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr("bundle.properties", self.bundle_properties())
+            zipf.writestr("iconMap.txt", icon_map)
+            for filename in filenames:
+                zipf.write(self.icon_dir / "channelIcons" / filename, f"channelIcons/{filename}")
+        os.replace(tmp_path, self.bundle_path)
+        return self.bundle_path
+
+    def build(self, session=None) -> Optional[Path]:
+        """Refresh the icons and rebuild the bundle if anything changed; returns the ZIP path, or None on failure."""
+        own_session = session is None
+        session = session or create_session(self.workers)
+        try:
+            channels = self.fetch_channels(session)
+            filenames = self.fetch_icons(channels, session)
+        except Exception as e:
+            print(f"Error: Failed to fetch the channel list: {e}")
+            return None
+        finally:
+            if own_session:
+                session.close()
+
+        icon_map = self.icon_map(channels, filenames)
+        bundled = sorted({filename for filename in filenames.values() if filename})
+
+        # Forget and delete icons no channel uses any more
+        for filename in set(self.manifest["icons"]) - set(bundled):
+            del self.manifest["icons"][filename]
+            stale_path = self.icon_dir / "channelIcons" / filename
+            if stale_path.exists():
+                stale_path.unlink()
+                print(f"Removed unused icon: {filename}")
+
+        digest = self.bundle_digest(icon_map, bundled)
+        if digest == self.manifest.get("bundle_sha256") and self.bundle_path.exists():
+            print(f"Channel icons unchanged, keeping {self.bundle_path}")
+            self.save_manifest()
+            return self.bundle_path
+
+        self.write_bundle(icon_map, bundled)
+        self.manifest["bundle_sha256"] = digest
+        self.save_manifest()
+        print(f"Channel icon bundle created: {self.bundle_path} ({len(bundled)} icons)")
+        return self.bundle_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=CHANNELS_URL, help="Sky channel list URL")
+    parser.add_argument("--normalize", action="store_true", help=f"Resize icons to {ICON_SIZE[0]}x{ICON_SIZE[1]} (needs Pillow)")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    IconBundle(args.url, normalize=args.normalize, workers=args.workers).build()
+
+
+if __name__ == "__main__":
+    main()
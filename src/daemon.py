@@ -0,0 +1,276 @@
+"""Keep the EPG builder resident, refreshing each source on its own interval.
+
+Run from the 'src' directory:
+
+    python daemon.py [--config sources.toml]
+
+Send SIGHUP to refresh every source now. SIGTERM or Ctrl-C stops the daemon,
+killing any build still running. GET /health, /status and /metrics on the
+status port report on the scheduler, and /guide answers now/next and range
+queries over the guides it has built.
+"""
+import argparse
+import http.server
+import json
+import logging
+import signal
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+from main import build_jobs, build_modules, run_jobs
+from epg_sources.registry import DEFAULT_CONFIG, create_regions, load_config
+from models.guide_index import GuideService
+from utils.http_cache import HTTPCache
+from utils.metrics import metrics
+from utils.pipeline import create_session, preload_builds
+from utils.resilience import session_options
+
+DEFAULT_INTERVAL = 3600  # Seconds between refreshes of a source without an 'interval'
+DEFAULT_STAGGER = 60  # Seconds between the first runs of consecutive sources
+HEALTH_GRACE = 60  # Seconds the scheduler may be late before /health reports it stuck
+
+
+def timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds).isoformat(timespec="seconds") if seconds else None
+
+
+class ScheduledJob:
+    """A pipeline job, when it next runs and how its regions fared last time."""
+
+    def __init__(self, job, regions: list, interval: float, next_run: float):
+        self.job = job
+        self.regions = regions  # Names of the regions the job builds, one unless it is a group
+        self.interval = interval
+        self.next_run = next_run
+        self.last_started = 0.0
+        self.last_finished = 0.0
+        self.results = {}  # region -> "ok" or the error of the last run
+        self.last_success = {}  # region -> time its ZIP was last built or reused
+
+    def to_dict(self) -> dict:
+        return {
+            "interval": self.interval,
+            "next_run": timestamp(self.next_run),
+            "last_started": timestamp(self.last_started),
+            "last_finished": timestamp(self.last_finished),
+            "regions": {name: {"result": result, "last_success": timestamp(self.last_success.get(name))}
+                        for name, result in self.results.items()},
+        }
+
+
+class EPGDaemon:
+    """Run every configured source on its own interval from one long lived process.
+
+    The source objects, HTTP cache, pooled session (with its open connections)
+    and the guide query index live for the whole process, so a refresh costs
+    only the upstream revalidation when nothing changed. Builds run in fresh
+    processes started from a fork server, where the platform has one, that
+    imported the source and parser modules once, so they skip the imports.
+    The memo caches they fill while parsing (timezone offsets,
+    transliterations, interned strings) start empty on every build. First
+    runs are staggered so sources do not all hit the network and CPU
+    together.
+    """
+
+    def __init__(self, config_path: Path = DEFAULT_CONFIG, names: list = None):
+        config = load_config(config_path)
+        self.defaults = config.get("defaults", {})
+        options = config.get("daemon", {})
+        self.status_host = options.get("status_host", "127.0.0.1")
+        self.status_port = options.get("status_port", 8080)
+        stagger = options.get("stagger", DEFAULT_STAGGER)
+
+        self.cache = HTTPCache()
+        self.session = create_session(self.defaults.get("fetch_workers", 8), **session_options(self.defaults))
+        regions = create_regions(config, names)
+        multi_region = self.defaults.get("multi_region", False)
+        jobs = build_jobs(regions, self.cache, multi_region)
+        preload_builds(build_modules(regions, multi_region))
+
+        # Job name -> its regions, as build_jobs groups them
+        members = {}
+        for region in regions:
+            key = region.group if multi_region and region.group else region.name
+            members.setdefault(key, []).extend([region.name] + [lineup.name for lineup in region.lineups])
+
+        # Zone of every region's and lineup's guide, for the query index
+        self.timezones = {}
+        for region in regions:
+            timezone = getattr(region.source, "timezone", 0)
+            self.timezones[region.name] = timezone
+            self.timezones.update((lineup.name, timezone) for lineup in region.lineups)
+        self.guides = GuideService()
+
+        now = time.time()
+        self.schedule = [ScheduledJob(job, members.get(job.name, [job.name]), job.interval or DEFAULT_INTERVAL,
+                                      now + index * stagger)
+                         for index, job in enumerate(jobs)]
+        self.wakeup = threading.Event()  # Set to re-check the schedule early
+        self.stopping = threading.Event()
+        self.running = False
+        self.started = now
+        self.heartbeat = now  # Last time the scheduler loop came round
+        self.server = None
+
+    def refresh(self) -> None:
+        """Make every source due now."""
+        now = time.time()
+        for entry in self.schedule:
+            entry.next_run = min(entry.next_run, now)
+        self.wakeup.set()
+
+    def run_due(self) -> None:
+        """Run every job that is due as one pipeline run, then schedule each one's next run."""
+        now = time.time()
+        due = [entry for entry in self.schedule if entry.next_run <= now]
+        if not due:
+            return
+
+        logging.info(f"Refreshing: {', '.join(entry.job.name for entry in due)}")
+        scheduled = {}
+        for entry in due:
+            entry.last_started = now
+            scheduled[entry.job.name] = entry.next_run
+        metrics.clear(["global"] + [name for entry in due for name in [entry.job.name, *entry.regions]])
+
+        self.running = True
+        try:
+            results = run_jobs([entry.job for entry in due], self.cache, self.defaults, self.session)
+        finally:
+            self.running = False
+
+        finished = time.time()
+        for entry in due:
+            for name in entry.regions:
+                result = results.get(name, Exception("no result"))
+                entry.results[name] = f"failed: {result}" if isinstance(result, Exception) else "ok"
+                if not isinstance(result, Exception):
+                    entry.last_success[name] = finished
+            entry.last_finished = finished
+            self.index_guides(entry.regions, results)
+            if entry.next_run != scheduled[entry.job.name]:
+                continue  # Refresh requested while it ran, run it again straight away
+            # Keep to the cadence, but never schedule into the past after a long run
+            entry.next_run = max(entry.next_run + entry.interval, finished)
+
+    def index_guides(self, names: list, results: dict) -> None:
+        """Swap the freshly built ZIPs into the query index, a failed region keeps serving its last guide."""
+        for name in names:
+            result = results.get(name)
+            if not isinstance(result, Path):
+                continue
+            try:
+                if self.guides.update(name, result, self.timezones.get(name, 0)):
+                    logging.info(f"Guide for '{name}' indexed for queries.")
+            except Exception as e:
+                logging.error(f"Indexing failed for '{name}': {e}")
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "healthy": self.healthy(),
+            "started": timestamp(self.started),
+            "uptime_seconds": round(now - self.started),
+            "refreshing": self.running,
+            "open_circuits": self.session.breaker.open_hosts(),
+            "jobs": {entry.job.name: entry.to_dict() for entry in self.schedule},
+        }
+
+    def healthy(self) -> bool:
+        """The scheduler loop is alive: idle and on time, or inside a run that is still within its timeouts."""
+        if self.running:
+            timeouts = [entry.job.timeout for entry in self.schedule]
+            budget = float("inf") if None in timeouts else sum(timeouts)
+            return time.time() - self.heartbeat <= budget + HEALTH_GRACE
+        next_run = min((entry.next_run for entry in self.schedule), default=time.time())
+        return time.time() <= max(next_run, self.heartbeat) + HEALTH_GRACE
+
+    def start_status_server(self) -> None:
+        if not self.status_port:
+            return
+        self.server = http.server.ThreadingHTTPServer((self.status_host, self.status_port), status_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="status-server", daemon=True).start()
+        logging.info(f"Status endpoint listening on http://{self.status_host}:{self.server.server_address[1]}/status")
+
+    def handle_signal(self, signum, frame) -> None:
+        if signum == signal.SIGHUP:
+            logging.info("SIGHUP received, refreshing every source.")
+            self.refresh()
+            return
+
+        logging.info("Stopping the EPG daemon...")
+        self.stopping.set()
+        self.wakeup.set()
+        if self.running:
+            raise SystemExit(1)  # Unwinds the pipeline, which kills its build processes
+
+    def run(self) -> None:
+        """Schedule sources until stopped."""
+        signal.signal(signal.SIGHUP, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+        self.start_status_server()
+
+        try:
+            while not self.stopping.is_set():
+                self.heartbeat = time.time()
+                self.run_due()
+                self.heartbeat = time.time()
+                next_run = min(entry.next_run for entry in self.schedule)
+                self.wakeup.wait(max(0.0, next_run - time.time()))
+                self.wakeup.clear()
+        finally:
+            if self.server is not None:
+                self.server.shutdown()
+                self.server.server_close()
+            self.session.close()
+        logging.info("EPG daemon stopped.")
+
+
+def status_handler(daemon: EPGDaemon):
+    class StatusHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_text(self, code: int, body: str, content_type: str) -> None:
+            data = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/guide" or url.path.startswith("/guide/"):
+                code, body = daemon.guides.query(url.path, dict(parse_qsl(url.query)))
+                self.send_text(code, json.dumps(body), "application/json")
+            elif self.path == "/health":
+                healthy = daemon.healthy()
+                self.send_text(200 if healthy else 503, "ok\n" if healthy else "stuck\n", "text/plain")
+            elif self.path == "/status":
+                self.send_text(200, json.dumps(daemon.status(), indent=4), "application/json")
+            elif self.path == "/metrics":
+                self.send_text(200, metrics.prometheus(), "text/plain; version=0.0.4")
+            else:
+                self.send_error(404)
+
+    return StatusHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG, help="Source config (TOML or YAML)")
+    parser.add_argument("--region", action="append", metavar="NAME", help="Only this region, repeat for several")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    EPGDaemon(args.config, args.region).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import importlib
+import tomllib
+from pathlib import Path
+from typing import List, Union
+
+from epg_sources.source import Source
+from models.lineup import Lineup, read_icon_map
+
+try:
+    import yaml  # Optional, only needed for .yaml/.yml configs
+except ImportError:
+    yaml = None
+
+DEFAULT_CONFIG = Path("sources.toml")  # Relative to the 'src' directory, like the output and cache paths
+
+# Config 'type' -> Source class, or "module:Class" imported the first time a config uses it
+SOURCE_TYPES = {
+    "xmltv": "epg_sources.xmltv_net.main:XMLTV",
+    "sky_nz": "epg_sources.sky_nz.main:SkyNZ_EPG",
+}
+
+# Keys of a [[source]] entry that describe the region rather than the source itself
+REGION_KEYS = ("name", "type", "output", "prefix", "group", "timeout", "interval", "debug", "stale_max_age")
+
+
+class Region:
+    """A configured source and where its ZIP is published."""
+
+    def __init__(self, name: str, source: Source, location_tags: List[str], file_prefix: str,
+                 group: str = "", timeout: float = None, interval: float = None, debug: bool = False,
+                 stale_max_age: float = 0):
+        self.name = name
+        self.source = source
+        self.location_tags = location_tags  # Subdirectories under the output directory, e.g. ["EPG", "AUS", "SYD"]
+        self.file_prefix = file_prefix  # ZIP name before the date, e.g. "Procentric_EPG_SYD"
+        self.group = group  # Regions sharing a group are fetched and built as one job
+        self.timeout = timeout  # Wall clock seconds for fetch and build, None for no limit
+        self.interval = interval  # Seconds between refreshes in daemon mode
+        self.debug = debug  # Dump the fetched payload to the debug directory
+        self.stale_max_age = stale_max_age  # Seconds the last good ZIP is republished while upstream fails, 0 never
+        self.lineups: List[Lineup] = []  # Property lineups filtered from this region's guide
+
+
+def register_source(type_name: str, source_class: Union[type, str]) -> None:
+    """Make a Source class, or a "module:Class" path to one, available to configs under the given 'type'."""
+    SOURCE_TYPES[type_name] = source_class
+
+
+def source_class(type_name: str) -> type:
+    """The Source class for a config 'type', importing its module on first use."""
+    entry = SOURCE_TYPES.get(type_name)
+    if isinstance(entry, str):
+        module_name, _, class_name = entry.partition(":")
+        entry = SOURCE_TYPES[type_name] = getattr(importlib.import_module(module_name), class_name)
+    return entry
+
+
+def load_config(path: Path = DEFAULT_CONFIG) -> dict:
+    """Read a TOML or YAML source config."""
+    path = Path(path)
+    if path.suffix in (".yaml", ".yml"):
+        if yaml is None:
+            raise ValueError(f"PyYAML is required to read {path}, install it or use a TOML config.")
+        with path.open("r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+
+    with path.open("rb") as f:
+        return tomllib.load(f)
+
+
+def unknown_regions(config: dict, names: List[str]) -> List[str]:
+    """The names in 'names' that are not a configured [[source]], each with a hint when it names a lineup."""
+    configured = {entry.get("name") for entry in config.get("source", [])}
+    lineups = {entry.get("name"): entry.get("region") for entry in config.get("lineup", [])}
+    return [f"{name} (a lineup of {lineups[name]})" if name in lineups else name
+            for name in names or [] if name not in configured]
+
+
+def create_regions(config: dict, names: List[str] = None) -> List[Region]:
+    """Instantiate the configured sources, optionally only the named regions.
+
+    Every key of a [[source]] entry that is not a region key is passed to the
+    source class as a keyword argument, so new options need no registry change.
+    """
+    defaults = config.get("defaults", {})
+    regions = []
+    for entry in config.get("source", []):
+        name = entry.get("name")
+        if not name:
+            raise ValueError(f"Source entry without a name: {entry}")
+        if names and name not in names:
+            continue
+
+        if entry.get("type") not in SOURCE_TYPES:
+            raise ValueError(f"Unknown source type '{entry.get('type')}' for '{name}', expected one of: {', '.join(SOURCE_TYPES)}")
+
+        options = {key: value for key, value in entry.items() if key not in REGION_KEYS}
+        try:
+            source = source_class(entry["type"])(**options)
+        except TypeError as e:
+            raise ValueError(f"Invalid options for '{name}': {e}") from e
+
+        regions.append(Region(
+            name=name,
+            source=source,
+            location_tags=list(entry.get("output", ["EPG", name])),
+            file_prefix=entry.get("prefix", f"Procentric_EPG_{name}"),
+            group=entry.get("group", ""),
+            timeout=entry.get("timeout", defaults.get("timeout")),
+            interval=entry.get("interval", defaults.get("interval")),
+            debug=entry.get("debug", False),
+            stale_max_age=entry.get("stale_max_age", defaults.get("stale_max_age", 0))
+        ))
+
+    if names:
+        missing = set(names) - {region.name for region in regions}
+        if missing:
+            raise ValueError(f"No configured source named: {', '.join(sorted(missing))}")
+
+    configured = {entry.get("name") for entry in config.get("source", [])}
+    selected = {region.name: region for region in regions}
+    for entry in config.get("lineup", []):
+        lineup = create_lineup(entry)
+        if lineup.region not in configured:
+            raise ValueError(f"Lineup '{lineup.name}' is for unknown region '{lineup.region}'")
+        if lineup.name in configured:
+            raise ValueError(f"Lineup '{lineup.name}' has the same name as a region")
+        if lineup.region in selected:
+            selected[lineup.region].lineups.append(lineup)
+    return regions
+
+
+def create_lineup(entry: dict) -> Lineup:
+    """Build a property lineup from a [[lineup]] entry.
+
+    'channels' is either a list of upstream channel IDs or numbers, published
+    under their own IDs, or a table of published ID = upstream ID or number,
+    renumbering them. 'icon_map' reads the list from an iconMap.txt instead.
+    """
+    name = entry.get("name")
+    if not name or not entry.get("region"):
+        raise ValueError(f"Lineup entry needs a name and a region: {entry}")
+
+    channels = entry.get("channels", [])
+    if entry.get("icon_map"):
+        pairs = [(key, None) for key in read_icon_map(entry["icon_map"])]
+    elif isinstance(channels, dict):
+        pairs = [(str(source_key), str(published_id)) for published_id, source_key in channels.items()]
+    else:
+        pairs = [(str(source_key), None) for source_key in channels]
+    if not pairs:
+        raise ValueError(f"Lineup '{name}' has no channels")
+
+    return Lineup(
+        name=name,
+        region=entry["region"],
+        channels=pairs,
+        location_tags=list(entry.get("output", ["EPG", name])),
+        file_prefix=entry.get("prefix", f"Procentric_EPG_{name}"),
+        title=entry.get("title", "")
+    )
@@ -1,136 +1,214 @@
-import re
-import requests
-from typing import List
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import pytz
-from models.epg_model import ProgramGuide, Channel, Event, get_fetch_time
-
-
-# Get current date in New Zealand time zone
-nz_timezone = pytz.timezone("Pacific/Auckland")
-nz_date = datetime.now(nz_timezone).strftime("%Y-%m-%d")
-
-# Generate a list of dates for today and the next two days
-nz_dates = [(datetime.now(nz_timezone) + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(3)]
-
-
-
-class SkyNZ_EPG:
-    def __init__(self, url: str, zip_output_path: str):
+from pathlib import Path
+from models.event_store import GuideStore
+from models.guide_processing import process_guide
+from utils.time_utils import format_fetch_time, get_timezone, local_day_window
+from epg_sources.sky_nz.slot_store import SlotStore, BASE_SLOT_STORE
+from epg_sources.source import Source
+from utils.metrics import metrics
+from utils.resilience import default_session
+from utils.text_utils import normalize_text
+
+
+CHANNEL_GROUP_ID = "4b7LA20J4iHaThwky9iVqn"
+
+# Only what parse_program_store() reads: the slot id becomes the event id, the channel number matches lineups
+SLOT_FIELDS = """
+    id
+    startMs
+    endMs
+    ratingString
+    programme {
+        ... on Episode { title synopsis }
+        ... on Movie { title synopsis }
+        ... on PayPerViewEventProgram { title synopsis }
+    }
+"""
+
+
+def build_query(days: int) -> str:
+    """A getChannelGroup query for 'days' dates at once, each date's slotsForDay aliased as day0, day1, ..."""
+    variables = "".join(f", $date{i}: LocalDate" for i in range(days))
+    slots = "".join(f"""
+                        day{i}: slotsForDay(date: $date{i}) {{
+                            slots {{{SLOT_FIELDS}}}
+                        }}""" for i in range(days))
+    return f"""
+        query getChannelGroup($id: ID!{variables}) {{
+            experience(appId: TV_GUIDE_WEB) {{
+                channelGroup(id: $id) {{
+                    channels {{
+                        ... on LinearChannel {{
+                            id
+                            title
+                            number{slots}
+                        }}
+                    }}
+                }}
+            }}
+        }}
+    """
+
+
+def split_days(channels: list, dates: List[str], errors: list = None) -> Dict[str, Optional[list]]:
+    """Split an aliased multi-day response into the per-date channel lists the slot store keeps.
+
+    A date none of the channels has slots for, in a response with errors
+    (including one with no data at all), is reported as failed (None)
+    rather than stored as an empty day.
+    """
+    days = {}
+    for i, date in enumerate(dates):
+        alias = f"day{i}"
+        if errors and not any(channel.get(alias) for channel in channels):
+            print(f"Error: Sky NZ returned no slots for {date}: {errors[0].get('message', errors[0])}")
+            days[date] = None
+            continue
+        days[date] = [
+            {"id": channel.get("id"), "title": channel.get("title"), "number": channel.get("number"),
+             "slotsForDay": channel.get(alias)}
+            for channel in channels
+        ]
+    return days
+
+
+class SkyNZ_EPG(Source):
+    title = "Sky NZ"
+
+    def __init__(self, url: str, zip_output_path: str = "", timezone: str = "Pacific/Auckland",
+                 window_days: int = 3, refresh_days: int = 1, slot_store_path: Path = BASE_SLOT_STORE,
+                 trim_window: bool = True, fill_gaps: bool = False, batch_days: int = 7):
         self.url = url
         self.zip_output_path = zip_output_path
+        self.timezone = timezone  # Listings are emitted in this zone's local time
+        self.window_days = window_days  # How many days of listings to publish, starting today
+        self.refresh_days = refresh_days  # Near-term days re-fetched every run because they may still change
+        self.slot_store_path = slot_store_path
+        self.trim_window = trim_window  # Clip listings to the window, slots run past its last midnight
+        self.fill_gaps = fill_gaps  # Fill gaps in a channel's listings with "No information"
+        self.batch_days = max(1, batch_days)  # Dates fetched per GraphQL request, 1 for a request per date
+        self.digest = ""  # Content hash of the published window, empty when unknown
+
+    def window_dates(self) -> List[str]:
+        """The YYYY-MM-DD dates in the guide window, starting with today in New Zealand."""
+        today = datetime.now(get_timezone(self.timezone)).date()
+        return [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(self.window_days)]
+
+    def fetch_data(self, session=None, cache=None):
+        """Fetch data from the GraphQL endpoint.
+
+        Slots are kept in a persistent per-date store. Each run only requests
+        the dates not held yet (normally just the newly visible last day) plus
+        the first 'refresh_days' days, drops days that have passed, and merges
+        the window into one entry per channel. 'self.digest' is set to a hash
+        of the window's content so callers can tell whether anything changed.
+        A day that fails to refresh keeps its held slots, a day never fetched
+        fails the whole fetch.
+        """
+        dates = self.window_dates()
+        slot_store = SlotStore(self.slot_store_path)
+        slot_store.drop_before(dates[0])
+
+        to_fetch = [date for i, date in enumerate(dates) if i < self.refresh_days or not slot_store.has(date)]
+        print(f"Fetching Sky NZ slots for {len(to_fetch)} of {len(dates)} days: {', '.join(to_fetch)}")
+
+        if to_fetch:
+            # Batches of up to 'batch_days' dates per request, the batches fetched concurrently
+            batches = [to_fetch[i:i + self.batch_days] for i in range(0, len(to_fetch), self.batch_days)]
+            with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+                fetched = list(executor.map(metrics.bind(lambda dates: self.fetch_days(dates, session, cache)), batches))
+            results = [days[date] for days in fetched for date in days]
+
+            missing = []
+            for date, channels in zip(to_fetch, results):
+                if channels is not None:
+                    slot_store.put(date, channels)
+                elif slot_store.has(date):
+                    # A refresh failed: the slots held from an earlier run are better than dropping the region
+                    print(f"Warning: Could not refresh Sky NZ slots for {date}, keeping the ones held.")
+                    metrics.count("stale_days")
+                else:
+                    missing.append(date)
+            slot_store.save()  # Keep the days that did arrive for the next run
+            if missing:
+                print(f"Error: No Sky NZ slots for {', '.join(missing)}.")
+                return None
 
-    def fetch_data(self):
-        """Fetch data from the GraphQL endpoint."""
-
-        headers = {
-            'Content-Type': 'application/json',
-        }
+        self.digest = slot_store.digest(dates)
 
-        merged_data = {
+        return {
             "data": {
                 "experience": {
                     "channelGroup": {
-                        "channels": []
+                        "channels": slot_store.merged_channels(dates)
                     }
                 }
             }
         }
 
+    def fetch(self, cache, session=None):
+        """Fetch the guide window, returning (merged response, digest of the window's content)."""
+        data = self.fetch_data(session, cache)
+        if not data:
+            raise Exception("No data returned from Sky NZ.")
+        return data, self.digest
 
-        for nz_date in nz_dates:
-            # Define the request body with the dynamic date
-            print(f"Fetching data for date: {nz_date}")
-
-            body = {
-                "query": """
-                    query getChannelGroup($id: ID!, $date: LocalDate) {
-                        experience(appId: TV_GUIDE_WEB) {
-                            channelGroup(id: $id) {
-                                id
-                                title
-                                channels {
-                                    ... on LinearChannel {
-                                        id
-                                        title
-                                        number
-                                        tileImage {
-                                            uri
-                                        }
-                                        slotsForDay(date: $date) {
-                                            slots {
-                                                id
-                                                startMs
-                                                endMs
-                                                ratingString
-                                                programme {
-                                                    ... on Episode {
-                                                        id
-                                                        title
-                                                        synopsis
-                                                        show {
-                                                            id
-                                                            title
-                                                            type
-                                                        }
-                                                    }
-                                                    ... on Movie {
-                                                        id
-                                                        title
-                                                        synopsis
-                                                    }
-                                                    ... on PayPerViewEventProgram {
-                                                        id
-                                                        title
-                                                        synopsis
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                """,
-                "variables": {
-                    "id": "4b7LA20J4iHaThwky9iVqn",
-                    "date": nz_date
-                }
-            }
+    def parse(self, data) -> GuideStore:
+        return self.parse_program_store(data)
 
+    def fetch_day(self, nz_date: str, session=None, cache=None):
+        """Fetch the channel list with slots for a single date, or None on failure."""
+        return self.fetch_days([nz_date], session, cache)[nz_date]
 
+    def fetch_days(self, dates: List[str], session=None, cache=None) -> Dict[str, Optional[list]]:
+        """Fetch several dates in one request, returning {date: channel list with 'slotsForDay', or None on failure}.
 
-            response = requests.post(self.url, headers=headers, json=body)
-            if response.status_code == 200:
-                # Extract channel list safely
-                data = response.json()
+        The channel list comes back once, with each date's slots under its
+        own alias, and is split back into one list per date for the slot store.
+        """
+        headers = {
+            'Content-Type': 'application/json',
+        }
+        print(f"Fetching data for dates: {', '.join(dates)}")
+        body = {
+            "query": build_query(len(dates)),
+            "variables": {"id": CHANNEL_GROUP_ID, **{f"date{i}": date for i, date in enumerate(dates)}}
+        }
 
-                channels = (
-                    data.get("data", {})
-                    .get("experience", {})
-                    .get("channelGroup", {})
-                    .get("channels", [])
-                )
+        try:
+            if cache is not None:
+                data = cache.post(self.url, body, session, headers).json()
+            else:
+                response = (session or default_session()).post(self.url, headers=headers, json=body)
+                if response.status_code != 200:
+                    raise Exception(f"Status code: {response.status_code}")
+                metrics.count("bytes_downloaded", len(response.content))
+                data = response.json()
+        except Exception as e:
+            print(f"Error: Failed to fetch data. {e}")
+            return {date: None for date in dates}
 
-                # Merge channels by appending them to the merged_data
-                merged_data["data"]["experience"]["channelGroup"]["channels"].extend(channels)
+        metrics.count("graphql_requests")
+        if not isinstance(data, dict):
+            print(f"Error: Unexpected Sky NZ response for {', '.join(dates)}: {str(data)[:200]}")
+            return {date: None for date in dates}
+        return split_days(self.extract_channels(data), dates, data.get("errors"))
 
-            else:
-                print(f"Error: Failed to fetch data. Status code: {response.status_code}")
-                return None
+    def extract_channels(self, data: dict) -> list:
+        """Extract the channel list safely from a channelGroup response.
 
-        return merged_data
+        GraphQL answers an error with 'data', any level below it or a single
+        channel null, so each level falls back to empty.
+        """
+        group = ((data.get("data") or {}).get("experience") or {}).get("channelGroup") or {}
+        return [channel for channel in group.get("channels") or [] if channel]
 
 
     def clean_string(self, input_string: str) -> str:
-        """Removes unsupported characters and replaces them with a standard character."""
-        # Remove non-ASCII characters
-        cleaned_string = re.sub(r'[^\x00-\x7F]+', '', input_string)
-        # Replace specific characters with standard ones (e.g., \u2019 -> regular apostrophe)
-        cleaned_string = cleaned_string.replace('\u2019', "'")
-        # You can add more replacements here if necessary (e.g., \u2026 -> ...)
-        return cleaned_string
+        """Transliterate macrons and typographic punctuation to ProCentric safe ASCII, dropping anything else."""
+        return normalize_text(input_string)
 
     def safe_find_text(self, parent, tag: str, default: str = "") -> str:
         """Safely finds the value of a dictionary key or returns a default value if the key is missing, and cleans the text."""
@@ -145,19 +223,23 @@ class SkyNZ_EPG:
 
     def parse_program_data(self, data):
         """Parse the response data from the GraphQL query and map it to the ProgramGuide model."""
+        store = self.parse_program_store(data)
+        return store.to_program_guide() if store else None
+
+    def parse_program_store(self, data):
+        """Parse the response data from the GraphQL query into the compact GuideStore."""
         # Ensure we have the expected structure
 
         if 'data' not in data or 'experience' not in data['data'] or 'channelGroup' not in data['data']['experience']:
             print("Error: Unexpected data structure.")
             return None
 
-        # Prepare the ProgramGuide model
-        program_guide = ProgramGuide(
+        # Prepare the guide store
+        store = GuideStore(
             filetype="Pro:Centric JSON Program Guide Data NZL",
             version="1.0",
-            fetchTime=get_fetch_time(),
-            maxMinutes=0, 
-            channels=[]
+            fetchTime=format_fetch_time(self.timezone),
+            maxMinutes=0
         )
 
         # Extract channel group and channels
@@ -165,12 +247,12 @@ class SkyNZ_EPG:
 
         # Parse the channels
         for channel in channel_group_data['channels']:
-            # Initialize Channel model
-            channel_obj = Channel(
+            # Add the channel to the store's channel list
+            channel_obj = store.add_channel(
                 channelID=channel['id'],
-                name=channel['title'],
+                name=normalize_text(channel['title']),
                 resolution="HD",  # Default resolution, you might have to adjust if info is available
-                events=[]
+                number=str(channel.get('number') or "")  # Matches the IDs in iconMap.txt, used by lineups
             )
 
             # Check if 'slotsForDay' exists and is a dictionary with the 'slots' key
@@ -185,63 +267,28 @@ class SkyNZ_EPG:
                     event_description = self.safe_find_text(programme, 'synopsis', '')  # Safe retrieval
                     rating = self.safe_find_text(slot, 'ratingString', '')  # Safe retrieval
 
-                    # Map event data to the Event model
-                    event_obj = Event(
+                    # Map event data to an event record on the channel
+                    store.add_event(
+                        channel_obj,
                         eventID=slot['id'],
                         title=title,  # Default to empty string if title is missing
                         eventDescription=event_description,
                         rating=rating, # If ratings are available, map them here
-                        date=self.format_date(slot['startMs']),  # Ensure correct date format
-                        startTime=self.format_start_time(slot['startMs']),  # Convert start time from ms
-                        length=self.calculate_length(slot['startMs'], slot['endMs']),  # Duration in minutes
-                        genre= ""
+                        genre= "",
+                        start=slot['startMs'] // 1000,  # Local date, start time and length are filled in by localize()
+                        stop=slot['endMs'] // 1000
                     )
-
-                    # Add the event to the channel's event list
-                    channel_obj.events.append(event_obj)
             else:
                 # Log a more detailed warning if 'slotsForDay' is not in the expected format
                 print(f"Warning: 'slotsForDay' is not a valid list or missing for channel: {channel['title']}")
+                metrics.count("empty_channels")
 
-            # Add the channel to the ProgramGuide's channel list
-            program_guide.channels.append(channel_obj)
-
-        program_guide.maxMinutes = self.get_max_minutes(program_guide.channels)
-
-        return program_guide
-
-    def get_max_minutes(self, channels) -> int:
-        """Calculate the total minutes from event.length in all channels."""
-        max_minutes = 0
-        for channel in channels:
-            for event in channel.events:
-                # Ensure the event length is valid before adding it to max_minutes
-                try:
-                    max_minutes += int(event.length)  # Sum up the length of all events
-                except (ValueError, TypeError):
-                    # If length is not a valid integer, treat it as 0
-                    print(f"Warning: Invalid length for event {event.eventID}. Treating as 0 minutes.")
-        return max_minutes
-
-
-    def format_start_time(self, start_ms: int) -> str:
-        """Convert start time in milliseconds to HHMM (24-hour format)."""
-        start_time = datetime.utcfromtimestamp(start_ms / 1000)  # Convert ms to seconds
-        return start_time.strftime("%H%M")
-
-    def calculate_length(self, start_ms: int, end_ms: int) -> str:
-        """Calculate the duration in minutes."""
-        duration = (end_ms - start_ms) / 60000  # Convert milliseconds to minutes
-        return str(int(duration))
-
-
-    def format_date(self, timestamp_ms):
-        """Convert a timestamp in milliseconds to a human-readable date format (YYYY-MM-DD)."""
-        # Convert milliseconds to seconds
-        timestamp_sec = timestamp_ms / 1000.0
-        # Create a datetime object from the timestamp
-        dt = datetime.utcfromtimestamp(timestamp_sec)
-        # Return the formatted date as a string (e.g., '2023-03-23')
-        return dt.strftime('%Y-%m-%d')
-
+        # Sort, drop duplicates, resolve overlaps and set maxMinutes before the local times are filled in
+        window = local_day_window(self.timezone, self.window_days) if self.trim_window else (None, None)
+        process_guide(store, *window, fill_gaps=self.fill_gaps)
+        store.localize(self.timezone)
 
+        store.validate()
+        metrics.count("channels", len(store.channels))
+        metrics.count("events", store.event_count())
+        return store
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+BASE_SLOT_STORE = Path("cache") / "skynz_slots.json"  # Persistent per-date Sky NZ slots
+
+
+class SlotStore:
+    """Persistent per-date store of Sky NZ 'slotsForDay' responses.
+
+    Each date holds the channel list as returned by Sky, plus a content hash,
+    so a run only needs to fetch the dates it does not hold yet or wants to
+    refresh. merged_channels() folds the held dates into a single entry per
+    channel with slots de-duplicated by slot id.
+    """
+
+    def __init__(self, path: Path = BASE_SLOT_STORE):
+        self.path = Path(path)
+        self.days = {}  # date -> {"sha256": str, "channels": [...]}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                self.days = json.load(f)
+        except FileNotFoundError:
+            self.days = {}
+        except ValueError as e:
+            print(f"Warning: Slot store {self.path} is unreadable, starting empty: {e}")
+            self.days = {}
+
+    def save(self) -> None:
+        """Write the store atomically so an interrupted run never leaves it half written."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(self.days, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def has(self, date: str) -> bool:
+        return date in self.days
+
+    def put(self, date: str, channels: list) -> None:
+        """Replace a date's channels with a fresh response."""
+        sha256 = hashlib.sha256(json.dumps(channels, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+        self.days[date] = {"sha256": sha256, "channels": channels}
+
+    def drop_before(self, date: str) -> None:
+        """Drop every date earlier than the given YYYY-MM-DD date."""
+        for held in [held for held in self.days if held < date]:
+            print(f"Dropping expired Sky NZ slots for {held}")
+            del self.days[held]
+
+    def digest(self, dates: list) -> str:
+        """A hash over the content of the given dates, empty if any of them is missing."""
+        if not all(date in self.days for date in dates):
+            return ""
+        return hashlib.sha256("".join(self.days[date]["sha256"] for date in dates).encode()).hexdigest()
+
+    def merged_channels(self, dates: list) -> list:
+        """One entry per channel across the given dates, slots merged by id and sorted by start time."""
+        merged = {}
+        slots_by_channel = {}
+        for date in dates:
+            for channel in self.days.get(date, {}).get("channels", []):
+                channel_id = channel.get("id")
+                if channel_id not in merged:
+                    merged[channel_id] = {key: value for key, value in channel.items() if key != "slotsForDay"}
+                    slots_by_channel[channel_id] = {}
+                slots_for_day = channel.get("slotsForDay") or {}
+                for slot in slots_for_day.get("slots") or []:
+                    # A programme spanning midnight is listed on both days, keep one copy
+                    slots_by_channel[channel_id][slot["id"]] = slot
+
+        for channel_id, channel in merged.items():
+            slots = sorted(slots_by_channel[channel_id].values(), key=lambda slot: slot["startMs"])
+            channel["slotsForDay"] = {"slots": slots}
+        return list(merged.values())
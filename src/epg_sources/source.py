@@ -0,0 +1,22 @@
+from typing import Any, Tuple
+
+from models.event_store import GuideStore
+
+
+class Source:
+    """The interface every EPG source implements so the registry and pipeline can drive it.
+
+    fetch() runs on the pipeline's thread pool and parse() in a build
+    process, so the payload passed between them must be picklable and is
+    best kept small, e.g. the path of a cached download.
+    """
+
+    title = ""
+
+    def fetch(self, cache, session=None) -> Tuple[Any, str]:
+        """Fetch the upstream data, returning (payload, digest of the data the payload was built from)."""
+        raise NotImplementedError
+
+    def parse(self, payload: Any) -> GuideStore:
+        """Parse a fetched payload into a validated GuideStore, or None if there is nothing to publish."""
+        raise NotImplementedError
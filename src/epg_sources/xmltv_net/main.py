@@ -1,36 +1,60 @@
 import random
 import string
 import requests
-import pytz
 import xml.etree.ElementTree as ET
-from datetime import datetime
-from models.epg_model import ProgramGuide, Channel, Event
+from pathlib import Path
+from typing import TYPE_CHECKING, Union
+from models.event_store import GuideStore, ChannelRecord, EventRecord, make_event_id
+from models.guide_processing import process_guide
+from epg_sources.source import Source
+from utils.compression import ACCEPT_ENCODING, decompress_stream, is_compressed, open_decompressed, sniff_stream
+from utils.http_cache import CachedResponse
+from utils.metrics import metrics
+from utils.resilience import default_session
+from utils.text_utils import normalize_text
+from utils.time_utils import TimezoneSpec, format_fetch_time, local_day_window, parse_xmltv_time
 
-class XMLTV:
-    def __init__(self, url: str, title: str, timezone: int = 0):
-        self.url = url
+if TYPE_CHECKING:
+    from models.epg_model import ProgramGuide
+
+USER_AGENT = f"ProCentricEPG/1.0 (python-requests/{requests.__version__})"
+
+class XMLTV(Source):
+    def __init__(self, url: str, title: str, timezone: TimezoneSpec = 0, stream: bool = False,
+                 guide_days: int = 0, fill_gaps: bool = False, user_agent: str = USER_AGENT):
+        self.url = url  # http(s) URL or local path of the feed, optionally .gz, .bz2 or .xz compressed
         self.title = title
-        self.timezone = timezone
+        self.timezone = timezone  # IANA zone name, or a fixed offset in hours
+        self.stream = stream  # Parse incrementally instead of loading the whole document
+        self.guide_days = guide_days  # Trim listings to this many days from local midnight today, 0 to keep everything
+        self.fill_gaps = fill_gaps  # Fill gaps in a channel's listings with "No information"
+        self.headers = {
+            'User-Agent': user_agent,
+            'Accept-Encoding': ACCEPT_ENCODING,  # Guide XML compresses about 10x on the wire
+        }
 
     def get_fetch_time(self) -> str:
-        """Returns the current timestamp in the required format with timezone offset."""
-        # Get the current time in the local timezone (you can adjust the timezone if needed)
-        local_tz = pytz.timezone("Australia/Sydney")  # Adjust to your local timezone
-        now = datetime.now(local_tz)
+        """Returns the current timestamp in the required format with the region's timezone offset."""
+        return format_fetch_time(self.timezone)
 
-        # Format the datetime with the required format
-        return now.strftime("%Y-%m-%dT%H:%M:%S%z")
+    def fetch_xml_data(self, session=None) -> bytes:
+        """Fetch the XML document from the provided URL, decompressed but left as bytes for the parser to decode.
 
-    def fetch_xml_data(self) -> str:
-        """Fetch XML data from the provided URL with headers."""
+        The XML declaration, not the HTTP headers, says how the document is
+        encoded, so it is not decoded to text here. The whole document is
+        returned in memory, parse() and get_program_guide() stream a
+        compressed feed instead.
+        """
         print(f"Fetching XML data from {self.url}...")
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        response = requests.get(self.url, headers=headers)
+        response = (session or default_session()).get(self.url, headers=self.headers, stream=True)
         if response.status_code == 200:
-            return response.text
+            response.raw.decode_content = True  # Undo any gzip/br transfer encoding
+            with response, decompress_stream(response.raw) as stream:
+                xml_data = stream.read()
+                metrics.count("bytes_downloaded", response.raw.tell())
+            return xml_data
         else:
+            response.close()
             raise Exception(f"Failed to retrieve XML data. Status code: {response.status_code}")
 
     def generate_random_string(self, length=6) -> str:
@@ -38,9 +62,9 @@ class XMLTV:
         return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
     def safe_find_text(self, parent, tag: str, default: str = "") -> str:
-        """Safely finds the text of an element or returns a default value if the element is missing."""
+        """Safely finds the normalized text of an element or returns a default value if the element is missing."""
         element = parent.find(tag)
-        return element.text if element is not None else default
+        return normalize_text(element.text) if element is not None and element.text else default
 
     def safe_find_rating_value(self, parent) -> str:
         """Safely finds the rating value in the <rating><value>...</value></rating> tag or returns an empty string."""
@@ -51,75 +75,187 @@ class XMLTV:
         if rating_elem is not None:
             value_elem = rating_elem.find('value')
             if value_elem is not None:
-                return value_elem.text or ""  # Return empty string if the text is None
+                return normalize_text(value_elem.text or "")  # Return empty string if the text is None
         return ""  # Return empty string if rating or value is not found
 
 
-    def parse_xml_to_model(self, xml_data: str) -> ProgramGuide:
-        """Parse the XML data and map it to the ProgramGuide Pydantic model."""
+    def parse_event(self, store: GuideStore, channel: ChannelRecord, programme_elem) -> EventRecord:
+        """Map a single <programme> element to an event record on the given channel.
+
+        Start and stop are kept as epoch seconds, the local date, start time and
+        length are filled in a channel at a time when the store is finished.
+        """
+        start = parse_xmltv_time(programme_elem.get('start'))  # Format: "YYYYMMDDHHMMSS Z"
+        stop = programme_elem.get('stop')
+        title = self.safe_find_text(programme_elem, 'title')
+
+        return store.add_event(
+            channel,
+            eventID=make_event_id(channel.channelID, start, title),  # Stable across runs, unlike a random id
+            title=title,
+            eventDescription=self.safe_find_text(programme_elem, 'desc'),
+            rating=self.safe_find_rating_value(programme_elem),
+            genre=self.safe_find_text(programme_elem, 'category'),
+            start=start,
+            stop=parse_xmltv_time(stop) if stop else start  # 'stop' is optional in XMLTV
+        )
+
+    def add_channel(self, store: GuideStore, channel_elem) -> None:
+        """Register a <channel> element in the store, keeping document order."""
+        channel_id = channel_elem.get('id')
+        name = self.safe_find_text(channel_elem, 'display-name')
+        channel = store.get_channel(channel_id)
+        number = self.safe_find_text(channel_elem, 'lcn')  # Logical channel number, when the feed has one
+        if channel is None:
+            store.add_channel(channel_id, name, "HD", number)  # Assume resolution is HD for now (update if needed)
+        elif channel.name == channel_id:
+            # A programme got here first and created a placeholder, fill in the real name
+            channel.name = name
+            channel.number = number
+
+    def get_channel(self, store: GuideStore, channel_id: str) -> ChannelRecord:
+        """Look up a channel by id, creating a placeholder if there is no <channel> element for it."""
+        channel = store.get_channel(channel_id)
+        if channel is None:
+            print(f"Warning: No <channel> element for '{channel_id}', using its id as the name.")
+            metrics.count("unknown_channels")
+            channel = store.add_channel(channel_id, channel_id, "HD")
+        return channel
+
+    def create_store(self) -> GuideStore:
+        return GuideStore(filetype=self.title, version="1.0", fetchTime=self.get_fetch_time())
+
+    def finish_store(self, store: GuideStore) -> GuideStore:
+        """Clean up the listings, convert event times to the region's zone and validate the store in bulk.
+
+        Sorting, duplicates, overlaps, gaps, the guide window and maxMinutes
+        are handled by process_guide() before anything is localized.
+        """
+        window = local_day_window(self.timezone, self.guide_days) if self.guide_days else (None, None)
+        process_guide(store, *window, fill_gaps=self.fill_gaps)
+        store.localize(self.timezone)
+        store.validate()
+        metrics.count("channels", len(store.channels))
+        metrics.count("events", store.event_count())
+        return store
+
+    def parse_xml_to_store(self, xml_data: Union[str, bytes]) -> GuideStore:
+        """Parse the XML data into the compact GuideStore.
+
+        The programme list is walked once and each programme is bucketed into a
+        per-channel index by its 'channel' attribute, so the cost is linear in
+        the size of the feed rather than channels x programmes.
+        """
         print(f"Parsing the XML data for {self.title}...")
         root = ET.fromstring(xml_data)
 
-        # Extract channel information
-        channels = []
-        for channel_elem in root.findall('channel'):
-            channel = Channel(
-                channelID=channel_elem.get('id'),
-                name=self.safe_find_text(channel_elem, 'display-name'),
-                resolution="HD",  # Assume resolution is HD for now (update if needed)
-                events=[]
-            )
-
-            # Extract program information
-            for programme_elem in root.findall('programme'):
-                # Extract and format the date
-                if programme_elem.attrib['channel'] == channel_elem.get('id'):
-
-                    start = programme_elem.get('start')  # Format: "YYYYMMDDHHMMSS Z"
-
-                    # Convert start time to local timezone
-                    utc_time = datetime.strptime(start, "%Y%m%d%H%M%S %z")  # Parse with timezone
-                    local_tz = pytz.FixedOffset(self.timezone * 60)  # Convert minutes offset to tzinfo
-                    local_time = utc_time.astimezone(local_tz)  # Convert to local time
-
-                    formatted_date = local_time.strftime("%Y-%m-%d")  # Extract date
-                    start_time = local_time.strftime("%H%M")  # Extract time in HH:MM format
-
-
-                    event = Event(
-                        eventID=self.generate_random_string(),
-                        title=self.safe_find_text(programme_elem, 'title'),
-                        eventDescription=self.safe_find_text(programme_elem, 'desc'),
-                        rating=self.safe_find_rating_value(programme_elem),
-                        date=formatted_date,
-                        startTime=start_time,
-                        length=str(int((datetime.strptime(programme_elem.get('stop'), "%Y%m%d%H%M%S %z") - utc_time).total_seconds() // 60)),
-                        genre=self.safe_find_text(programme_elem, 'category')
-                    )
-                    channel.events.append(event)
-            channels.append(channel)
-
-        # Now calculate the maxMinutes by passing the ProgramGuide object
-        program_guide = ProgramGuide(
-            filetype=self.title,
-            version="1.0",
-            fetchTime=self.get_fetch_time(),
-            maxMinutes=self.get_max_minutes(channels),  # Pass channels to the method
-            channels=channels
-        )
-        
-        return program_guide
-
-    def get_max_minutes(self, channels) -> int:
-        """Calculate the total minutes from event.length in all channels."""
-        max_minutes = 0
-        for channel in channels:
-            for event in channel.events:
-                max_minutes += int(event.length)  # Sum up the length of all events
-        return max_minutes
-
-    def get_program_guide(self) -> ProgramGuide:
+        store = self.create_store()
+        for channel_elem in root.iterfind('channel'):
+            self.add_channel(store, channel_elem)
+
+        # Bucket every programme into its channel in a single pass
+        for programme_elem in root.iterfind('programme'):
+            channel = self.get_channel(store, programme_elem.get('channel'))
+            self.parse_event(store, channel, programme_elem)
+
+        return self.finish_store(store)
+
+    def parse_xml_to_model(self, xml_data: Union[str, bytes]) -> "ProgramGuide":
+        """Parse the XML data and map it to the ProgramGuide Pydantic model."""
+        return self.parse_xml_to_store(xml_data).to_program_guide()
+
+    def open_xml_stream(self, session=None):
+        """Open the feed as a binary stream, either a local file or an incremental HTTP body.
+
+        The stream is the feed as published: a .gz, .bz2 or .xz feed is still
+        compressed, see open_feed() and decompress_stream().
+        """
+        if not self.is_remote():
+            print(f"Reading XML data from {self.local_path()}...")
+            return open(self.local_path(), "rb")
+
+        print(f"Streaming XML data from {self.url}...")
+        response = (session or default_session()).get(self.url, headers=self.headers, stream=True)
+        if response.status_code != 200:
+            response.close()
+            raise Exception(f"Failed to retrieve XML data. Status code: {response.status_code}")
+        response.raw.decode_content = True  # Undo any gzip/deflate transfer encoding
+        return response.raw
+
+    def is_remote(self) -> bool:
+        return self.url.startswith(("http://", "https://"))
+
+    def local_path(self) -> str:
+        """The feed's path on disk when the URL is a local file."""
+        return self.url[len("file://"):] if self.url.startswith("file://") else self.url
+
+    def fetch_cached(self, cache, session=None) -> CachedResponse:
+        """Revalidate the feed against the HTTP cache, a local file is passed through as changed."""
+        if not self.is_remote():
+            return CachedResponse(Path(self.local_path()), True, "")
+
+        print(f"Fetching XML data from {self.url} via cache...")
+        return cache.get(self.url, session, headers=self.headers)
+
+    def fetch(self, cache, session=None):
+        """Fetch the feed through the HTTP cache, returning (path of the cached file, sha256 of its content)."""
+        response = self.fetch_cached(cache, session)
+        return str(response.path), response.sha256
+
+    def open_feed(self, path: str):
+        """Open a fetched feed on disk for parsing, decompressing a gzip, bzip2 or xz feed as it is read."""
+        return open_decompressed(path)
+
+    def parse(self, path: str) -> GuideStore:
+        """Parse a fetched feed from disk.
+
+        The feed is stream parsed when 'stream' is set, and always when it is
+        compressed, so the decompressed document is never held in memory.
+        """
+        with self.open_feed(path) as stream:
+            if self.stream or is_compressed(path):
+                return self.parse_xml_stream(stream)
+            return self.parse_xml_to_store(stream.read())
+
+    def parse_xml_stream(self, stream) -> GuideStore:
+        """Incrementally parse an XMLTV stream into the compact GuideStore.
+
+        Each <channel> and <programme> element is converted as soon as it is
+        complete and then cleared, so only the parsed events are held in
+        memory rather than the raw text, the element tree and the models.
+        """
+        print(f"Stream parsing the XML data for {self.title}...")
+        store = self.create_store()
+        root = None
+
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if root is None:
+                root = elem  # The first start event is the <tv> root
+                continue
+            if event != "end":
+                continue
+
+            if elem.tag == 'programme':
+                channel = self.get_channel(store, elem.get('channel'))
+                self.parse_event(store, channel, elem)
+            elif elem.tag == 'channel':
+                self.add_channel(store, elem)
+            else:
+                continue  # Children are cleared along with their top level element
+
+            # Drop the converted element and detach it from the root
+            elem.clear()
+            root.clear()
+
+        return self.finish_store(store)
+
+    def get_program_guide(self) -> "ProgramGuide":
         """Fetch the XML and parse it into the ProgramGuide model."""
         print(f"Get Program XML data for {self.title}...")
-        xml_data = self.fetch_xml_data()
-        return self.parse_xml_to_model(xml_data)
+        with self.open_xml_stream() as raw:
+            module, stream = sniff_stream(raw)
+            with module.open(stream, "rb") if module else stream as stream:
+                # Like parse(), a compressed feed is always stream parsed so it is never held decompressed
+                if self.stream or module:
+                    return self.parse_xml_stream(stream).to_program_guide()
+                return self.parse_xml_to_model(stream.read())
@@ -0,0 +1,164 @@
+import hashlib
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, Tuple
+
+from epg_sources.xmltv_net.main import XMLTV
+from models.event_store import GuideStore
+from utils.metrics import metrics
+from utils.time_utils import OFFSET_BUCKET, utc_offset
+
+ELEMENT_PATTERN = re.compile(rb"<(programme|channel)\b[^>]*?(?:/>|>.*?</\1>)", re.S)
+DECLARATION_PATTERN = re.compile(rb"<\?xml[^>]*\?>")
+BATCH_SIZE = 500  # Unparsed elements handed to the XML parser at once
+CHUNK_SIZE = 256 * 1024  # Bytes read from the feed at once
+
+
+def iter_raw_elements(stream, chunk_size: int = CHUNK_SIZE, head: bytes = b"") -> Iterator[Tuple[bytes, bytes]]:
+    """Yield (tag, raw bytes) for every top level <channel> and <programme> element in an XMLTV stream.
+
+    XMLTV is flat, so the elements can be cut out of the byte stream with a
+    regex instead of building a tree, which lets identical programmes be
+    recognised by their bytes before anything is parsed. 'head' is data
+    already read from the start of the stream.
+    """
+    buffer = head
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        end = 0
+        for match in ELEMENT_PATTERN.finditer(buffer):
+            yield match.group(1), match.group(0)
+            end = match.end()
+        buffer = buffer[end:]  # Keep any element cut off at the end of the chunk
+        if not chunk:
+            return
+
+
+class MultiRegionXMLTV:
+    """Build several XMLTV regions at once, parsing programmes shared between feeds only once.
+
+    The Australian feeds mostly carry the same national networks. Every raw
+    <programme> element is hashed, and only elements not seen in an earlier
+    feed are handed to the XML parser. The others reuse the parsed fields.
+    Regions whose UTC offset matches when a programme starts (Sydney and
+    Melbourne, or Brisbane outside daylight saving) share the finished event
+    record itself, so each city's GuideStore is assembled from shared records
+    plus the programmes that are local to it.
+    """
+
+    def __init__(self):
+        self.programmes = {}  # digest -> (channel id, UTC offset at start, EventRecord of the first sighting)
+        self.events = {}  # (first sighting's EventRecord, UTC offset at start) -> EventRecord, for other offsets
+        self.parsed = 0
+        self.reused = 0
+
+    def parse_region(self, source: XMLTV, stream) -> GuideStore:
+        """Parse one region's feed into a GuideStore, reusing anything already seen in another feed."""
+        print(f"Parsing the XML data for {source.title} with cross-region sharing...")
+        store = source.create_store()
+
+        # Keep the feed's declaration so batches are decoded with the right encoding
+        head = stream.read(256)
+        declaration = DECLARATION_PATTERN.match(head.lstrip())
+        prefix = declaration.group(0) if declaration else b""
+
+        batch = []
+        for tag, raw in iter_raw_elements(stream, head=head):
+            batch.append((tag, raw))
+            if len(batch) >= BATCH_SIZE:
+                self.add_batch(source, store, batch, prefix)
+                batch = []
+        self.add_batch(source, store, batch, prefix)
+
+        return source.finish_store(store)
+
+    def add_batch(self, source: XMLTV, store: GuideStore, batch: list, prefix: bytes) -> None:
+        """Parse the unseen elements of a batch in one go, then apply the whole batch in document order."""
+        items = []
+        to_parse = []
+        pending = {}  # digest -> index in to_parse, for repeats inside the batch
+        for tag, raw in batch:
+            if tag == b"channel":
+                items.append((tag, None, len(to_parse)))
+                to_parse.append(raw)
+                continue
+            digest = hashlib.blake2b(raw, digest_size=16).digest()
+            if digest in self.programmes:
+                items.append((tag, digest, None))
+            elif digest in pending:
+                items.append((tag, digest, pending[digest]))
+            else:
+                pending[digest] = len(to_parse)
+                items.append((tag, digest, len(to_parse)))
+                to_parse.append(raw)
+
+        elements = self.parse_elements(source, to_parse, prefix)
+        for tag, digest, index in items:
+            element = elements[index] if index is not None else None
+            if tag == b"channel":
+                if element is not None:
+                    source.add_channel(store, element)
+            elif index is None or element is not None:
+                self.add_programme(source, store, digest, element)
+
+    def parse_elements(self, source: XMLTV, raws: list, prefix: bytes) -> list:
+        """Parse raw elements with a single parser call, isolating any malformed ones on failure."""
+        if not raws:
+            return []
+        try:
+            return list(ET.fromstring(b"".join([prefix, b"<tv>", *raws, b"</tv>"])))
+        except ET.ParseError:
+            elements = []
+            for raw in raws:
+                try:
+                    elements.append(ET.fromstring(prefix + raw))
+                except ET.ParseError as e:
+                    print(f"Warning: Skipping malformed element in {source.title}: {e}")
+                    metrics.count("dropped_events")
+                    elements.append(None)
+            return elements
+
+    def add_programme(self, source: XMLTV, store: GuideStore, digest: bytes, programme_elem) -> None:
+        entry = self.programmes.get(digest)
+
+        if entry is None:
+            # First sighting anywhere: parse it, the other regions copy their fields from this record
+            channel = source.get_channel(store, programme_elem.get('channel'))
+            event = source.parse_event(store, channel, programme_elem)
+            self.programmes[digest] = (channel.channelID, utc_offset(source.timezone, event.start // OFFSET_BUCKET), event)
+            self.parsed += 1
+            return
+
+        channel_id, offset, first = entry
+        channel = source.get_channel(store, channel_id)
+        # The local date and start time only depend on the zone's offset when the programme starts
+        local_offset = utc_offset(source.timezone, first.start // OFFSET_BUCKET)
+        event = first if local_offset == offset else self.events.get((first, local_offset))
+        if event is not None:
+            # Same programme, same local time: share the finished record outright
+            channel.events.append(event)
+        else:
+            # Same programme at a different local time: reuse the parsed fields, localize separately
+            self.events[(first, local_offset)] = store.add_event(
+                channel,
+                eventID=first.eventID,
+                title=first.title,
+                eventDescription=first.eventDescription,
+                rating=first.rating,
+                genre=first.genre,
+                start=first.start,
+                stop=first.stop
+            )
+        self.reused += 1
+
+    def parse_regions(self, feeds: Dict[str, Tuple[XMLTV, str]]) -> Dict[str, GuideStore]:
+        """Parse {name: (source, path)} feeds from disk, returning {name: GuideStore}."""
+        stores = {}
+        for name, (source, path) in feeds.items():
+            with open(path, "rb") as stream:
+                stores[name] = self.parse_region(source, stream)
+        total = self.parsed + self.reused
+        if total:
+            print(f"Parsed {self.parsed} unique programmes, reused {self.reused} ({self.reused * 100 // total}%) across regions.")
+        return stores
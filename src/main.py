@@ -1,76 +1,323 @@
+import argparse
 import json
 import logging
 import os
-from models.epg_model import ProgramGuide
-from utils.file_handler import save_and_zip
-from epg_sources.xmltv_net.main import XMLTV
-from epg_sources.sky_nz.main import SkyNZ_EPG
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from utils.file_handler import CONTENT_DIGEST, save_and_zip, stash_output, restore_output, restore_stale, tag_stash
+from utils.http_cache import HTTPCache
+from utils.metrics import metrics
+from utils.pipeline import PipelineJob, Unchanged, create_session, preload_builds, run_pipeline
+from utils.publisher import publish_zip
+from utils.resilience import session_options
+from epg_sources.registry import DEFAULT_CONFIG, Region, create_regions, load_config, unknown_regions
 
-# Ensure the 'debug' directory exists
 debug_dir = './debug'
-if not os.path.exists(debug_dir):
-    os.makedirs(debug_dir)  # Create the directory if it doesn't exist
 
-###############################
-## For New Zealand
-###############################
 
-epg = SkyNZ_EPG(url="https://api.skyone.co.nz/exp/graph", zip_output_path="./output/EPG/NZ/Procentric_EPG_NZL.zip")
-logging.info(f"Fetching and parsing the XML data for New Zealand...")
-data = epg.fetch_data()
+def write_debug(region: Region, payload) -> None:
+    """Dump a fetched JSON payload to the debug directory for inspection, only for regions run with debug on."""
+    if isinstance(payload, str):
+        return  # A path to the cached download, nothing to dump
 
-if data:
-    # Check if the data is valid and write it to a file
-    with open(os.path.join(debug_dir, "debug_skynz.json"), "w") as file:
-    # Convert 'data' to a JSON-formatted string and write it to the file
-        file.write(json.dumps(data, indent=4))  # Pretty print with an indent for readability
+    os.makedirs(debug_dir, exist_ok=True)
+    with open(os.path.join(debug_dir, f"debug_{region.name.lower()}.json"), "w") as file:
+        file.write(json.dumps(payload, indent=4))  # Pretty print with an indent for readability
 
-    program_guide = epg.parse_program_data(data)
+
+def RegionFetch(region: Region, cache: HTTPCache, session):
+    """Fetch a region through the cache, republishing the last ZIP when the upstream data is unchanged.
+
+    Only the payload and its digest cross into the build process. A region
+    with lineups is only skipped when every lineup's ZIP can be republished too.
+    """
+    logging.info(f"Fetching the data for '{region.name}'...")
+    try:
+        with metrics.span("fetch"):
+            payload, digest = region.source.fetch(cache, session)
+    except Exception as e:
+        stale = restore_stale_outputs(region)
+        if stale is None:
+            raise
+        logging.warning(f"Fetch failed for '{region.name}', republishing the last good guide: {e}")
+        metrics.count("stale_fallback")
+        return Unchanged(stale)
+
+    with metrics.span("publish"):
+        zip_path = restore_output(region.location_tags, region.file_prefix, digest)
+        restored = {lineup.name: restore_output(lineup.location_tags, lineup.file_prefix, lineup.digest(digest))
+                    for lineup in region.lineups}
+    if zip_path and all(restored.values()):
+        metrics.count("unchanged")
+        return Unchanged({region.name: zip_path, **restored} if region.lineups else zip_path)
+
+    if region.debug:
+        write_debug(region, payload)
+    return payload, digest
+
+def restore_stale_outputs(region: Region):
+    """The region's (and its lineups') last good ZIPs within 'stale_max_age', or None if any is missing or too old."""
+    with metrics.span("publish"):
+        zip_path = restore_stale(region.location_tags, region.file_prefix, region.stale_max_age)
+        restored = {lineup.name: restore_stale(lineup.location_tags, lineup.file_prefix, region.stale_max_age)
+                    for lineup in region.lineups}
+    if not zip_path or not all(restored.values()):
+        return None
+    return {region.name: zip_path, **restored} if region.lineups else zip_path
+
+def SaveGuide(name: str, location_tags: list, file_prefix: str, program_guide, digest: str):
+    """Zip a parsed guide, keeping the published ZIP when its content has not changed."""
+    # Upstream bytes changed but the guide did not, e.g. a re-ordered feed: keep the published ZIP
+    content_digest = program_guide.content_digest()
+    with metrics.span("publish"):
+        zip_path = restore_output(location_tags, file_prefix, content_digest, CONTENT_DIGEST)
+        if zip_path:
+            tag_stash(file_prefix, digest)  # Lets the next run with this upstream data skip parsing too
+    if zip_path:
+        logging.info(f"Guide for '{name}' is unchanged, keeping the published ZIP.")
+        metrics.count("unchanged_content")
+        return zip_path
+
+    zip_path = save_and_zip(program_guide, location_tags, file_prefix)
+    if zip_path:
+        with metrics.span("publish"):
+            stash_output(zip_path, file_prefix, digest, content_digest)
+    logging.info(f"Data for '{name}' has been saved and zipped successfully.")
+    return zip_path
+
+def RegionSave(region: Region, program_guide, digest: str):
+    """Save a region's guide, and with lineups each property's filtered view of it as {name: ZIP path}."""
     if program_guide:
-        save_and_zip(program_guide, ["EPG", "NZL"], 'Procentric_EPG_NZL')
+        logging.info(f"Successfully fetched and parsed the data for '{region.name}'.")
+        zip_path = SaveGuide(region.name, region.location_tags, region.file_prefix, program_guide, digest)
+        if not region.lineups:
+            return zip_path
+
+        results = {region.name: zip_path}
+        for lineup in region.lineups:
+            try:
+                with metrics.region(lineup.name):
+                    results[lineup.name] = SaveGuide(lineup.name, lineup.location_tags, lineup.file_prefix,
+                                                     lineup.apply(program_guide), lineup.digest(digest))
+            except Exception as e:
+                logging.error(f"Build failed for lineup '{lineup.name}': {e}")
+                results[lineup.name] = e
+        return results
     else:
-        logging.warning(f"No program guide data found for New Zealand.")
+        logging.warning(f"No program guide data found for '{region.name}'.")
 
+def RegionBuild(region: Region, payload: tuple):
+    payload, digest = payload
+    with metrics.span("parse"):
+        program_guide = region.source.parse(payload)
 
+    return RegionSave(region, program_guide, digest)
 
-###############################
-## For Australia
-###############################
-def create_xmltv_source(city: str, url: str, title: str, timezone_offset: int) -> XMLTV:
-    return XMLTV(url, title, timezone_offset)
+def GroupFetch(regions: list, cache: HTTPCache, session) -> dict:
+    """Fetch every region of a group concurrently, each region's failure or unchanged result is kept separately."""
+    def fetch(region):
+        try:
+            with metrics.region(region.name):
+                return RegionFetch(region, cache, session)
+        except Exception as e:
+            logging.error(f"Fetch failed for '{region.name}': {e}")
+            return e
 
-# List of Australian cities to process
-cities = [
-    {"city": "SYD", "url": "https://xmltv.net/xml_files/Sydney.xml", "title": "Pro:Centric JSON Program Guide Data AUS Sydney", "timezone": 11},  # AEDT
-    {"city": "BNE", "url": "https://xmltv.net/xml_files/Brisbane.xml", "title": "Pro:Centric JSON Program Guide Data AUS Brisbane", "timezone": 10},  # AEST
-    {"city": "ADL", "url": "https://xmltv.net/xml_files/Adelaide.xml", "title": "Pro:Centric JSON Program Guide Data AUS Adelaide", "timezone": 10.5},  # ACDT
-    {"city": "OOL", "url": "https://xmltv.net/xml_files/Goldcoast.xml", "title": "Pro:Centric JSON Program Guide Data AUS Gold Coast", "timezone": 10},  # AEST
-    {"city": "MEL", "url": "https://xmltv.net/xml_files/Melbourne.xml", "title": "Pro:Centric JSON Program Guide Data AUS Melbourne", "timezone": 11}  # AEDT
-]
+    with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+        results = dict(zip([region.name for region in regions], executor.map(fetch, regions)))
+
+    # Nothing to parse when every feed is unchanged, so skip starting a build process
+    if all(isinstance(result, Unchanged) for result in results.values()):
+        return Unchanged(flatten_results({name: result.result for name, result in results.items()}))
+    return results
+
+def GroupBuild(regions: list, payload: dict) -> dict:
+    """Parse the changed regions of a group together so programmes shared between XMLTV feeds are parsed once."""
+    from epg_sources.xmltv_net.main import XMLTV
+    from epg_sources.xmltv_net.multi_region import MultiRegionXMLTV
+
+    builder = MultiRegionXMLTV()
+    results = {}
+    for region in regions:
+        fetched = payload[region.name]
+        if isinstance(fetched, Exception):
+            results[region.name] = fetched
+            continue
+        if isinstance(fetched, Unchanged):
+            results.update(flatten_results({region.name: fetched.result}))
+            continue
+
+        data, digest = fetched
+        try:
+            with metrics.region(region.name):
+                with metrics.span("parse"):
+                    # Sharing needs the streaming parse, a region that turned it off is parsed on its own
+                    if isinstance(region.source, XMLTV) and region.source.stream:
+                        with region.source.open_feed(data) as stream:
+                            program_guide = builder.parse_region(region.source, stream)
+                    else:
+                        program_guide = region.source.parse(data)
+                results.update(flatten_results({region.name: RegionSave(region, program_guide, digest)}))
+        except Exception as e:
+            logging.error(f"Build failed for '{region.name}': {e}")
+            results[region.name] = e
+    return results
 
-def XMLTVProcess(source: XMLTV, location_tags: list, file_prefix: str):
-    try:
-        logging.info(f"Fetching and parsing the XML data for '{source.title}'...")
-        program_guide = source.get_program_guide()
 
-        if program_guide:
-            logging.info(f"Successfully fetched and parsed the XML data for '{source.title}'.")
+def build_jobs(regions: list, cache: HTTPCache, multi_region: bool = False) -> list:
+    """Create a fetch/build pipeline job for every configured region.
 
-            save_and_zip(program_guide, location_tags, file_prefix)
-            logging.info(f"Data for '{source.title}' has been saved and zipped successfully.")
+    With 'multi_region' the regions sharing a group are built as one job that
+    shares parsed programmes between overlapping feeds. Otherwise, the
+    default, each region is its own job and the builds run in parallel.
+    """
+    groups = {}
+    for region in regions:
+        key = region.group if multi_region and region.group else region.name
+        groups.setdefault(key, []).append(region)
+
+    jobs = []
+    for name, members in groups.items():
+        if len(members) == 1:
+            region = members[0]
+            jobs.append(PipelineJob(region.name, partial(RegionFetch, region, cache), partial(RegionBuild, region),
+                                    timeout=region.timeout, interval=region.interval))
         else:
-            logging.warning(f"No program guide data found for '{source.title}'.")
+            timeouts = [region.timeout for region in members]
+            timeout = None if None in timeouts else max(timeouts)
+            intervals = [region.interval for region in members if region.interval]
+            jobs.append(PipelineJob(name, partial(GroupFetch, members, cache), partial(GroupBuild, members),
+                                    timeout=timeout, interval=min(intervals) if intervals else None))
+    return jobs
 
-    except Exception as e:
-        logging.error(f"Error occurred while processing '{source.title}': {e}")
 
-# Ensure logging is configured
-logging.basicConfig(level=logging.INFO)
+def build_modules(regions: list, multi_region: bool = False) -> list:
+    """The modules every build of these regions imports, for preload_builds()."""
+    modules = ["main", *sorted({type(region.source).__module__ for region in regions})]
+    if multi_region and any(region.group for region in regions):
+        modules.append("epg_sources.xmltv_net.multi_region")
+    return modules
+
+
+def flatten_results(results: dict) -> dict:
+    """Expand grouped jobs such as 'AUS' and regions with lineups into one result per region or lineup."""
+    flat = {}
+    for name, result in results.items():
+        if isinstance(result, dict):
+            flat.update(result)
+        else:
+            flat[name] = result
+    return flat
 
-# Process Australian cities
-for city in cities:
-    timezone_offset = 0 # city.get("timezone", 0)  # Default to 0 if not set
-    source = create_xmltv_source(city["city"], city["url"], city["title"], timezone_offset)
-    XMLTVProcess(source, ["EPG", "AUS", city["city"]], f"Procentric_EPG_{city['city']}")
 
+def publish_results(results: dict, defaults: dict) -> None:
+    """Publish each built ZIP to 'publish_dir' when configured, mirroring its path under 'publish_root'.
 
+    Failed regions are skipped, so the destination keeps their last good file.
+    """
+    if not defaults.get("publish_dir"):
+        return
+    source_root = Path(defaults.get("publish_root", "output/EPG"))
+    dest_root = Path(defaults["publish_dir"])
+    for name, result in results.items():
+        if not isinstance(result, Path):
+            continue
+        try:
+            with metrics.region(name), metrics.span("publish"):
+                publish_zip(result, dest_root / result.parent.relative_to(source_root))
+        except Exception as e:
+            logging.error(f"Publishing failed for '{name}': {e}")
+            results[name] = e
+
+
+def run_jobs(jobs: list, cache: HTTPCache, defaults: dict, session=None) -> dict:
+    """Run the jobs through the pipeline and write the run's metrics, returning {region: ZIP path or exception}."""
+    fetch_workers = defaults.get("fetch_workers", 8)
+    own_session = session is None
+    session = session or create_session(fetch_workers, **session_options(defaults))
+    try:
+        # Fetch every region concurrently, parse and zip each one in its own build process
+        results = flatten_results(run_pipeline(jobs, fetch_workers, defaults.get("build_workers") or None, session))
+    finally:
+        if own_session:
+            session.close()
+    cache.evict()
+    publish_results(results, defaults)
+
+    failed = [name for name, result in results.items() if isinstance(result, Exception)]
+    for name, result in results.items():
+        metrics.set_status(name, "failed" if name in failed else "ok")
+    report_path = metrics.write()
+    logging.info(f"Run report written to {report_path}")
+
+    if failed:
+        logging.error(f"Regions failed: {', '.join(failed)}")
+    return results
+
+
+def main(config_path: Path = DEFAULT_CONFIG, names: list = None, debug: bool = False) -> dict:
+    """Build the configured regions once, or only the named ones, returning {region: ZIP path or exception}."""
+    config = load_config(config_path)
+    defaults = config.get("defaults", {})
+    regions = create_regions(config, names)
+    if debug:
+        for region in regions:
+            region.debug = True
+
+    # Persistent response cache, unchanged upstream data skips the parse and zip stages
+    cache = HTTPCache()
+    multi_region = defaults.get("multi_region", False)
+    preload_builds(build_modules(regions, multi_region))
+    return run_jobs(build_jobs(regions, cache, multi_region), cache, defaults)
+
+
+def list_regions(config_path: Path = DEFAULT_CONFIG) -> None:
+    """Print the configured regions without importing any source."""
+    for entry in load_config(config_path).get("source", []):
+        group = f" (group {entry['group']})" if entry.get("group") else ""
+        print(f"{entry.get('name'):<8} {entry.get('type'):<8} {entry.get('url', '')}{group}")
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build LG ProCentric EPG ZIPs from the configured sources.")
+    commands = parser.add_subparsers(dest="command")
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", type=Path, default=DEFAULT_CONFIG, help="Source config (TOML or YAML)")
+    regions = argparse.ArgumentParser(add_help=False, parents=[common])
+    regions.add_argument("--region", action="append", metavar="NAME",
+                         help="Only this region, repeat for several (default: every region)")
+
+    run = commands.add_parser("run", parents=[regions], help="Build once and exit (the default)")
+    run.add_argument("--debug", action="store_true", help="Dump each fetched payload, pretty printed, to debug/")
+    commands.add_parser("daemon", parents=[regions], help="Stay resident and refresh on each region's interval")
+    commands.add_parser("list", parents=[common], help="List the configured regions")
+
+    # 'run' is the default, so a bare 'main.py' (as cron runs it) or 'main.py --region NZL' still builds
+    if not argv or (argv[0] not in commands.choices and argv[0] not in ("-h", "--help")):
+        argv = ["run", *argv]
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    # Ensure logging is configured
+    logging.basicConfig(level=logging.INFO)
+
+    if getattr(args, "region", None):
+        config = load_config(args.config)
+        unknown = unknown_regions(config, args.region)
+        if unknown:
+            configured = ", ".join(entry.get("name") for entry in config.get("source", []))
+            logging.error(f"Unknown region: {', '.join(unknown)}. Configured regions: {configured}")
+            sys.exit(2)
+
+    if args.command == "list":
+        list_regions(args.config)
+    elif args.command == "daemon":
+        from daemon import EPGDaemon  # Only the daemon needs the scheduler and status server
+        EPGDaemon(args.config, args.region).run()
+    else:
+        main(args.config, args.region, args.debug)
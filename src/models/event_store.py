@@ -0,0 +1,197 @@
+import hashlib
+import json
+import sys
+from typing import TYPE_CHECKING, Dict, List
+
+from utils.time_utils import TimezoneSpec, convert_times
+
+if TYPE_CHECKING:
+    from models.epg_model import ProgramGuide  # pydantic is only imported when a ProgramGuide is asked for
+
+# The Event model's fields in model order
+EVENT_FIELDS = ("eventID", "title", "eventDescription", "rating", "date", "startTime", "length", "genre")
+CHANNEL_FIELDS = ("channelID", "name", "resolution")
+HEADER_FIELDS = ("filetype", "version", "maxMinutes")  # fetchTime is left out of the content digest
+ID_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def make_event_id(channel_id: str, start: int, title: str, length: int = 8) -> str:
+    """A stable event id derived from the channel, UTC start time and title.
+
+    The same programme gets the same id on every run, so identical upstream
+    data produces identical output.
+    """
+    value = int.from_bytes(hashlib.blake2b(f"{channel_id}\x1f{start}\x1f{title}".encode("utf-8"), digest_size=8).digest(), "big")
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 62)
+        chars.append(ID_ALPHABET[index])
+    return "".join(chars)
+
+
+class EventRecord:
+    """A slotted, unvalidated stand in for the Event model.
+
+    Repeated strings are interned by the GuideStore before they get here, so a
+    week of listings shares one copy of each title, rating, genre and date.
+    'start' and 'stop' hold the UTC epoch seconds the local date, startTime
+    and length are derived from; they are not part of the serialized event.
+    """
+
+    __slots__ = EVENT_FIELDS + ("start", "stop")
+
+    def __init__(self, eventID: str, title: str, eventDescription: str, rating: str,
+                 date: str, startTime: str, length: str, genre: str, start: int = None, stop: int = None):
+        self.eventID = eventID
+        self.title = title
+        self.eventDescription = eventDescription
+        self.rating = rating
+        self.date = date
+        self.startTime = startTime
+        self.length = length
+        self.genre = genre
+        self.start = start
+        self.stop = stop
+
+    def model_dump(self) -> dict:
+        return {field: getattr(self, field) for field in EVENT_FIELDS}
+
+
+class ChannelRecord:
+    """A slotted stand in for the Channel model holding EventRecords.
+
+    'number' is the upstream channel number (as in iconMap.txt) when the
+    source has one; like an event's start/stop it is not serialized.
+    """
+
+    __slots__ = CHANNEL_FIELDS + ("events", "number")
+
+    def __init__(self, channelID: str, name: str, resolution: str, number: str = ""):
+        self.channelID = channelID
+        self.name = name
+        self.resolution = resolution
+        self.number = number
+        self.events: List[EventRecord] = []
+
+    def model_dump(self) -> dict:
+        return {
+            "channelID": self.channelID,
+            "name": self.name,
+            "resolution": self.resolution,
+            "events": [event.model_dump() for event in self.events],
+        }
+
+    def model_dump_json(self) -> str:
+        return json.dumps(self.model_dump(), separators=(",", ":"))
+
+
+class GuideStore:
+    """Compact internal representation of a program guide.
+
+    Parsers fill the store with slotted records instead of validating a
+    pydantic Event per programme. validate() checks the whole store in one
+    pass at the boundary and to_program_guide() gives a ProgramGuide view for
+    callers that need the models. The serializers in utils.file_handler can
+    write a GuideStore directly since it mirrors the model_dump API.
+    """
+
+    def __init__(self, filetype: str, version: str, fetchTime: str, maxMinutes: int = 0):
+        self.filetype = filetype
+        self.version = version
+        self.fetchTime = fetchTime
+        self.maxMinutes = maxMinutes
+        self.channels: List[ChannelRecord] = []
+        self.channel_index: Dict[str, ChannelRecord] = {}  # First channel registered for each id
+
+    def add_channel(self, channelID: str, name: str, resolution: str = "HD", number: str = "") -> ChannelRecord:
+        """Append a channel, keeping document order."""
+        channel = ChannelRecord(channelID, sys.intern(name), sys.intern(resolution), number)
+        self.channels.append(channel)
+        self.channel_index.setdefault(channelID, channel)
+        return channel
+
+    def get_channel(self, channelID: str) -> ChannelRecord:
+        return self.channel_index.get(channelID)
+
+    def add_event(self, channel: ChannelRecord, eventID: str, title: str, eventDescription: str, rating: str,
+                  genre: str, start: int = None, stop: int = None,
+                  date: str = "", startTime: str = "", length: str = "") -> EventRecord:
+        """Append an event to a channel, interning the strings that repeat across a guide.
+
+        Events given as UTC 'start'/'stop' epoch seconds get their local date,
+        startTime and length filled in later, a channel at a time, by localize().
+        """
+        intern = sys.intern
+        event = EventRecord(eventID, intern(title), intern(eventDescription), intern(rating),
+                            intern(date), intern(startTime), intern(length), intern(genre), start, stop)
+        channel.events.append(event)
+        return event
+
+    def localize(self, timezone: TimezoneSpec) -> "GuideStore":
+        """Fill in date, startTime and length for every event from its epoch start/stop in the given zone."""
+        intern = sys.intern
+        for channel in self.channels:
+            # Records shared with another region's store may already be localized
+            events = [event for event in channel.events if event.start is not None and not event.date]
+            dates, start_times, lengths = convert_times(
+                [event.start for event in events],
+                [event.stop for event in events],
+                timezone
+            )
+            for event, date, start_time, length in zip(events, dates, start_times, lengths):
+                event.date = date
+                event.startTime = start_time
+                event.length = intern(length)
+        return self
+
+    def validate(self) -> "GuideStore":
+        """Check every channel and event field is a string in a single pass, raising ValueError if not."""
+        for channel in self.channels:
+            for field in CHANNEL_FIELDS:
+                if type(getattr(channel, field)) is not str:
+                    raise ValueError(f"Channel field '{field}' must be a string, got {getattr(channel, field)!r}")
+            for event in channel.events:
+                for field in EVENT_FIELDS:
+                    if type(getattr(event, field)) is not str:
+                        raise ValueError(f"Event field '{field}' on channel '{channel.channelID}' must be a string, "
+                                         f"got {getattr(event, field)!r}")
+        if type(self.maxMinutes) is not int:
+            raise ValueError(f"maxMinutes must be an int, got {self.maxMinutes!r}")
+        return self
+
+    def content_digest(self) -> str:
+        """sha256 over everything that ends up in the published JSON except fetchTime.
+
+        Two runs over the same listings give the same digest, so an unchanged
+        guide can be recognised before it is serialized and zipped.
+        """
+        digest = hashlib.sha256()
+        digest.update("\x1f".join(str(getattr(self, field)) for field in HEADER_FIELDS).encode("utf-8"))
+        for channel in self.channels:
+            digest.update(("\x1d" + "\x1f".join(getattr(channel, field) for field in CHANNEL_FIELDS)).encode("utf-8"))
+            for event in channel.events:
+                digest.update(("\x1e" + "\x1f".join(getattr(event, field) for field in EVENT_FIELDS)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def event_count(self) -> int:
+        return sum(len(channel.events) for channel in self.channels)
+
+    def model_dump(self, exclude: set = frozenset()) -> dict:
+        data = {
+            "filetype": self.filetype,
+            "version": self.version,
+            "fetchTime": self.fetchTime,
+            "maxMinutes": self.maxMinutes,
+        }
+        if "channels" not in exclude:
+            data["channels"] = [channel.model_dump() for channel in self.channels]
+        return {key: value for key, value in data.items() if key not in exclude}
+
+    def to_program_guide(self) -> "ProgramGuide":
+        """Build the ProgramGuide/Channel/Event models from the store.
+
+        The whole guide is validated by pydantic in one bulk call, which is
+        much cheaper than validating each Event as it is parsed.
+        """
+        from models.epg_model import ProgramGuide
+        return ProgramGuide.model_validate(self.model_dump())
@@ -0,0 +1,204 @@
+import json
+import time
+import zipfile
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from models.event_store import EVENT_FIELDS
+from utils.file_handler import JSON_FILENAME
+from utils.metrics import metrics
+from utils.time_utils import TimezoneSpec, get_timezone, local_to_epoch
+
+DEFAULT_NEXT = 1  # Upcoming events listed after the current one
+MAX_NEXT = 50
+MAX_RANGE = 7 * 86400  # Seconds, the longest window a range query may ask for
+
+
+class ChannelIndex:
+    """One channel's events as parallel start/stop arrays sorted by start, for bisect lookups.
+
+    Events do not overlap once process_guide() has run, so the stops are
+    sorted as well and both ends of a range are found by bisection.
+    """
+
+    __slots__ = ("channelID", "name", "starts", "stops", "events")
+
+    def __init__(self, channelID: str, name: str, entries: List[Tuple[int, int, dict]]):
+        entries.sort(key=lambda entry: entry[0])
+        self.channelID = channelID
+        self.name = name
+        self.starts = [entry[0] for entry in entries]
+        self.stops = [entry[1] for entry in entries]
+        self.events = [entry[2] for entry in entries]
+
+    def at(self, when: int) -> Optional[dict]:
+        """The event on air at 'when', or None in a gap or outside the guide."""
+        i = bisect_right(self.starts, when) - 1
+        if i >= 0 and self.stops[i] > when:
+            return self.events[i]
+        return None
+
+    def upcoming(self, when: int, count: int = DEFAULT_NEXT) -> List[dict]:
+        """The next 'count' events starting after 'when'."""
+        i = bisect_right(self.starts, when)
+        return self.events[i:i + count]
+
+    def between(self, start: int, end: int) -> List[dict]:
+        """Events on air at any point in [start, end)."""
+        return self.events[bisect_right(self.stops, start):bisect_left(self.starts, end)]
+
+
+def event_entry(data: dict, start: int, stop: int) -> Tuple[int, int, dict]:
+    """An event's serialized fields with its epoch start/stop added, keyed for ChannelIndex."""
+    data["start"] = start
+    data["stop"] = stop
+    return start, stop, data
+
+
+class GuideIndex:
+    """A built guide indexed per channel for now/next, point and range queries in logarithmic time."""
+
+    def __init__(self, name: str, timezone: TimezoneSpec, channels: List[ChannelIndex], fetchTime: str = "",
+                 path: str = ""):
+        self.name = name
+        self.timezone = timezone  # Zone of the guide's local dates and start times, and of naive query times
+        self.channels = channels
+        self.channel_index: Dict[str, ChannelIndex] = {}
+        for channel in channels:
+            self.channel_index.setdefault(channel.channelID, channel)
+        self.fetchTime = fetchTime
+        self.path = path  # ZIP the guide was loaded from, empty when indexed from a store
+        self.loaded = time.time()
+
+    def select(self, channel_id: str = None) -> List[ChannelIndex]:
+        """Every channel, or just the one asked for, raising KeyError if the guide does not have it."""
+        if not channel_id:
+            return self.channels
+        if channel_id not in self.channel_index:
+            raise KeyError(f"No channel '{channel_id}' in the '{self.name}' guide")
+        return [self.channel_index[channel_id]]
+
+    def now(self, when: int, channel_id: str = None, count: int = DEFAULT_NEXT) -> List[dict]:
+        """What is on at 'when' and the 'count' events after it, per channel."""
+        return [{"channelID": channel.channelID, "name": channel.name, "now": channel.at(when),
+                 "next": channel.upcoming(when, count)}
+                for channel in self.select(channel_id)]
+
+    def between(self, start: int, end: int, channel_id: str = None) -> List[dict]:
+        """The events on air at any point in [start, end), per channel."""
+        return [{"channelID": channel.channelID, "name": channel.name, "events": channel.between(start, end)}
+                for channel in self.select(channel_id)]
+
+    def summary(self) -> dict:
+        return {
+            "channels": len(self.channels),
+            "events": sum(len(channel.events) for channel in self.channels),
+            "fetchTime": self.fetchTime,
+            "path": self.path,
+            "loaded": datetime.fromtimestamp(self.loaded).isoformat(timespec="seconds"),
+        }
+
+
+def load_guide_zip(name: str, path: Path, timezone: TimezoneSpec) -> GuideIndex:
+    """Index a published ZIP, reading each event's epoch start back from its local date and start time.
+
+    Events are published in start order, so each start is read as the first
+    reading not before the previous one, which keeps the hour repeated when
+    clocks go back in order.
+    """
+    with zipfile.ZipFile(path) as zipf:
+        data = json.loads(zipf.read(JSON_FILENAME))
+
+    channels = []
+    for channel in data.get("channels", []):
+        entries = []
+        start = None
+        for event in channel.get("events", []):
+            start = local_to_epoch(event["date"], event["startTime"], timezone, after=start)
+            fields = {field: event.get(field, "") for field in EVENT_FIELDS}
+            entries.append(event_entry(fields, start, start + int(event.get("length") or 0) * 60))
+        channels.append(ChannelIndex(channel["channelID"], channel.get("name", ""), entries))
+    return GuideIndex(name, timezone, channels, data.get("fetchTime", ""), str(path))
+
+
+def parse_query_time(value: str, timezone: TimezoneSpec) -> int:
+    """Epoch seconds from a query parameter: epoch seconds, or ISO 8601 read in the guide's zone when it has no offset."""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Cannot read '{value}' as epoch seconds or an ISO 8601 time")
+    if moment.tzinfo is None:
+        moment = get_timezone(timezone).localize(moment)
+    return int(moment.timestamp())
+
+
+class GuideService:
+    """The latest index of every built guide, swapped in whole after each build.
+
+    Readers take the current dict of guides and keep using it for the whole
+    query, a new build replaces the dict rather than changing it, so a query
+    never sees a half loaded guide and needs no lock.
+    """
+
+    def __init__(self):
+        self.guides: Dict[str, GuideIndex] = {}
+        self.loaded_from: Dict[str, tuple] = {}  # name -> (path, mtime, size) of the ZIP indexed
+
+    def update(self, name: str, zip_path: Path, timezone: TimezoneSpec) -> bool:
+        """Index a region's newly built ZIP, returning False when that exact file is already loaded."""
+        stat = Path(zip_path).stat()
+        key = (str(zip_path), stat.st_mtime_ns, stat.st_size)
+        if self.loaded_from.get(name) == key:
+            return False
+
+        with metrics.region(name), metrics.span("index"):
+            guide = load_guide_zip(name, zip_path, timezone)
+        self.guides = {**self.guides, name: guide}
+        self.loaded_from[name] = key
+        return True
+
+    def query(self, path: str, params: Dict[str, str]) -> Tuple[int, dict]:
+        """Answer a GET under /guide, returning (HTTP status, JSON body).
+
+            /guide                                        loaded guides
+            /guide/<name>/now?time=T&channel=ID&next=N    on air at T (default now) and the N after it
+            /guide/<name>/range?start=T&end=T&channel=ID  on air at any point between start and end
+
+        Times are epoch seconds or ISO 8601, read in the guide's zone without an offset.
+        """
+        guides = self.guides
+        parts = [part for part in path.split("/") if part][1:]
+        if not parts:
+            return 200, {name: guide.summary() for name, guide in guides.items()}
+        if len(parts) != 2 or parts[1] not in ("now", "range"):
+            return 404, {"error": f"Unknown guide query '{path}'"}
+
+        name, kind = parts
+        guide = guides.get(name)
+        if guide is None:
+            return 404, {"error": f"No guide loaded for '{name}'"}
+
+        try:
+            channel_id = params.get("channel")
+            if kind == "now":
+                when = parse_query_time(params["time"], guide.timezone) if "time" in params else int(time.time())
+                count = min(max(int(params.get("next", DEFAULT_NEXT)), 0), MAX_NEXT)
+                return 200, {"guide": name, "time": when, "channels": guide.now(when, channel_id, count)}
+
+            if "start" not in params or "end" not in params:
+                return 400, {"error": "A range query needs 'start' and 'end'"}
+            start = parse_query_time(params["start"], guide.timezone)
+            end = parse_query_time(params["end"], guide.timezone)
+            if not 0 < end - start <= MAX_RANGE:
+                return 400, {"error": f"'end' must be after 'start' and at most {MAX_RANGE} seconds later"}
+            return 200, {"guide": name, "start": start, "end": end,
+                         "channels": guide.between(start, end, channel_id)}
+        except KeyError as e:
+            return 404, {"error": e.args[0]}
+        except ValueError as e:
+            return 400, {"error": str(e)}
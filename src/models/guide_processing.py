@@ -0,0 +1,112 @@
+from typing import List
+
+from models.event_store import ChannelRecord, EventRecord, GuideStore, make_event_id
+from utils.metrics import metrics
+
+FILLER_TITLE = "No information"  # Title of the events filling gaps in a channel's listings
+MIN_GAP = 60  # Seconds, shorter gaps are left alone rather than filled with a sliver of filler
+
+
+def retime(event: EventRecord, start: int, stop: int) -> EventRecord:
+    """A copy of an event with new start/stop, its local fields cleared for localize() to fill in again.
+
+    Records can be shared with another region's store, so they are never changed in place.
+    """
+    return EventRecord(event.eventID, event.title, event.eventDescription, event.rating,
+                       "", "", "", event.genre, start, stop)
+
+
+def filler(channel: ChannelRecord, start: int, stop: int) -> EventRecord:
+    return EventRecord(make_event_id(channel.channelID, start, FILLER_TITLE), FILLER_TITLE, "", "",
+                       "", "", "", "", start, stop)
+
+
+def merge_duplicate_channels(store: GuideStore) -> None:
+    """Fold channels listed more than once into the first record with that id, keeping document order."""
+    channels = []
+    for channel in store.channels:
+        first = store.channel_index.setdefault(channel.channelID, channel)
+        if first is channel:
+            channels.append(channel)
+        else:
+            first.events.extend(channel.events)
+            metrics.count("duplicate_channels")
+    store.channels = channels
+
+
+def process_channel(channel: ChannelRecord, window_start: int = None, window_end: int = None,
+                    fill_gaps: bool = False) -> List[EventRecord]:
+    """Sort a channel's events and make them a clean, non-overlapping sequence in one pass.
+
+    Events are trimmed to the window, an event starting at the same time as
+    the previous one replaces it (a duplicate or a correction later in the
+    feed), and an event starting before the previous one ends cuts it short.
+    With 'fill_gaps', gaps of at least MIN_GAP (and the edges of the window)
+    are filled with FILLER_TITLE events.
+    """
+    events = channel.events
+    events.sort(key=lambda event: event.start)  # Stable and linear when already in order, as feeds usually are
+
+    result = []
+    for event in events:
+        start = event.start if window_start is None else max(event.start, window_start)
+        stop = event.stop if window_end is None else min(event.stop, window_end)
+        if stop <= start:
+            metrics.count("invalid_events" if event.stop <= event.start else "outside_window_events")
+            continue
+
+        if result:
+            previous = result[-1]
+            if start == previous.start:
+                result.pop()
+                metrics.count("duplicate_events")
+                previous = result[-1] if result else None
+            if previous is not None and start < previous.stop:
+                result[-1] = retime(previous, previous.start, start)
+                metrics.count("overlapping_events")
+
+        if fill_gaps:
+            gap_start = result[-1].stop if result else window_start
+            if gap_start is not None and start - gap_start >= MIN_GAP:
+                result.append(filler(channel, gap_start, start))
+                metrics.count("filled_gaps")
+
+        result.append(event if (start, stop) == (event.start, event.stop) else retime(event, start, stop))
+
+    if fill_gaps and window_end is not None:
+        gap_start = result[-1].stop if result else window_start
+        if gap_start is not None and window_end - gap_start >= MIN_GAP:
+            result.append(filler(channel, gap_start, window_end))
+            metrics.count("filled_gaps")
+    return result
+
+
+def process_guide(store: GuideStore, window_start: int = None, window_end: int = None,
+                  fill_gaps: bool = False) -> GuideStore:
+    """Clean up a parsed guide before it is localized and set maxMinutes to the span it covers.
+
+    Runs once per channel over events with epoch 'start'/'stop'; channels
+    built from pre-localized events are left as they are. 'window_start' and
+    'window_end' are epoch seconds, either may be None for no limit.
+    """
+    merge_duplicate_channels(store)
+    for channel in store.channels:
+        if any(event.start is None or event.stop is None for event in channel.events):
+            continue
+        channel.events = process_channel(channel, window_start, window_end, fill_gaps)
+
+    store.maxMinutes = guide_span_minutes(store.channels)
+    return store
+
+
+def guide_span_minutes(channels: List[ChannelRecord]) -> int:
+    """Minutes from the earliest start to the latest stop over processed (sorted, non-overlapping) channels."""
+    first_start = None
+    last_stop = None
+    for channel in channels:
+        events = channel.events
+        if not events or events[0].start is None or events[-1].stop is None:
+            continue
+        first_start = events[0].start if first_start is None else min(first_start, events[0].start)
+        last_stop = events[-1].stop if last_stop is None else max(last_stop, events[-1].stop)
+    return (last_stop - first_start) // 60 if first_start is not None else 0
@@ -0,0 +1,73 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import List, Tuple
+
+from models.event_store import ChannelRecord, GuideStore
+from models.guide_processing import guide_span_minutes
+from utils.metrics import metrics
+
+
+def read_icon_map(path: Path) -> List[str]:
+    """The channel IDs listed in an iconMap.txt ('ID | filename | name' lines), in order."""
+    keys = []
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                keys.append(line.split("|", 1)[0].strip())
+    return keys
+
+
+def number_key(value: str) -> str:
+    """Channel numbers compare without leading zeros, so "1" in a lineup matches Sky's "001"."""
+    return value.lstrip("0") or "0"
+
+
+class Lineup:
+    """A property's channel lineup: which of a region's channels it shows, in what order and under which IDs.
+
+    'channels' is a list of (source key, published ID) pairs. The source key
+    is an upstream channel ID or channel number as used in iconMap.txt; the
+    published ID is what the property's TVs know the channel as, or None to
+    keep the upstream ID.
+    """
+
+    def __init__(self, name: str, region: str, channels: List[Tuple[str, str]], location_tags: List[str],
+                 file_prefix: str, title: str = ""):
+        self.name = name
+        self.region = region  # Name of the region whose guide is filtered
+        self.channels = channels
+        self.location_tags = location_tags  # Subdirectories under the output directory
+        self.file_prefix = file_prefix  # ZIP name before the date
+        self.title = title  # filetype of the filtered guide, the region's when empty
+
+    def digest(self, upstream_digest: str) -> str:
+        """Tag for the stashed ZIP: the region's upstream digest combined with this lineup's definition."""
+        if not upstream_digest:
+            return ""
+        definition = json.dumps([self.title, self.channels], separators=(",", ":"))
+        return hashlib.sha256(f"{upstream_digest}\x1f{definition}".encode("utf-8")).hexdigest()
+
+    def apply(self, store: GuideStore) -> GuideStore:
+        """A filtered, renumbered view of a parsed guide.
+
+        The view's channels are new records that share the region's event
+        lists, so nothing is copied and adding a property only costs its
+        serialization.
+        """
+        by_number = {number_key(channel.number): channel for channel in store.channels if channel.number}
+        view = GuideStore(self.title or store.filetype, store.version, store.fetchTime)
+        for key, published_id in self.channels:
+            channel = store.get_channel(key) or by_number.get(number_key(key))
+            if channel is None:
+                print(f"Warning: Lineup '{self.name}' lists channel '{key}', which is not in the '{self.region}' guide.")
+                metrics.count("missing_lineup_channels")
+                continue
+            view_channel = ChannelRecord(published_id or channel.channelID, channel.name, channel.resolution,
+                                         channel.number)
+            view_channel.events = channel.events
+            view.channels.append(view_channel)
+            view.channel_index.setdefault(view_channel.channelID, view_channel)
+        view.maxMinutes = guide_span_minutes(view.channels)
+        return view
@@ -0,0 +1,70 @@
+import bz2
+import gzip
+import io
+import lzma
+from pathlib import Path
+from typing import BinaryIO
+
+import urllib3
+
+# Leading bytes of the compressed formats XMLTV providers publish (.xml.gz, .xml.bz2, .xml.xz)
+MAGIC_NUMBERS = (
+    (b"\x1f\x8b", gzip),
+    (b"BZh", bz2),
+    (b"\xfd7zXZ\x00", lzma),
+)
+
+# What urllib3 can decode here: gzip and deflate, plus br and zstd when brotli or zstandard is installed
+ACCEPT_ENCODING = urllib3.util.make_headers(accept_encoding=True)["accept-encoding"]
+
+
+def detect_compression(head: bytes):
+    """The module (gzip, bz2 or lzma) that reads data starting with 'head', or None for uncompressed data."""
+    for magic, module in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return module
+    return None
+
+
+def is_compressed(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return detect_compression(f.read(6)) is not None
+
+
+def open_decompressed(path: Path) -> BinaryIO:
+    """Open a file for binary reading, decompressing gzip, bzip2 or xz content as it is read."""
+    with open(path, "rb") as f:
+        module = detect_compression(f.read(6))
+    return module.open(path, "rb") if module else open(path, "rb")
+
+
+class HeadStream(io.RawIOBase):
+    """A stream with the bytes already read from its start put back in front."""
+
+    def __init__(self, head: bytes, stream: BinaryIO):
+        self.head = head
+        self.stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.head[:len(buffer)] if self.head else self.stream.read(len(buffer))
+        self.head = self.head[len(data):]
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def sniff_stream(stream: BinaryIO):
+    """(module the stream is compressed with or None, the stream with its sniffed head put back)."""
+    head = stream.read(6)
+    return detect_compression(head), io.BufferedReader(HeadStream(head, stream), 1024 * 1024)
+
+
+def decompress_stream(stream: BinaryIO) -> BinaryIO:
+    """Wrap a binary stream, such as an HTTP body, so compressed content is decompressed as it is read.
+
+    The caller still closes 'stream' itself. Uncompressed data passes through unchanged.
+    """
+    module, stream = sniff_stream(stream)
+    return module.open(stream, "rb") if module else stream
@@ -1,41 +1,90 @@
 import datetime
+import io
 import json
 import os
+import shutil
+import textwrap
+import time
 import zipfile
 from pathlib import Path
-from models.epg_model import ProgramGuide  # Import your model
+from typing import TYPE_CHECKING, Union
+from models.event_store import GuideStore
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from models.epg_model import ProgramGuide
 
 BASE_OUTPUT_DIR = Path("output")  # Base output directory
+JSON_FILENAME = "Procentric_EPG.json"  # Fixed filename inside every ZIP
+BASE_STASH_DIR = Path("cache") / "outputs"  # Last built ZIP per region, reused when upstream is unchanged
+UPSTREAM_DIGEST = ".sha256"  # Stash tag: digest of the upstream data the ZIP was built from
+CONTENT_DIGEST = ".content.sha256"  # Stash tag: GuideStore.content_digest() of the guide inside the ZIP
 
-def save_json(data: ProgramGuide, subdirs: list[str]) -> Path:
-    """Save the program guide data as 'Procentric_EPG.json' inside subdirectories."""
-    
-    output_path = BASE_OUTPUT_DIR.joinpath(*subdirs)
-    output_path.mkdir(parents=True, exist_ok=True)  # Ensure directories exist
-    
-    json_path = output_path / "Procentric_EPG.json"  # Fixed filename
-    
-    try:
-        with json_path.open("w", encoding="utf-8") as f:
-            json.dump(data.dict() if hasattr(data, 'dict') else data, f, indent=4)
-        print(f"JSON saved: {json_path}")
-    except Exception as e:
-        print(f"Error saving JSON: {e}")
-        return None
 
-    return json_path
+def write_guide_json(data: Union["ProgramGuide", GuideStore], f, pretty: bool = False) -> None:
+    """Serialize the program guide, or a GuideStore, to a text stream one channel at a time.
 
+    Only a single channel is ever held as JSON text, the whole guide is never
+    built up as one dict or string. Output is compact unless 'pretty' is set.
+    """
+    header = data.model_dump(exclude={"channels"})
 
-def zip_json(json_path: Path, zip_filename: str) -> Path:
-    """Zip the JSON file with a custom ZIP filename including today's date,
-    delete the original JSON file, and remove older versions of the ZIP file."""
+    if pretty:
+        f.write("{\n")
+        for key, value in header.items():
+            f.write(f"    {json.dumps(key)}: {json.dumps(value)},\n")
+        f.write('    "channels": [')
+        for i, channel in enumerate(data.channels):
+            f.write(",\n" if i else "\n")
+            f.write(textwrap.indent(json.dumps(channel.model_dump(), indent=4), " " * 8))
+        f.write("\n    ]\n}" if data.channels else "]\n}")
+        return
+
+    # Serializing is interleaved with compression, so only the JSON encoding itself is timed
+    serialize_seconds = 0.0
+    f.write(json.dumps(header, separators=(",", ":"))[:-1])
+    f.write(',"channels":[')
+    for i, channel in enumerate(data.channels):
+        if i:
+            f.write(",")
+        started = time.perf_counter()
+        text = channel.model_dump_json()
+        serialize_seconds += time.perf_counter() - started
+        f.write(text)
+    f.write("]}")
+    metrics.add_time("serialize", serialize_seconds)
+
+
+def save_and_zip(data: Union["ProgramGuide", GuideStore], subdirs: list[str], zip_filename: str, pretty: bool = False, compresslevel: int = 6) -> Path:
+    """Stream the guide as 'Procentric_EPG.json' straight into a ZIP named with today's date.
+
+    The ZIP is written to a temporary name and atomically renamed into place,
+    so a half written archive is never visible. Older dated versions of the
+    ZIP are removed only once the new one is complete.
+    """
+    output_path = BASE_OUTPUT_DIR.joinpath(*subdirs)
+    output_path.mkdir(parents=True, exist_ok=True)  # Ensure directories exist
 
     today_date = datetime.datetime.now().strftime("%Y%m%d")  # Format: YYYYMMDD
-    zip_filename_with_date = f"{zip_filename}_{today_date}.zip"
-    zip_path = json_path.parent / zip_filename_with_date  # Custom ZIP name with today's date
+    zip_path = output_path / f"{zip_filename}_{today_date}.zip"  # Custom ZIP name with today's date
+    tmp_path = zip_path.with_suffix(".zip.tmp")
+
+    try:
+        with metrics.span("zip"):
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zipf:
+                with zipf.open(JSON_FILENAME, "w") as entry, io.TextIOWrapper(entry, encoding="utf-8") as f:
+                    write_guide_json(data, f, pretty)
+            os.replace(tmp_path, zip_path)
+        metrics.count("zip_bytes", zip_path.stat().st_size)
+        print(f"ZIP created: {zip_path}")
+    except Exception as e:
+        print(f"Error creating ZIP: {e}")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return None
 
     # Remove older ZIP files in the directory (excluding today's ZIP)
-    for file in json_path.parent.glob(f"{zip_filename}_*.zip"):
+    for file in output_path.glob(f"{zip_filename}_*.zip"):
         if file != zip_path:
             try:
                 file.unlink()
@@ -43,32 +92,84 @@ def zip_json(json_path: Path, zip_filename: str) -> Path:
             except Exception as e:
                 print(f"Error deleting old ZIP {file}: {e}")
 
-    # Create new ZIP
-    try:
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(json_path, json_path.name)
-        print(f"ZIP created: {zip_path}")
-    except Exception as e:
-        print(f"Error creating ZIP: {e}")
+    return zip_path
+
+
+def stash_output(zip_path: Path, zip_filename: str, digest: str, content_digest: str = "") -> Path:
+    """Keep a copy of the last built ZIP, tagged with the digests of its upstream data and of its content."""
+    if not digest and not content_digest:
         return None
 
-    # Delete the JSON file after zipping
-    try:
-        json_path.unlink()
-        print(f"Deleted JSON file: {json_path}")
-    except Exception as e:
-        print(f"Error deleting JSON file: {e}")
+    BASE_STASH_DIR.mkdir(parents=True, exist_ok=True)
+    stash_path = BASE_STASH_DIR / f"{zip_filename}.zip"
+    tmp_path = stash_path.with_suffix(".zip.tmp")
+    shutil.copyfile(zip_path, tmp_path)
+    os.replace(tmp_path, stash_path)
+    tag_stash(zip_filename, digest, UPSTREAM_DIGEST)
+    tag_stash(zip_filename, content_digest, CONTENT_DIGEST)
+    return stash_path
 
-    return zip_path
+
+def tag_stash(zip_filename: str, digest: str, suffix: str = UPSTREAM_DIGEST) -> None:
+    """Record a digest for the stashed ZIP, removing a stale one when the digest is unknown."""
+    digest_path = BASE_STASH_DIR / f"{zip_filename}{suffix}"
+    if digest:
+        digest_path.write_text(digest)
+    elif digest_path.exists():
+        digest_path.unlink()
+
+
+def restore_output(subdirs: list[str], zip_filename: str, digest: str, suffix: str = UPSTREAM_DIGEST) -> Path:
+    """Republish the stashed ZIP under today's name, skipping the stages that would rebuild it.
+
+    Returns None unless the stash is tagged with the same digest: by default
+    the upstream data digest, or with CONTENT_DIGEST the guide's content digest.
+    """
+    stash_path = BASE_STASH_DIR / f"{zip_filename}.zip"
+    digest_path = BASE_STASH_DIR / f"{zip_filename}{suffix}"
+    if not digest or not stash_path.exists() or not digest_path.exists():
+        return None
+    if digest_path.read_text().strip() != digest:
+        return None
+
+    os.utime(digest_path)  # Confirmed current upstream, see stash_age()
+    return republish_stash(subdirs, zip_filename)
 
 
-def save_and_zip(data: ProgramGuide, subdirs: list[str], zip_filename: str) -> Path:
-    """Save JSON as 'Procentric_EPG.json' and create a ZIP file with a custom name, then delete the JSON file."""
-    
-    json_path = save_json(data, subdirs)
-    if not json_path:
-        print("Failed to save JSON. Skipping ZIP creation.")
+def stash_age(zip_filename: str) -> float:
+    """Seconds since the stashed ZIP was last built or confirmed to match upstream, None without a stash."""
+    stash_path = BASE_STASH_DIR / f"{zip_filename}.zip"
+    if not stash_path.exists():
         return None
+    digest_path = BASE_STASH_DIR / f"{zip_filename}{UPSTREAM_DIGEST}"
+    confirmed = max(stash_path.stat().st_mtime, digest_path.stat().st_mtime if digest_path.exists() else 0)
+    return time.time() - confirmed
+
+
+def restore_stale(subdirs: list[str], zip_filename: str, max_age: float) -> Path:
+    """Republish the last good ZIP while its upstream is unavailable, as long as it is at most 'max_age' seconds old."""
+    age = stash_age(zip_filename)
+    if age is None or not max_age or age > max_age:
+        return None
+    return republish_stash(subdirs, zip_filename)
+
+
+def republish_stash(subdirs: list[str], zip_filename: str) -> Path:
+    """Copy the stashed ZIP to today's name and remove the older dated ZIPs."""
+    stash_path = BASE_STASH_DIR / f"{zip_filename}.zip"
+    output_path = BASE_OUTPUT_DIR.joinpath(*subdirs)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    today_date = datetime.datetime.now().strftime("%Y%m%d")  # Format: YYYYMMDD
+    zip_path = output_path / f"{zip_filename}_{today_date}.zip"
+    if not zip_path.exists():
+        shutil.copyfile(stash_path, zip_path)
+        print(f"ZIP restored from last build: {zip_path}")
+
+    # Remove older ZIP files in the directory (excluding today's ZIP)
+    for file in output_path.glob(f"{zip_filename}_*.zip"):
+        if file != zip_path:
+            file.unlink()
+            print(f"Deleted old ZIP: {file}")
 
-    zip_path = zip_json(json_path, zip_filename)
     return zip_path
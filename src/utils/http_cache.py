@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils.metrics import metrics
+from utils.resilience import default_session
+
+BASE_CACHE_DIR = Path("cache") / "http"  # Base cache directory
+
+
+class CachedResponse:
+    """The outcome of a cached request: where the body is on disk and whether it changed."""
+
+    def __init__(self, path: Path, changed: bool, sha256: str):
+        self.path = path
+        self.changed = changed  # False when the upstream bytes match the previous run
+        self.sha256 = sha256
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+    def json(self):
+        with self.path.open("rb") as f:
+            return json.load(f)
+
+
+class HTTPCache:
+    """Persistent response cache with conditional GET revalidation.
+
+    GET responses are keyed by URL and revalidated with If-None-Match and
+    If-Modified-Since. POST responses (the Sky GraphQL queries) are keyed by
+    URL plus the request body and compared by a hash of their content.
+    Entries unused for 'max_age' seconds are evicted first, then the least
+    recently used ones until the cache fits in 'max_bytes'.
+    """
+
+    def __init__(self, cache_dir: Path = BASE_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024, max_age: int = 7 * 24 * 3600):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def make_key(self, url: str, body=None) -> str:
+        """Key GET requests by URL and POST requests by URL plus the canonical JSON body."""
+        key = url if body is None else url + "\n" + json.dumps(body, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def body_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.body"
+
+    def meta_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def load_meta(self, key: str) -> dict:
+        """Return the stored metadata for a key, or an empty dict if the entry is missing or incomplete."""
+        try:
+            with self.meta_path(key).open("r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return meta if self.body_path(key).exists() else {}
+
+    def tmp_path(self, path: Path) -> Path:
+        """A temporary name next to 'path' for this thread only, as regions sharing a URL fetch it concurrently."""
+        return path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+    def save_meta(self, key: str, meta: dict) -> None:
+        tmp_path = self.tmp_path(self.meta_path(key))
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path(key))
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as recently used for eviction purposes."""
+        os.utime(self.meta_path(key))
+
+    def store(self, key: str, url: str, chunks, headers) -> CachedResponse:
+        """Write a response body to the cache atomically, hashing it as it streams past."""
+        previous = self.load_meta(key)
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.tmp_path(self.body_path(key))
+        with tmp_path.open("wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+
+        metrics.count("bytes_decoded", size)
+        sha256 = digest.hexdigest()
+        changed = previous.get("sha256") != sha256
+        if changed:
+            os.replace(tmp_path, self.body_path(key))
+        else:
+            tmp_path.unlink()  # Same bytes as last time, keep the existing body
+
+        self.save_meta(key, {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": sha256,
+            "size": size,
+            "stored": time.time(),
+        })
+        return CachedResponse(self.body_path(key), changed, sha256)
+
+    def get(self, url: str, session=None, headers: dict = None) -> CachedResponse:
+        """GET a URL, revalidating any cached copy with If-None-Match / If-Modified-Since."""
+        key = self.make_key(url)
+        meta = self.load_meta(key)
+        request_headers = dict(headers or {})
+        if meta.get("etag"):
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = (session or default_session()).get(url, headers=request_headers, stream=True)
+        with response:
+            if response.status_code == 304 and meta:
+                print(f"Not modified, using cached copy of {url}")
+                metrics.count("not_modified")
+                self.touch(key)
+                return CachedResponse(self.body_path(key), False, meta["sha256"])
+            if response.status_code != 200:
+                raise Exception(f"Failed to retrieve {url}. Status code: {response.status_code}")
+
+            response.raw.decode_content = True  # Cache the decoded body
+            cached = self.store(key, url, iter(lambda: response.raw.read(1024 * 1024), b""), response.headers)
+            metrics.count("bytes_downloaded", response.raw.tell())  # On the wire, before any transfer decoding
+            return cached
+
+    def post(self, url: str, body, session=None, headers: dict = None) -> CachedResponse:
+        """POST a JSON body and cache the response, flagging whether its content hash changed."""
+        key = self.make_key(url, body)
+        response = (session or default_session()).post(url, headers=headers, json=body)
+        if response.status_code != 200:
+            raise Exception(f"Failed to retrieve {url}. Status code: {response.status_code}")
+        cached = self.store(key, url, [response.content], response.headers)
+        metrics.count("bytes_downloaded", response.raw.tell() or len(response.content))
+        return cached
+
+    def evict(self) -> None:
+        """Drop entries unused for longer than max_age, then the least recently used until under max_bytes."""
+        now = time.time()
+        entries = []
+        for meta_path in self.cache_dir.glob("*.json"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                used = meta_path.stat().st_mtime
+                size = body_path.stat().st_size if body_path.exists() else 0
+            except OSError:
+                continue
+            if now - used > self.max_age:
+                self.remove(meta_path.stem)
+                print(f"Evicted expired cache entry: {meta_path.stem}")
+            else:
+                entries.append((used, size, meta_path.stem))
+
+        total = sum(size for _, size, _ in entries)
+        for used, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            total -= size
+            print(f"Evicted cache entry to stay under the size limit: {key}")
+
+    def remove(self, key: str) -> None:
+        for path in (self.meta_path(key), self.body_path(key)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
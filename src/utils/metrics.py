@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+try:
+    import resource  # Unix only, peak memory is left out elsewhere
+except ImportError:
+    resource = None
+
+BASE_METRICS_DIR = Path("metrics")  # Run report and Prometheus textfile
+REPORT_FILENAME = "run_report.json"
+PROMETHEUS_FILENAME = "procentric_epg.prom"  # Point node_exporter's textfile collector at BASE_METRICS_DIR
+METRIC_PREFIX = "procentric_epg"
+
+
+def peak_rss_bytes() -> int:
+    """The process's peak resident set size so far, 0 where it cannot be read."""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Reported in KiB on Linux
+
+
+class RegionMetrics:
+    """Timing spans, counters and the peak memory seen for one region of a run."""
+
+    def __init__(self):
+        self.spans = {}  # stage -> {"seconds": float, "count": int}
+        self.counters = {}  # name -> int
+        self.peak_rss_bytes = 0
+
+    def add_span(self, stage: str, seconds: float, count: int = 1) -> None:
+        span = self.spans.setdefault(stage, {"seconds": 0.0, "count": 0})
+        span["seconds"] += seconds
+        span["count"] += count
+
+    def to_dict(self) -> dict:
+        return {"spans": self.spans, "counters": self.counters, "peak_rss_bytes": self.peak_rss_bytes}
+
+    def merge(self, data: dict) -> None:
+        for stage, span in data["spans"].items():
+            self.add_span(stage, span["seconds"], span["count"])
+        for name, value in data["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        self.peak_rss_bytes = max(self.peak_rss_bytes, data["peak_rss_bytes"])
+
+
+class Metrics:
+    """Per-region instrumentation for a pipeline run.
+
+    The region is tracked per thread, so code deep inside a fetch or build
+    only calls span() or count() and the numbers land on whichever region is
+    being processed. Build workers run in other processes; their numbers are
+    carried back with snapshot() and folded in with merge().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.regions: Dict[str, RegionMetrics] = {}
+            self.status = {}  # region -> "ok" / "unchanged" / "failed"
+            self.started = time.time()
+
+    def clear(self, names) -> None:
+        """Forget the named regions and restart the run clock, keeping every other region's last numbers.
+
+        Used by the daemon, where each cycle only reruns the regions that are due.
+        """
+        with self.lock:
+            for name in names:
+                self.regions.pop(name, None)
+                self.status.pop(name, None)
+            self.started = time.time()
+
+    def current_region(self) -> str:
+        return getattr(self.local, "region", "") or "global"
+
+    def get_region(self, name: str) -> RegionMetrics:
+        with self.lock:
+            return self.regions.setdefault(name, RegionMetrics())
+
+    @contextmanager
+    def region(self, name: str):
+        """Attribute everything recorded by this thread inside the block to 'name'."""
+        previous = getattr(self.local, "region", "")
+        self.local.region = name
+        try:
+            yield
+        finally:
+            self.local.region = previous
+
+    def bind(self, func):
+        """Wrap 'func' so it records against the calling thread's region when run on another thread."""
+        region = getattr(self.local, "region", "")
+
+        def run(*args, **kwargs):
+            with self.region(region):
+                return func(*args, **kwargs)
+        return run
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a stage of the current region and sample the peak memory when it ends."""
+        region = self.get_region(self.current_region())
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            peak = peak_rss_bytes()
+            with self.lock:
+                region.add_span(stage, elapsed)
+                region.peak_rss_bytes = max(region.peak_rss_bytes, peak)
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """Add time measured piecemeal, e.g. interleaved with another stage, to a stage of the current region."""
+        region = self.get_region(self.current_region())
+        with self.lock:
+            region.add_span(stage, seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Add to a counter of the current region."""
+        region = self.get_region(self.current_region())
+        with self.lock:
+            region.counters[name] = region.counters.get(name, 0) + value
+
+    def set_status(self, name: str, status: str) -> None:
+        with self.lock:
+            self.status[name] = status
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {name: region.to_dict() for name, region in self.regions.items()}
+
+    def merge(self, snapshot: dict) -> None:
+        for name, data in snapshot.items():
+            region = self.get_region(name)
+            with self.lock:
+                region.merge(data)
+
+    def report(self) -> dict:
+        finished = time.time()
+        with self.lock:
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "finished": datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+                "duration_seconds": round(finished - self.started, 3),
+                "peak_rss_bytes": peak_rss_bytes(),
+                "status": dict(self.status),
+                "regions": {name: region.to_dict() for name, region in sorted(self.regions.items())},
+            }
+
+    def prometheus(self, report: dict = None) -> str:
+        """The run in the Prometheus text exposition format, for node_exporter's textfile collector."""
+        report = report or self.report()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list) -> None:
+            if not samples:
+                return
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+
+        regions = report["regions"]
+        metric("stage_seconds", "gauge", "Wall time spent in each stage during the last run.", [
+            ({"region": name, "stage": stage}, round(span["seconds"], 6))
+            for name, region in regions.items() for stage, span in sorted(region["spans"].items())
+        ])
+        counter_names = sorted({counter for region in regions.values() for counter in region["counters"]})
+        for counter in counter_names:
+            metric(counter, "gauge", f"Value of '{counter}' during the last run.", [
+                ({"region": name}, region["counters"][counter])
+                for name, region in regions.items() if counter in region["counters"]
+            ])
+        metric("peak_rss_bytes", "gauge", "Peak resident memory of the process handling each region.", [
+            ({"region": name}, region["peak_rss_bytes"]) for name, region in regions.items() if region["peak_rss_bytes"]
+        ])
+        metric("region_success", "gauge", "1 if the region was built or reused in the last run, 0 if it failed.", [
+            ({"region": name, "status": status}, 0 if status == "failed" else 1)
+            for name, status in sorted(report["status"].items())
+        ])
+        metric("run_duration_seconds", "gauge", "Wall time of the last run.", [({}, report["duration_seconds"])])
+        metric("last_run_timestamp_seconds", "gauge", "Unix time the last run finished.", [({}, int(time.time()))])
+        return "\n".join(lines) + "\n"
+
+    def write(self, metrics_dir: Path = BASE_METRICS_DIR) -> Path:
+        """Write the JSON run report and the Prometheus textfile, each atomically, and return the report path."""
+        metrics_dir = Path(metrics_dir)
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+
+        report_path = metrics_dir / REPORT_FILENAME
+        write_atomic(report_path, json.dumps(report, indent=4))
+        write_atomic(metrics_dir / PROMETHEUS_FILENAME, self.prometheus(report))
+        return report_path
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write to a temporary name then rename, so collectors never read a half written file."""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def run_instrumented(name: str, func, *args):
+    """Run 'func' under a fresh registry in a worker process and return (result or exception, snapshot)."""
+    metrics.reset()
+    with metrics.region(name):
+        try:
+            result = func(*args)
+        except Exception as e:
+            result = e
+    return result, metrics.snapshot()
+
+
+# The process wide registry
+metrics = Metrics()
@@ -0,0 +1,242 @@
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List
+
+import requests
+
+from utils.metrics import metrics, run_instrumented
+from utils.resilience import ResilientSession
+
+POLL_INTERVAL = 0.2  # Seconds between checks of fetch completions and deadlines
+
+# Builds start while fetch threads are still running. A forked child inherits any lock one of those threads
+# holds (pytz's lazy zone list, logging, the import lock) and can wait on it forever, so builds come from a
+# clean single threaded fork server, or a fresh interpreter where there is none.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class PipelineJob:
+    """A single region: a network fetch followed by a CPU heavy build.
+
+    'fetch' is called with the shared requests session on the thread pool.
+    'build' is called with the fetch result in a worker process, so it must be
+    picklable (a module level function or a functools.partial of one).
+    'timeout' is the wall clock budget in seconds for fetch and build together.
+    'interval' is how often the daemon reruns the job, in seconds.
+    """
+
+    def __init__(self, name: str, fetch: Callable[[requests.Session], Any], build: Callable[[Any], Any],
+                 timeout: float = None, interval: float = None):
+        self.name = name
+        self.fetch = fetch
+        self.build = build
+        self.timeout = timeout
+        self.interval = interval
+
+
+class Unchanged:
+    """Returned by a fetch when the upstream data has not changed and the build can be skipped."""
+
+    def __init__(self, result: Any):
+        self.result = result  # Stands in for the build result, e.g. the reused ZIP path
+
+
+class JobTimeout(Exception):
+    """A job ran past its wall clock budget and was abandoned or killed."""
+
+
+def create_session(pool_size: int, **options) -> requests.Session:
+    """Create a session whose connection pool is large enough for every fetch worker.
+
+    It is a ResilientSession, so every request has timeouts, retries and a
+    circuit breaker; 'options' override their defaults.
+    """
+    return ResilientSession(pool_size, **options)
+
+
+def preload_builds(modules: List[str]) -> None:
+    """Start the fork server with 'modules' imported, so build processes start with them loaded.
+
+    Call it before the first build; it is a no-op where builds are spawned.
+    """
+    if START_METHOD != "forkserver":
+        return
+    from multiprocessing import forkserver
+
+    forkserver.set_forkserver_preload(modules)
+    # The fork server is a new interpreter that only sees PYTHONPATH, not this process's sys.path
+    previous = os.environ.get("PYTHONPATH")
+    os.environ["PYTHONPATH"] = os.pathsep.join([os.path.abspath(sys.path[0])] + ([previous] if previous else []))
+    try:
+        forkserver.ensure_running()
+    finally:
+        if previous is None:
+            del os.environ["PYTHONPATH"]
+        else:
+            os.environ["PYTHONPATH"] = previous
+
+
+def run_fetch(job: PipelineJob, session: requests.Session) -> Any:
+    """Run a job's fetch with its metrics attributed to the job."""
+    with metrics.region(job.name):
+        return job.fetch(session)
+
+
+def build_worker(conn, name: str, build: Callable[[Any], Any], payload: Any) -> None:
+    """Entry point of a build process: run the build and send back (result or exception, metrics snapshot)."""
+    try:
+        conn.send(run_instrumented(name, build, payload))
+    finally:
+        conn.close()
+
+
+class BuildProcess:
+    """A build running in its own process, so it can be killed when it overruns."""
+
+    def __init__(self, job: PipelineJob, payload: Any, deadline: float, context):
+        self.job = job
+        self.deadline = deadline
+        self.conn, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(target=build_worker, args=(child_conn, job.name, job.build, payload),
+                                       name=f"build-{job.name}", daemon=True)
+        self.process.start()
+        child_conn.close()  # Only the child writes, so EOF means it died
+
+    def collect(self) -> Any:
+        """Receive the result of a finished build, merging its metrics."""
+        try:
+            result, snapshot = self.conn.recv()
+            metrics.merge(snapshot)
+        except EOFError:
+            self.process.join()
+            result = Exception(f"Build process for '{self.job.name}' exited with code {self.process.exitcode}")
+        self.close()
+        return result
+
+    def kill(self) -> None:
+        self.process.terminate()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+        self.process.join()
+
+
+def run_pipeline(jobs: List[PipelineJob], fetch_workers: int = 8, build_workers: int = None,
+                 session: requests.Session = None) -> Dict[str, Any]:
+    """Run every job's fetch concurrently and start its build in a worker process as soon as it lands.
+
+    At most 'build_workers' builds run at once (default one per CPU). A job
+    that overruns its timeout is abandoned while fetching, since a thread
+    cannot be stopped, or has its build process killed. Each region fails on
+    its own: the returned dict maps the job name to the build result, or to
+    the exception raised by its fetch or build, or to a JobTimeout. Metrics
+    recorded in the build processes are merged into the parent's registry.
+    A long running caller can pass its own 'session' to keep connections open
+    between runs.
+    """
+    build_workers = build_workers or os.cpu_count() or 1
+    context = multiprocessing.get_context(START_METHOD)
+    started = time.monotonic()
+    deadlines = {job.name: started + job.timeout if job.timeout else float("inf") for job in jobs}
+
+    results = {}
+    fetched = queue.Queue()  # (job, future) as each fetch completes
+    wakeup = threading.Event()  # Set whenever a fetch completes
+    pending = []  # (job, payload) waiting for a free build slot
+    running = {}  # connection -> BuildProcess
+    own_session = session is None
+    session = session or create_session(fetch_workers)
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers)
+
+    try:
+        fetching = {}
+        for job in jobs:
+            future = fetch_pool.submit(run_fetch, job, session)
+            fetching[job.name] = future
+            future.add_done_callback(lambda future, job=job: (fetched.put((job, future)), wakeup.set()))
+
+        while fetching or pending or running:
+            # Hand finished fetches to the build queue
+            while True:
+                try:
+                    job, future = fetched.get_nowait()
+                except queue.Empty:
+                    break
+                if fetching.pop(job.name, None) is None:
+                    continue  # Already given up on after its deadline
+                try:
+                    payload = future.result()
+                except Exception as e:
+                    logging.error(f"Fetch failed for '{job.name}': {e}")
+                    results[job.name] = e
+                    continue
+                if isinstance(payload, Unchanged):
+                    logging.info(f"'{job.name}' is unchanged upstream, skipping build.")
+                    results[job.name] = payload.result
+                    continue
+                logging.info(f"Fetched '{job.name}', queuing build.")
+                pending.append((job, payload))
+
+            now = time.monotonic()
+
+            # Give up on fetches and queued builds past their deadline
+            for name in [name for name in fetching if deadlines[name] <= now]:
+                fetching.pop(name).cancel()
+                logging.error(f"Fetch timed out for '{name}'.")
+                results[name] = JobTimeout(f"'{name}' timed out while fetching")
+            for job, _ in pending:
+                if deadlines[job.name] <= now:
+                    logging.error(f"'{job.name}' timed out waiting for a build slot.")
+                    results[job.name] = JobTimeout(f"'{job.name}' timed out waiting for a build slot")
+            pending = [item for item in pending if item[0].name not in results]
+
+            # Kill builds past their deadline
+            for conn, build in list(running.items()):
+                if build.deadline <= now and not conn.poll():
+                    del running[conn]
+                    build.kill()
+                    logging.error(f"Build timed out for '{build.job.name}', process killed.")
+                    results[build.job.name] = JobTimeout(f"'{build.job.name}' timed out while building")
+
+            # Start queued builds up to the concurrency cap, in the order they were fetched
+            while pending and len(running) < build_workers:
+                job, payload = pending.pop(0)
+                build = BuildProcess(job, payload, deadlines[job.name], context)
+                running[build.conn] = build
+
+            # Wait for a build to finish, the next fetch to land or the next deadline
+            next_deadline = min([deadlines[name] for name in fetching] +
+                                [build.deadline for build in running.values()] + [float("inf")])
+            timeout = max(0.0, min(POLL_INTERVAL, next_deadline - time.monotonic()))
+            if not running:
+                wakeup.wait(timeout)
+                wakeup.clear()
+                continue
+            for conn in wait(list(running), timeout):
+                build = running.pop(conn)
+                result = build.collect()
+                if isinstance(result, Exception):
+                    logging.error(f"Build failed for '{build.job.name}': {result}")
+                else:
+                    logging.info(f"Built '{build.job.name}'.")
+                results[build.job.name] = result
+    finally:
+        # Cancelled or interrupted: stop every build still running and drop queued fetches
+        for build in running.values():
+            build.kill()
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if own_session:
+            session.close()
+
+    return results
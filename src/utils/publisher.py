@@ -0,0 +1,131 @@
+"""Publish built ZIPs into the directory ProCentric servers poll over FTP, without ever leaving a gap.
+
+Run from the 'src' directory, e.g. from cron after main.py:
+
+    python -m utils.publisher output/EPG /home/procentric/EPG
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from utils.metrics import metrics
+
+DATED_ZIP_PATTERN = re.compile(r"^(?P<prefix>.+)_(?P<date>\d{8})\.zip$")  # Procentric_EPG_{CODE}_{YYYYMMDD}.zip
+TMP_PREFIX = ".publishing-"  # Partial copies in the destination, hidden from FTP listings
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dated_zips(directory: Path, prefix: str) -> list:
+    """The dated ZIPs for 'prefix' in a directory, newest date last."""
+    if not directory.is_dir():
+        return []
+    found = []
+    for path in directory.iterdir():
+        match = DATED_ZIP_PATTERN.match(path.name)
+        if match and match.group("prefix") == prefix and path.is_file():
+            found.append((match.group("date"), path))
+    return [path for _, path in sorted(found)]
+
+
+def publish_zip(zip_path: Path, dest_dir: Path) -> Optional[Path]:
+    """Publish one dated ZIP into 'dest_dir', returning the published path or None if nothing changed.
+
+    The ZIP is first compared with the newest file already published for the
+    region, by size and then sha256. If they match nothing is copied and the
+    published file is left exactly as it is. Otherwise the ZIP is copied to a
+    hidden temporary name in the destination, so the final rename is atomic
+    on the same filesystem, and only after the rename are older dated ZIPs
+    of the region removed, so a polling TV always finds a file.
+    """
+    zip_path = Path(zip_path)
+    dest_dir = Path(dest_dir)
+    match = DATED_ZIP_PATTERN.match(zip_path.name)
+    if not match:
+        raise ValueError(f"{zip_path.name} is not named like Procentric_EPG_{{CODE}}_{{YYYYMMDD}}.zip")
+    prefix = match.group("prefix")
+
+    current = dated_zips(dest_dir, prefix)
+    new_sha256 = file_sha256(zip_path)
+    if current and current[-1].stat().st_size == zip_path.stat().st_size and file_sha256(current[-1]) == new_sha256:
+        metrics.count("publish_unchanged")
+        return None
+
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest_path = dest_dir / zip_path.name
+    tmp_path = dest_dir / f"{TMP_PREFIX}{zip_path.name}"
+    try:
+        with zip_path.open("rb") as src, tmp_path.open("wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    print(f"Published: {dest_path}")
+    metrics.count("published_bytes", dest_path.stat().st_size)
+
+    # Only now that the new file is in place, drop the older dated ones
+    for old_path in dated_zips(dest_dir, prefix):
+        if old_path != dest_path:
+            try:
+                old_path.unlink()
+                print(f"Deleted old published ZIP: {old_path}")
+            except OSError as e:
+                print(f"Error deleting old published ZIP {old_path}: {e}")
+    return dest_path
+
+
+def publish_tree(source_root: Path, dest_root: Path) -> dict:
+    """Publish the newest dated ZIP of every region under 'source_root' to the same relative path under 'dest_root'.
+
+    Each region is published on its own; one failing leaves the others and
+    its own previously published file untouched. Returns {ZIP name: published
+    path, None when unchanged, or the exception}.
+    """
+    source_root = Path(source_root)
+    dest_root = Path(dest_root)
+    newest = {}  # (directory, prefix) -> newest ZIP
+    for zip_path in sorted(source_root.rglob("*.zip")):
+        match = DATED_ZIP_PATTERN.match(zip_path.name)
+        if match:
+            newest[(zip_path.parent, match.group("prefix"))] = zip_path  # Sorted, so the newest date wins
+
+    results = {}
+    for (directory, _), zip_path in sorted(newest.items()):
+        try:
+            results[zip_path.name] = publish_zip(zip_path, dest_root / directory.relative_to(source_root))
+        except Exception as e:
+            print(f"Error publishing {zip_path}: {e}")
+            results[zip_path.name] = e
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", type=Path, help="Built output tree, e.g. output/EPG")
+    parser.add_argument("destination", type=Path, help="Directory served to ProCentric, e.g. /home/procentric/EPG")
+    args = parser.parse_args()
+
+    results = publish_tree(args.source, args.destination)
+    changed = sum(1 for result in results.values() if isinstance(result, Path))
+    failed = [name for name, result in results.items() if isinstance(result, Exception)]
+    print(f"Published {changed} of {len(results)} ZIPs, {len(results) - changed - len(failed)} unchanged.")
+    if failed:
+        raise SystemExit(f"Failed to publish: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
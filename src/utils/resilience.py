@@ -0,0 +1,147 @@
+import threading
+import time
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.metrics import metrics
+
+DEFAULT_CONNECT_TIMEOUT = 10  # Seconds to establish a connection
+DEFAULT_READ_TIMEOUT = 60  # Seconds without a byte from the server, per read rather than for the whole body
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0  # Seconds before the first retry, doubling each time, plus up to as much again of jitter
+MAX_BACKOFF = 60  # Longest wait before a retry, including one asked for with Retry-After
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset({"GET", "HEAD", "POST"})  # The only POSTs are GraphQL reads, safe to repeat
+DEFAULT_BREAKER_FAILURES = 5  # Consecutive failed requests to a host before its circuit opens
+DEFAULT_BREAKER_RESET = 300  # Seconds an open circuit fails fast before letting a trial request through
+
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """A request was refused without being sent because its host has been failing."""
+
+
+class CountingRetry(Retry):
+    """urllib3's Retry, counting each retry in the calling region's metrics and capping Retry-After."""
+
+    def increment(self, *args, **kwargs) -> "CountingRetry":
+        retry = super().increment(*args, **kwargs)  # Raises MaxRetryError once the retries are used up
+        metrics.count("fetch_retries")
+        return retry
+
+    def parse_retry_after(self, retry_after: str) -> float:
+        return min(super().parse_retry_after(retry_after), MAX_BACKOFF)
+
+
+class CircuitBreaker:
+    """Per host circuit breaker shared by every request of a session.
+
+    After 'failures' consecutive failed requests to a host (each already
+    retried), requests to it fail fast with CircuitOpen for 'reset_after'
+    seconds. Then one trial request is let through: success closes the
+    circuit, failure opens it again for another 'reset_after' seconds.
+    """
+
+    def __init__(self, failures: int = DEFAULT_BREAKER_FAILURES, reset_after: float = DEFAULT_BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.hosts: Dict[str, Tuple[int, float]] = {}  # host -> (consecutive failures, time the circuit opened)
+        self.lock = threading.Lock()
+
+    def before(self, host: str) -> None:
+        """Raise CircuitOpen if the host's circuit is open, otherwise let the request through."""
+        with self.lock:
+            count, opened = self.hosts.get(host, (0, 0.0))
+            if count < self.failures:
+                return
+            if time.monotonic() - opened < self.reset_after:
+                metrics.count("circuit_open_rejections")
+                raise CircuitOpen(f"Circuit open for {host} after {count} consecutive failures")
+            self.hosts[host] = (count, time.monotonic())  # Half open: this request is the trial, others still wait
+
+    def record(self, host: str, ok: bool) -> None:
+        with self.lock:
+            if ok:
+                self.hosts.pop(host, None)
+                return
+            count, opened = self.hosts.get(host, (0, 0.0))
+            count += 1
+            if count == self.failures:
+                print(f"Warning: {host} failed {count} times in a row, failing fast for {self.reset_after}s.")
+                metrics.count("circuit_opened")
+                opened = time.monotonic()
+            self.hosts[host] = (count, opened)
+
+    def open_hosts(self) -> list:
+        with self.lock:
+            return sorted(host for host, (count, _) in self.hosts.items() if count >= self.failures)
+
+
+class ResilientSession(requests.Session):
+    """A requests session that never waits forever and stops hammering a failing host.
+
+    Every request gets connect/read timeouts unless it passes its own.
+    Connection errors, timeouts and RETRY_STATUSES are retried with jittered
+    exponential backoff by urllib3. A host still failing after its retries
+    counts against its circuit breaker.
+    """
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, breaker: CircuitBreaker = None):
+        super().__init__()
+        retry = CountingRetry(
+            total=retries,
+            backoff_factor=backoff,
+            backoff_jitter=backoff,
+            backoff_max=MAX_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,  # Hand back the last response once the retries are used up
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        host = urlsplit(url).netloc
+        self.breaker.before(host)
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.exceptions.RequestException:
+            self.breaker.record(host, False)
+            raise
+        self.breaker.record(host, response.status_code not in RETRY_STATUSES)
+        return response
+
+
+def session_options(config: dict) -> dict:
+    """ResilientSession keyword arguments from the [defaults] of a source config."""
+    return {
+        "connect_timeout": config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+        "read_timeout": config.get("read_timeout", DEFAULT_READ_TIMEOUT),
+        "retries": config.get("retries", DEFAULT_RETRIES),
+        "backoff": config.get("backoff", DEFAULT_BACKOFF),
+        "breaker": CircuitBreaker(config.get("breaker_failures", DEFAULT_BREAKER_FAILURES),
+                                  config.get("breaker_reset", DEFAULT_BREAKER_RESET)),
+    }
+
+
+_default_session = None
+_default_lock = threading.Lock()
+
+
+def default_session() -> ResilientSession:
+    """A process wide session for callers that were not handed one, so no request goes out without a timeout."""
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = ResilientSession()
+        return _default_session
@@ -0,0 +1,41 @@
+import unicodedata
+from functools import lru_cache
+
+# Typographic punctuation, macron vowels and invisible characters mapped to what ProCentric displays.
+# Anything not listed is decomposed and stripped of accents, and dropped if still not ASCII.
+TRANSLATION_TABLE = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'",  # Curly and low single quotes, prime
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"',  # Curly and low double quotes
+    "«": '"', "»": '"',  # Guillemets
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+    "…": "...",
+    "•": "-", "·": "-",  # Bullets
+    "\u00a0": " ", "\u2007": " ", "\u2009": " ", "\u202f": " ", "\u3000": " ",  # Non-breaking and thin spaces
+    "\u200b": None, "\u200c": None, "\u200d": None, "\u2060": None, "\ufeff": None,  # Zero width
+    "ā": "a", "ē": "e", "ī": "i", "ō": "o", "ū": "u",  # Te reo Maori macrons
+    "Ā": "A", "Ē": "E", "Ī": "I", "Ō": "O", "Ū": "U",
+    "æ": "ae", "Æ": "AE", "œ": "oe", "Œ": "OE", "ß": "ss", "ø": "o", "Ø": "O",
+    "©": "(c)", "®": "(R)", "™": "(TM)", "½": "1/2", "¼": "1/4", "¾": "3/4",
+})
+
+
+def normalize_text(value: str) -> str:
+    """Make listing text safe for ProCentric: plain ASCII with punctuation and macrons transliterated, not deleted.
+
+    Most listing text is already ASCII and is returned as is. Anything else
+    goes through the memoized transliteration, since titles, ratings and
+    synopses repeat across a week of listings.
+    """
+    if value.isascii():
+        return value
+    return transliterate(value)
+
+
+@lru_cache(maxsize=65536)
+def transliterate(value: str) -> str:
+    """Apply the translation table, strip the accents of what is left and drop anything still not ASCII."""
+    value = value.translate(TRANSLATION_TABLE)
+    if value.isascii():
+        return value
+    decomposed = unicodedata.normalize("NFKD", value)
+    return decomposed.encode("ascii", "ignore").decode("ascii")
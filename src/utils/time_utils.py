@@ -0,0 +1,119 @@
+import calendar
+from datetime import date, datetime
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+import pytz
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+OFFSET_BUCKET = 900  # Every modern DST transition falls on a 15 minute boundary
+
+# "HHMM" for every minute of the day, indexed by minutes since midnight
+HHMM = [f"{minute // 60:02d}{minute % 60:02d}" for minute in range(1440)]
+
+TimezoneSpec = Union[str, int, float]  # IANA name such as "Pacific/Auckland" or a fixed offset in hours
+
+
+@lru_cache(maxsize=None)
+def get_timezone(spec: TimezoneSpec):
+    """Return the tzinfo for an IANA zone name or a fixed UTC offset in hours."""
+    if isinstance(spec, str):
+        return pytz.timezone(spec)
+    return pytz.FixedOffset(int(spec * 60))
+
+
+@lru_cache(maxsize=65536)
+def utc_offset(spec: TimezoneSpec, bucket: int) -> int:
+    """UTC offset in seconds for a zone during one 15 minute bucket of epoch time."""
+    return int(datetime.fromtimestamp(bucket * OFFSET_BUCKET, get_timezone(spec)).utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=4096)
+def date_from_days(days: int) -> str:
+    """'YYYY-MM-DD' for a count of days since 1970-01-01."""
+    return date.fromordinal(EPOCH_ORDINAL + days).isoformat()
+
+
+@lru_cache(maxsize=8192)
+def parse_xmltv_time(value: str) -> int:
+    """Parse an XMLTV 'YYYYMMDDHHMMSS +ZZZZ' timestamp to epoch seconds without strptime.
+
+    Trailing fields of the date may be omitted as the XMLTV spec allows, and
+    a missing offset is read as UTC. Results are cached since every stop time
+    is usually the next programme's start time.
+    """
+    digits, _, offset = value.strip().partition(" ")
+    digits = digits.ljust(14, "0")
+    seconds = calendar.timegm((
+        int(digits[0:4]), int(digits[4:6]) or 1, int(digits[6:8]) or 1,
+        int(digits[8:10]), int(digits[10:12]), int(digits[12:14])
+    ))
+    offset = offset.strip()
+    if offset:
+        sign = -1 if offset[0] == "-" else 1
+        offset = offset.lstrip("+-")
+        seconds -= sign * (int(offset[0:2]) * 3600 + int(offset[2:4] or 0) * 60)
+    return seconds
+
+
+def local_date_time(epoch: int, spec: TimezoneSpec) -> Tuple[str, str]:
+    """Return ('YYYY-MM-DD', 'HHMM') for an epoch time in the given zone, DST included."""
+    local = epoch + utc_offset(spec, epoch // OFFSET_BUCKET)
+    days, seconds = divmod(local, 86400)
+    return date_from_days(days), HHMM[seconds // 60]
+
+
+@lru_cache(maxsize=4096)
+def days_from_date(value: str) -> int:
+    """Count of days since 1970-01-01 for a 'YYYY-MM-DD' date."""
+    return date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+
+
+def local_to_epoch(day: str, hhmm: str, spec: TimezoneSpec, after: int = None) -> int:
+    """Epoch seconds of a local 'YYYY-MM-DD' date and 'HHMM' time in the given zone, the inverse of local_date_time().
+
+    A time in the hour repeated when clocks go back has two readings. The
+    first is taken, unless it is before 'after' (e.g. the previous event's
+    start), so a sorted listing walks through both hours in order. A time
+    skipped when clocks go forward reads as if the change had not happened yet.
+    """
+    local = days_from_date(day) * 86400 + int(hhmm[:2]) * 3600 + int(hhmm[2:4]) * 60
+    before = utc_offset(spec, (local - 86400) // OFFSET_BUCKET)
+    offsets = {before, utc_offset(spec, local // OFFSET_BUCKET), utc_offset(spec, (local + 86400) // OFFSET_BUCKET)}
+    readings = sorted(local - offset for offset in offsets
+                      if utc_offset(spec, (local - offset) // OFFSET_BUCKET) == offset)
+    if not readings:
+        return local - before
+    if after is not None:
+        for reading in readings:
+            if reading >= after:
+                return reading
+    return readings[0]
+
+
+def convert_times(starts: List[int], stops: List[int], spec: TimezoneSpec) -> Tuple[List[str], List[str], List[str]]:
+    """Batch convert a channel's start/stop epoch arrays to local dates, HHMM start times and lengths in minutes."""
+    dates = []
+    start_times = []
+    lengths = []
+    for start, stop in zip(starts, stops):
+        local = start + utc_offset(spec, start // OFFSET_BUCKET)
+        days, seconds = divmod(local, 86400)
+        dates.append(date_from_days(days))
+        start_times.append(HHMM[seconds // 60])
+        lengths.append(str((stop - start) // 60))
+    return dates, start_times, lengths
+
+
+def format_fetch_time(spec: TimezoneSpec) -> str:
+    """The current time in the given zone, formatted for the ProgramGuide fetchTime field."""
+    return datetime.now(get_timezone(spec)).strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+def local_day_window(spec: TimezoneSpec, days: int, first_day: date = None) -> Tuple[int, int]:
+    """Epoch seconds of local midnight on 'first_day' (default today) and 'days' days later, DST included."""
+    tz = get_timezone(spec)
+    first_day = first_day or datetime.now(tz).date()
+    last_day = date.fromordinal(first_day.toordinal() + days)
+    return (int(tz.localize(datetime(first_day.year, first_day.month, first_day.day)).timestamp()),
+            int(tz.localize(datetime(last_day.year, last_day.month, last_day.day)).timestamp()))
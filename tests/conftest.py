@@ -0,0 +1,36 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The code imports relative to 'src', as when it is run from there
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    """Run the test from an empty directory, since the output, cache and metrics directories are relative."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    yield tmp_path
+    os.chdir(cwd)
+
+
+
+@pytest.fixture
+def stub():
+    """The local stand-in for xmltv.net and the Sky GraphQL endpoint, with a small Sky lineup."""
+    from benchmarks.stub_server import StubServer
+
+    with StubServer(sky_channels=5, sky_days=2) as server:
+        yield server
+
+
+@pytest.fixture
+def session():
+    from utils.pipeline import create_session
+
+    session = create_session(4)
+    yield session
+    session.close()
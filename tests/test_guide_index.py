@@ -0,0 +1,62 @@
+import json
+import zipfile
+
+from models.guide_index import load_guide_zip, parse_query_time
+from utils.file_handler import JSON_FILENAME
+from utils.time_utils import local_date_time, local_to_epoch
+
+AUCKLAND = "Pacific/Auckland"
+FIRST_0200 = 1775307600  # 2026-04-05 02:00 NZDT, clocks go back to 02:00 NZST an hour later
+
+
+def test_local_to_epoch_reads_the_repeated_hour_as_the_first():
+    assert local_to_epoch("2026-04-05", "0200", AUCKLAND) == FIRST_0200
+    assert local_to_epoch("2026-04-05", "0230", AUCKLAND) == FIRST_0200 + 1800
+
+
+def test_local_to_epoch_after_moves_to_the_second_reading():
+    assert local_to_epoch("2026-04-05", "0215", AUCKLAND, after=FIRST_0200 + 1800) == FIRST_0200 + 3600 + 900
+    assert local_to_epoch("2026-04-05", "0215", AUCKLAND, after=FIRST_0200) == FIRST_0200 + 900
+
+
+def test_local_to_epoch_skipped_hour_reads_as_before_the_change():
+    epoch = local_to_epoch("2026-09-27", "0230", AUCKLAND)
+    assert local_date_time(epoch, AUCKLAND) == ("2026-09-27", "0330")
+
+
+def test_local_to_epoch_round_trips_local_date_time():
+    for spec in (AUCKLAND, "Australia/Sydney", "Australia/Lord_Howe", 10):
+        for epoch in range(FIRST_0200 - 7200, FIRST_0200 + 3 * 3600, 900):
+            day, hhmm = local_date_time(epoch, spec)
+            assert local_to_epoch(day, hhmm, spec, after=epoch) == epoch
+
+
+def write_guide(path, events):
+    guide = {"filetype": "Pro:Centric JSON Program Guide Data NZL", "version": "0.1", "fetchTime": "",
+             "maxMinutes": 0, "channels": [{"channelID": "ch1", "name": "One", "resolution": "HD", "events": events}]}
+    with zipfile.ZipFile(path, "w") as zipf:
+        zipf.writestr(JSON_FILENAME, json.dumps(guide))
+
+
+def test_load_guide_zip_keeps_the_repeated_hour_in_order(tmp_path):
+    # Half hour events through the night clocks go back, as published: local dates and start times only
+    epochs = range(FIRST_0200 - 3600, FIRST_0200 + 4 * 3600, 1800)
+    events = []
+    for i, epoch in enumerate(epochs):
+        day, hhmm = local_date_time(epoch, AUCKLAND)
+        events.append({"eventID": str(i), "title": f"Show {i}", "eventDescription": "", "rating": "", "date": day,
+                       "startTime": hhmm, "length": "30", "genre": ""})
+    write_guide(tmp_path / "guide.zip", events)
+
+    channel = load_guide_zip("NZL", tmp_path / "guide.zip", AUCKLAND).channels[0]
+    assert channel.starts == list(epochs)
+    assert channel.stops == sorted(channel.stops)
+    assert channel.at(FIRST_0200 + 3600 + 60)["title"] == "Show 4"  # 02:01 the second time round
+    titles = [event["title"] for event in channel.between(FIRST_0200, FIRST_0200 + 7200)]
+    assert titles == ["Show 2", "Show 3", "Show 4", "Show 5"]
+
+
+def test_parse_query_time_accepts_epoch_and_local_iso():
+    assert parse_query_time(str(FIRST_0200), AUCKLAND) == FIRST_0200
+    assert parse_query_time("2026-04-05T02:00:00+13:00", AUCKLAND) == FIRST_0200
+    assert parse_query_time("2026-04-04T12:00", 10) == 1775268000
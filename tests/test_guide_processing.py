@@ -0,0 +1,88 @@
+import pytest
+
+from models.event_store import ChannelRecord, EventRecord, GuideStore
+from models.guide_processing import FILLER_TITLE, MIN_GAP, process_channel, process_guide
+from utils.metrics import metrics
+
+HOUR = 3600
+
+
+@pytest.fixture
+def counters():
+    """The counters recorded while the test runs."""
+    metrics.clear(["test"])
+    with metrics.region("test"):
+        yield metrics.get_region("test").counters
+
+
+def channel(*events) -> ChannelRecord:
+    """A channel with one event per (title, start, stop)."""
+    record = ChannelRecord("ch1", "One", "HD")
+    record.events = [EventRecord(title, title, "", "", "", "", "", "", start, stop) for title, start, stop in events]
+    return record
+
+
+def listing(events) -> list:
+    return [(event.title, event.start, event.stop) for event in events]
+
+
+def test_sorts_events(counters):
+    events = process_channel(channel(("B", HOUR, 2 * HOUR), ("A", 0, HOUR)))
+    assert listing(events) == [("A", 0, HOUR), ("B", HOUR, 2 * HOUR)]
+    assert counters == {}
+
+
+def test_later_event_at_the_same_start_replaces_the_earlier(counters):
+    events = process_channel(channel(("A", 0, HOUR), ("A corrected", 0, HOUR), ("B", HOUR, 2 * HOUR)))
+    assert listing(events) == [("A corrected", 0, HOUR), ("B", HOUR, 2 * HOUR)]
+    assert counters == {"duplicate_events": 1}
+
+
+def test_overlap_cuts_the_previous_event_short(counters):
+    source = channel(("A", 0, 2 * HOUR), ("B", HOUR, 3 * HOUR))
+    original = source.events[0]
+    events = process_channel(source)
+    assert listing(events) == [("A", 0, HOUR), ("B", HOUR, 3 * HOUR)]
+    assert original.stop == 2 * HOUR  # Shared records are copied, never changed in place
+    assert counters == {"overlapping_events": 1}
+
+
+def test_invalid_events_are_dropped(counters):
+    events = process_channel(channel(("A", 0, HOUR), ("Backwards", 2 * HOUR, HOUR)))
+    assert listing(events) == [("A", 0, HOUR)]
+    assert counters == {"invalid_events": 1}
+
+
+def test_window_trims_and_drops_events(counters):
+    events = process_channel(channel(("Before", 0, HOUR), ("Across", HOUR, 3 * HOUR), ("After", 4 * HOUR, 5 * HOUR)),
+                             window_start=2 * HOUR, window_end=4 * HOUR)
+    assert listing(events) == [("Across", 2 * HOUR, 3 * HOUR)]
+    assert counters == {"outside_window_events": 2}
+
+
+def test_fill_gaps_covers_gaps_and_window_edges(counters):
+    events = process_channel(channel(("A", HOUR, 2 * HOUR), ("B", 3 * HOUR, 4 * HOUR), ("C", 4 * HOUR + MIN_GAP - 1, 5 * HOUR)),
+                             window_start=0, window_end=6 * HOUR, fill_gaps=True)
+    assert listing(events) == [
+        (FILLER_TITLE, 0, HOUR),
+        ("A", HOUR, 2 * HOUR),
+        (FILLER_TITLE, 2 * HOUR, 3 * HOUR),
+        ("B", 3 * HOUR, 4 * HOUR),
+        ("C", 4 * HOUR + MIN_GAP - 1, 5 * HOUR),  # A gap under MIN_GAP is left alone
+        (FILLER_TITLE, 5 * HOUR, 6 * HOUR),
+    ]
+    assert counters == {"filled_gaps": 3}
+
+
+def test_process_guide_merges_duplicate_channels_and_sets_max_minutes(counters):
+    store = GuideStore("test", "0.1", "")
+    first = store.add_channel("ch1", "One")
+    store.add_event(first, "A", "A", "", "", "", start=0, stop=HOUR)
+    second = store.add_channel("ch1", "One again")
+    store.add_event(second, "B", "B", "", "", "", start=HOUR, stop=3 * HOUR)
+
+    process_guide(store)
+    assert [record.channelID for record in store.channels] == ["ch1"]
+    assert listing(store.channels[0].events) == [("A", 0, HOUR), ("B", HOUR, 3 * HOUR)]
+    assert store.maxMinutes == 180
+    assert counters == {"duplicate_channels": 1}
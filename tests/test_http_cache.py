@@ -0,0 +1,63 @@
+from benchmarks.fixtures import build_xmltv_feed
+from epg_sources.registry import Region
+from epg_sources.sky_nz.main import CHANNEL_GROUP_ID, build_query
+from epg_sources.xmltv_net.main import XMLTV
+from main import RegionBuild, RegionFetch
+from utils.http_cache import HTTPCache
+from utils.pipeline import Unchanged
+
+FEED = build_xmltv_feed(3, 1)
+
+
+def test_get_revalidates_with_the_etag(workdir, stub, session):
+    cache = HTTPCache()
+    url = stub.add_feed("feed", FEED)
+
+    cold = cache.get(url, session)
+    assert cold.changed and cold.read_bytes() == FEED.encode("utf-8")
+    assert cache.load_meta(cache.make_key(url))["etag"] == stub.files["/feed.xml"][1]
+
+    again = cache.get(url, session)
+    assert stub.hits["not_modified"] == 1
+    assert not again.changed and again.sha256 == cold.sha256 and again.path == cold.path
+
+
+def test_get_stores_a_changed_feed(workdir, stub, session):
+    cache = HTTPCache()
+    url = stub.add_feed("feed", FEED)
+    cold = cache.get(url, session)
+
+    stub.add_feed("feed", FEED.replace("</tv>", "<!-- changed --></tv>"))
+    changed = cache.get(url, session)
+    assert stub.hits["not_modified"] == 0
+    assert changed.changed and changed.sha256 != cold.sha256
+    assert changed.read_bytes().endswith(b"<!-- changed --></tv>")
+    assert not list(cache.cache_dir.glob("*.tmp"))
+
+
+def test_post_is_unchanged_when_the_content_hash_matches(workdir, stub, session):
+    cache = HTTPCache()
+    body = {"query": build_query(1), "variables": {"id": CHANNEL_GROUP_ID, "date0": "2025-01-07"}}
+
+    first = cache.post(stub.graphql_url, body, session)
+    again = cache.post(stub.graphql_url, body, session)
+    assert first.changed and not again.changed and again.sha256 == first.sha256
+
+    other = dict(body, variables=dict(body["variables"], date0="2025-01-08"))
+    assert cache.post(stub.graphql_url, other, session).changed
+
+
+def test_unchanged_feed_restores_the_stashed_zip(workdir, stub, session):
+    cache = HTTPCache()
+    url = stub.add_feed("feed", FEED)
+    region = Region("SYD", XMLTV(url, "SYD", "Australia/Sydney"), ["EPG", "SYD"], "Procentric_EPG_SYD")
+
+    payload = RegionFetch(region, cache, session)
+    assert not isinstance(payload, Unchanged)
+    zip_path = RegionBuild(region, payload)
+    zip_path.unlink()
+
+    restored = RegionFetch(region, cache, session)
+    assert isinstance(restored, Unchanged) and restored.result == zip_path
+    assert stub.hits["not_modified"] == 1
+    assert zip_path.exists()
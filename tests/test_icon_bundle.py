@@ -0,0 +1,71 @@
+import json
+import zipfile
+
+from channel_bundle.main import IconBundle
+from utils.http_cache import HTTPCache
+from utils.pipeline import create_session
+
+
+def serve_channels(stub, logos: dict) -> str:
+    """Serve a channel list with one channel per {number: icon bytes}, returning its URL."""
+    channels = []
+    for number, data in logos.items():
+        channels.append({"number": number, "name": f"Channel {number}",
+                         "logoThumbnail": stub.add_file(f"/logos/Logo-{number}.png", data, "image/png")})
+    return stub.add_file("/channels.json", json.dumps(channels).encode("utf-8"), "application/json")
+
+
+def build(url: str, workdir, session):
+    return IconBundle(url, icon_dir=workdir / "icons", bundle_path=workdir / "bundle.zip", workers=4,
+                      cache=HTTPCache(workdir / "http")).build(session)
+
+
+def bundled_icons(path) -> dict:
+    with zipfile.ZipFile(path) as zipf:
+        return {name.split("/", 1)[1]: zipf.read(name) for name in zipf.namelist() if name.startswith("channelIcons/")}
+
+
+def test_unchanged_icons_keep_the_bundle(workdir, stub, session):
+    url = serve_channels(stub, {"1": b"one", "2": b"two"})
+    bundle = build(url, workdir, session)
+    assert bundled_icons(bundle) == {"logo_1.png": b"one", "logo_2.png": b"two"}
+    with zipfile.ZipFile(bundle) as zipf:
+        assert "1 | logo_1.png | Channel 1\n" in zipf.read("iconMap.txt").decode("utf-8")
+
+    built = bundle.stat().st_mtime_ns
+    hits = stub.hits["not_modified"]
+    assert build(url, workdir, session) == bundle
+    assert bundle.stat().st_mtime_ns == built
+    assert stub.hits["not_modified"] - hits == 3  # The channel list and both logos
+
+
+def test_changed_logo_rebuilds_the_bundle(workdir, stub, session):
+    url = serve_channels(stub, {"1": b"one", "2": b"two"})
+    build(url, workdir, session)
+
+    stub.add_file("/logos/Logo-2.png", b"two, redrawn", "image/png")
+    bundle = build(url, workdir, session)
+    assert bundled_icons(bundle) == {"logo_1.png": b"one", "logo_2.png": b"two, redrawn"}
+
+
+def test_dropped_channel_is_removed_from_the_bundle(workdir, stub, session):
+    build(serve_channels(stub, {"1": b"one", "2": b"two"}), workdir, session)
+
+    bundle = build(serve_channels(stub, {"1": b"one"}), workdir, session)
+    assert bundled_icons(bundle) == {"logo_1.png": b"one"}
+    assert not (workdir / "icons" / "channelIcons" / "logo_2.png").exists()
+
+
+def test_failed_logo_keeps_the_previous_icon(workdir, stub):
+    url = serve_channels(stub, {"1": b"one", "2": b"two"})
+    session = create_session(4, retries=0)
+    try:
+        bundle = build(url, workdir, session)
+        built = bundle.stat().st_mtime_ns
+
+        stub.inject("/logos/Logo-2.png", 503)
+        assert build(url, workdir, session) == bundle
+    finally:
+        session.close()
+    assert bundle.stat().st_mtime_ns == built
+    assert bundled_icons(bundle) == {"logo_1.png": b"one", "logo_2.png": b"two"}
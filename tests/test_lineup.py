@@ -0,0 +1,60 @@
+from models.event_store import GuideStore
+from models.lineup import Lineup, read_icon_map
+from utils.metrics import metrics
+
+HOUR = 3600
+
+
+def region_guide() -> GuideStore:
+    """Three channels, numbered as Sky numbers them, each with an hour of listings."""
+    store = GuideStore("Region", "0.1", "2026-04-05T00:00:00+1200")
+    for index, (channel_id, number) in enumerate((("tvnz1", "001"), ("tvnz2", "002"), ("prime", "010"))):
+        channel = store.add_channel(channel_id, channel_id.upper(), number=number)
+        store.add_event(channel, f"{channel_id}-1", "Show", "", "", "", start=index * HOUR, stop=(index + 1) * HOUR)
+    return store
+
+
+def lineup(channels, title: str = "") -> Lineup:
+    return Lineup("HOTEL", "NZL", channels, ["EPG", "HOTEL"], "Procentric_EPG_HOTEL", title)
+
+
+def test_apply_filters_orders_and_renumbers():
+    store = region_guide()
+    view = lineup([("prime", "50"), ("1", None), ("002", "2")], title="Hotel").apply(store)
+
+    assert [(channel.channelID, channel.name) for channel in view.channels] == [("50", "PRIME"), ("tvnz1", "TVNZ1"),
+                                                                                ("2", "TVNZ2")]
+    assert view.filetype == "Hotel" and view.fetchTime == store.fetchTime
+    assert view.get_channel("50") is view.channels[0]
+    assert view.maxMinutes == 180
+
+
+def test_apply_shares_the_region_event_lists():
+    store = region_guide()
+    view = lineup([("tvnz1", "1")]).apply(store)
+    assert view.channels[0].events is store.get_channel("tvnz1").events
+    assert view.filetype == "Region"
+    assert store.channels[0].channelID == "tvnz1"  # The region's own records are left alone
+
+
+def test_apply_skips_missing_channels():
+    metrics.clear(["test"])
+    with metrics.region("test"):
+        view = lineup([("tvnz1", None), ("999", "9")]).apply(region_guide())
+    assert [channel.channelID for channel in view.channels] == ["tvnz1"]
+    assert metrics.get_region("test").counters == {"missing_lineup_channels": 1}
+
+
+def test_digest_follows_upstream_and_definition():
+    digest = lineup([("tvnz1", "1")]).digest("abc")
+    assert digest == lineup([("tvnz1", "1")]).digest("abc")
+    assert digest != lineup([("tvnz1", "2")]).digest("abc")
+    assert digest != lineup([("tvnz1", "1")]).digest("abd")
+    assert lineup([("tvnz1", "1")]).digest("") == ""
+
+
+def test_read_icon_map(tmp_path):
+    path = tmp_path / "iconMap.txt"
+    path.write_text("## iconsMap.txt\n# ID | filename | name\n001 | tvnz1.png | TVNZ 1\n\n10 | prime.png | Prime\n",
+                    encoding="utf-8")
+    assert read_icon_map(path) == ["001", "10"]
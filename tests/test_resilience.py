@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+import requests
+
+from benchmarks.fixtures import build_xmltv_feed
+from epg_sources.registry import Region
+from epg_sources.xmltv_net.main import XMLTV
+from main import RegionBuild, RegionFetch
+from utils.file_handler import BASE_STASH_DIR
+from utils.http_cache import HTTPCache
+from utils.pipeline import Unchanged, create_session
+from utils.resilience import CircuitBreaker, CircuitOpen
+
+
+@pytest.fixture
+def fragile_session():
+    """A session that does not retry, so every injected fault reaches the breaker."""
+    session = create_session(2, retries=0, read_timeout=0.5, breaker=CircuitBreaker(failures=2, reset_after=0.3))
+    yield session
+    session.close()
+
+
+def test_retries_5xx_with_backoff(stub):
+    url = stub.add_file("/feed.xml", b"<tv/>")
+    stub.inject("/feed.xml", 503, 502)
+    session = create_session(2, retries=2, backoff=0.01)
+    try:
+        response = session.get(url)
+    finally:
+        session.close()
+    assert response.status_code == 200 and response.content == b"<tv/>"
+    assert stub.hits["faults"] == 2
+
+
+def test_stalled_read_times_out(stub, fragile_session):
+    url = stub.add_file("/feed.xml", b"<tv/>")
+    stub.inject("/feed.xml", ("stall", 2))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        fragile_session.get(url)
+
+
+def test_breaker_fails_fast_then_lets_a_trial_through(stub, fragile_session):
+    url = stub.add_file("/feed.xml", b"<tv/>")
+    stub.inject("/feed.xml", 503, 503, 503)
+    assert fragile_session.get(url).status_code == 503
+    assert fragile_session.get(url).status_code == 503
+
+    with pytest.raises(CircuitOpen):
+        fragile_session.get(url)
+    assert stub.hits["faults"] == 2  # Refused without a request
+
+    time.sleep(0.35)
+    assert fragile_session.get(url).status_code == 503  # The trial fails, the circuit opens again
+    with pytest.raises(CircuitOpen):
+        fragile_session.get(url)
+
+    time.sleep(0.35)
+    assert fragile_session.get(url).status_code == 200
+    assert fragile_session.breaker.open_hosts() == []
+
+
+def built_region(stub, session, stale_max_age: float) -> tuple:
+    """A region built once from the stub, as (region, cache, published ZIP)."""
+    url = stub.add_feed("feed", build_xmltv_feed(3, 1))
+    region = Region("SYD", XMLTV(url, "SYD", "Australia/Sydney"), ["EPG", "SYD"], "Procentric_EPG_SYD",
+                    stale_max_age=stale_max_age)
+    cache = HTTPCache()
+    return region, cache, RegionBuild(region, RegionFetch(region, cache, session))
+
+
+def test_failed_fetch_republishes_the_last_good_zip(workdir, stub, fragile_session):
+    region, cache, zip_path = built_region(stub, fragile_session, stale_max_age=3600)
+    zip_path.unlink()
+
+    stub.inject("/feed.xml", 503)
+    result = RegionFetch(region, cache, fragile_session)
+    assert isinstance(result, Unchanged) and result.result == zip_path
+    assert zip_path.exists()
+
+
+def test_failed_fetch_fails_once_the_last_good_zip_is_too_old(workdir, stub, fragile_session):
+    region, cache, zip_path = built_region(stub, fragile_session, stale_max_age=3600)
+    old = time.time() - 7200
+    for path in BASE_STASH_DIR.glob("Procentric_EPG_SYD*"):
+        os.utime(path, (old, old))
+
+    stub.inject("/feed.xml", 503)
+    with pytest.raises(Exception, match="Status code: 503"):
+        RegionFetch(region, cache, fragile_session)
+
+
+def test_failed_fetch_without_stale_max_age_fails(workdir, stub, fragile_session):
+    region, cache, zip_path = built_region(stub, fragile_session, stale_max_age=0)
+
+    stub.inject("/feed.xml", 503)
+    with pytest.raises(Exception, match="Status code: 503"):
+        RegionFetch(region, cache, fragile_session)
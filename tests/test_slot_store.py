@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from epg_sources.sky_nz.main import SkyNZ_EPG
+from epg_sources.sky_nz.slot_store import SlotStore
+from utils.metrics import metrics
+from utils.pipeline import create_session
+
+
+def channel(channel_id: str, *slots) -> dict:
+    """A 'slotsForDay' channel entry with one slot per (id, startMs)."""
+    return {"id": channel_id, "title": channel_id.upper(), "number": "1",
+            "slotsForDay": {"slots": [{"id": slot_id, "startMs": start} for slot_id, start in slots]}}
+
+
+def test_store_round_trips_and_drops_passed_days(tmp_path):
+    store = SlotStore(tmp_path / "slots.json")
+    store.put("2026-04-04", [channel("a", ("s1", 1))])
+    store.put("2026-04-05", [channel("a", ("s2", 2))])
+    store.save()
+
+    loaded = SlotStore(tmp_path / "slots.json")
+    assert loaded.days == store.days
+    loaded.drop_before("2026-04-05")
+    assert not loaded.has("2026-04-04") and loaded.has("2026-04-05")
+
+
+def test_digest_needs_every_day_and_follows_content(tmp_path):
+    store = SlotStore(tmp_path / "slots.json")
+    store.put("2026-04-04", [channel("a", ("s1", 1))])
+    assert store.digest(["2026-04-04", "2026-04-05"]) == ""
+
+    store.put("2026-04-05", [channel("a", ("s2", 2))])
+    digest = store.digest(["2026-04-04", "2026-04-05"])
+    store.put("2026-04-05", [channel("a", ("s2", 2))])
+    assert store.digest(["2026-04-04", "2026-04-05"]) == digest
+    store.put("2026-04-05", [channel("a", ("s3", 3))])
+    assert store.digest(["2026-04-04", "2026-04-05"]) not in ("", digest)
+
+
+def test_merged_channels_keep_one_copy_of_a_slot_over_midnight(tmp_path):
+    store = SlotStore(tmp_path / "slots.json")
+    store.put("2026-04-04", [channel("a", ("s2", 20), ("late", 30)), channel("b", ("b1", 5))])
+    store.put("2026-04-05", [channel("a", ("late", 30), ("s4", 40))])
+
+    merged = {entry["id"]: entry for entry in store.merged_channels(["2026-04-04", "2026-04-05"])}
+    assert [slot["id"] for slot in merged["a"]["slotsForDay"]["slots"]] == ["s2", "late", "s4"]
+    assert [slot["id"] for slot in merged["b"]["slotsForDay"]["slots"]] == ["b1"]
+
+
+def test_unreadable_store_starts_empty(tmp_path):
+    (tmp_path / "slots.json").write_text("{not json")
+    assert SlotStore(tmp_path / "slots.json").days == {}
+
+
+@pytest.fixture
+def sky(stub, tmp_path):
+    """A three day Sky source on the stub whose requests are not retried."""
+    session = create_session(2, retries=0)
+    source = SkyNZ_EPG(stub.graphql_url, window_days=3, refresh_days=1, batch_days=1,
+                       slot_store_path=tmp_path / "slots.json")
+    yield source, session
+    session.close()
+
+
+def test_only_new_and_refreshed_days_are_fetched(stub, sky):
+    source, session = sky
+    assert source.fetch_data(session)
+    assert stub.hits["post"] == 3
+    digest = source.digest
+
+    assert source.fetch_data(session)
+    assert stub.hits["post"] == 4  # Today only, the later days are held
+    assert source.digest == digest
+    assert sorted(json.loads(source.slot_store_path.read_text())) == source.window_dates()
+
+
+def test_failed_refresh_keeps_the_held_day(stub, sky):
+    source, session = sky
+    first = source.fetch_data(session)
+    digest = source.digest
+
+    metrics.clear(["test"])
+    stub.inject("/graphql", 503)
+    with metrics.region("test"):
+        assert source.fetch_data(session) == first
+    assert metrics.get_region("test").counters["stale_days"] == 1
+    assert source.digest == digest
+
+
+def test_failed_day_never_held_fails_the_fetch(stub, sky):
+    source, session = sky
+    stub.inject("/graphql", 503)
+    with pytest.raises(Exception, match="No data"):
+        source.fetch(None, session)
+    assert stub.hits["post"] == 3
+
+    assert source.fetch_data(session)  # The days that arrived were kept, only the failed one is fetched again
+    assert stub.hits["post"] == 4
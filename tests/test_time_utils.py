@@ -0,0 +1,48 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytz
+
+from utils.time_utils import convert_times, local_day_window, parse_xmltv_time
+
+SYDNEY = "Australia/Sydney"
+
+
+def test_parse_xmltv_time_matches_strptime():
+    for value in ("20260405023000 +1100", "20260405023000 -0330", "20261231235959 +0000", "20260101000000 +0545"):
+        assert parse_xmltv_time(value) == int(datetime.strptime(value, "%Y%m%d%H%M%S %z").timestamp())
+
+
+def test_parse_xmltv_time_reads_short_forms():
+    assert parse_xmltv_time("20260405") == int(datetime(2026, 4, 5, tzinfo=timezone.utc).timestamp())
+    assert parse_xmltv_time("202604") == int(datetime(2026, 4, 1, tzinfo=timezone.utc).timestamp())
+    assert parse_xmltv_time(" 20260405120000 ") == int(datetime(2026, 4, 5, 12, tzinfo=timezone.utc).timestamp())
+    assert parse_xmltv_time("20260405120000 +10") == int(datetime(2026, 4, 5, 2, tzinfo=timezone.utc).timestamp())
+
+
+def reference(starts, stops, zone):
+    """convert_times() the slow way, through pytz."""
+    tz = pytz.timezone(zone)
+    local = [datetime.fromtimestamp(start, tz) for start in starts]
+    return ([moment.strftime("%Y-%m-%d") for moment in local], [moment.strftime("%H%M") for moment in local],
+            [str((stop - start) // 60) for start, stop in zip(starts, stops)])
+
+
+def test_convert_times_across_dst_changes():
+    for first in (datetime(2026, 4, 4, 12, tzinfo=timezone.utc), datetime(2026, 10, 3, 12, tzinfo=timezone.utc)):
+        starts = [int((first + timedelta(minutes=minutes)).timestamp()) for minutes in range(0, 36 * 60, 25)]
+        stops = starts[1:] + [starts[-1] + 1800]
+        assert convert_times(starts, stops, SYDNEY) == reference(starts, stops, SYDNEY)
+
+
+def test_convert_times_with_a_fixed_offset():
+    start = int(datetime(2026, 4, 4, 15, 30, tzinfo=timezone.utc).timestamp())
+    assert convert_times([start], [start + 5400], 10) == (["2026-04-05"], ["0130"], ["90"])
+    assert convert_times([start], [start + 60], -9.5) == (["2026-04-04"], ["0600"], ["1"])
+
+
+def test_local_day_window_spans_the_dst_change():
+    start, end = local_day_window(SYDNEY, 1, date(2026, 4, 5))
+    assert end - start == 25 * 3600
+    assert datetime.fromtimestamp(start, pytz.timezone(SYDNEY)).strftime("%Y-%m-%d %H:%M") == "2026-04-05 00:00"
+    start, end = local_day_window(SYDNEY, 2, date(2026, 10, 4))
+    assert end - start == 47 * 3600